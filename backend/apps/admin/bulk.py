@@ -0,0 +1,90 @@
+"""
+Set-based bulk actions on teachers.
+
+Each function is a single statement over the selected ids (non-teachers are
+ignored) and returns the ids it changed; the caller commits. Large
+selections are split with run_in_chunks() — one statement and one
+transaction per BULK_CHUNK_SIZE users.
+"""
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import case, func, literal, select, update
+from sqlalchemy.orm import Session
+
+from apps.auth.context import invalidate_request_context
+from apps.auth.models import User
+from apps.payments.models import UserSubscription
+from config import BULK_CHUNK_SIZE
+from database import SessionLocal, dialect_insert
+from services.jobs import Job
+
+_subs = UserSubscription.__table__
+
+
+def _teachers(user_ids: list[int]):
+    return (User.id.in_(user_ids), User.role == "teacher")
+
+
+def _plus_days(bind, column, days: int):
+    if bind.dialect.name == "postgresql":
+        return column + func.make_interval(0, 0, 0, days)
+    return func.datetime(column, f"{days:+d} days")
+
+
+def set_active(db: Session, user_ids: list[int], active: bool) -> list[int]:
+    return db.execute(
+        update(User)
+        .where(*_teachers(user_ids))
+        .values(is_active=active)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+
+def change_plan(db: Session, user_ids: list[int], plan: str) -> list[int]:
+    """Upserts the subscription of every selected teacher: `plan`, expiring in a year."""
+    now = datetime.utcnow()
+    stmt = dialect_insert(db.get_bind(), _subs).from_select(
+        ["user_id", "plan", "expires_at", "activated_at"],
+        select(User.id, literal(plan), literal(now + timedelta(days=365)), literal(now)).where(*_teachers(user_ids)),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"plan": stmt.excluded.plan, "expires_at": stmt.excluded.expires_at},
+    )
+    return db.execute(stmt.returning(_subs.c.user_id)).scalars().all()
+
+
+def extend_subscription(db: Session, user_ids: list[int], days: int) -> list[int]:
+    """Pushes expires_at `days` further; teachers without a subscription get Pro for `days`."""
+    now = datetime.utcnow()
+    stmt = dialect_insert(db.get_bind(), _subs).from_select(
+        ["user_id", "plan", "expires_at", "activated_at"],
+        select(User.id, literal("pro"), literal(now + timedelta(days=days)), literal(now)).where(*_teachers(user_ids)),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"expires_at": case(
+            (_subs.c.expires_at.is_(None), stmt.excluded.expires_at),
+            else_=_plus_days(db.get_bind(), _subs.c.expires_at, days),
+        )},
+    )
+    return db.execute(stmt.returning(_subs.c.user_id)).scalars().all()
+
+
+def run_in_chunks(job: Job, action: Callable[..., list[int]], user_ids: list[int], **params) -> int:
+    """Background-job body: applies `action` chunk by chunk, committing each. Returns the affected count."""
+    affected = 0
+    for start in range(0, len(user_ids), BULK_CHUNK_SIZE):
+        chunk = user_ids[start:start + BULK_CHUNK_SIZE]
+        db = SessionLocal()
+        try:
+            changed = action(db, chunk, **params)
+            db.commit()
+        finally:
+            db.close()
+        invalidate_request_context(changed)
+        affected += len(changed)
+        job.advance(len(chunk))
+    return affected
@@ -0,0 +1,115 @@
+"""
+CSV teacher import, run as a background job (services/jobs.py).
+
+The upload is spooled to a temp file and read row by row. Per batch of
+IMPORT_BATCH_SIZE rows: one query for the emails that already exist, temp
+passwords hashed in parallel on the process pool, one INSERT ... ON
+CONFLICT DO NOTHING (a concurrent signup just turns into "skipped"), one
+commit. Temp passwords are written only to the job's result CSV.
+"""
+import csv
+import os
+import secrets
+import tempfile
+from typing import Iterator
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from apps.admin.models import Organization
+from apps.auth.models import User
+from config import IMPORT_BATCH_SIZE
+from database import SessionLocal, dialect_insert
+from services.audit import audit
+from services.jobs import Job
+from services.passwords import hash_many
+
+RESULT_COLUMNS = ["email", "name", "status", "temp_password", "error"]
+
+
+def count_rows(path: str) -> int:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return sum(1 for _ in csv.DictReader(f))
+
+
+def _batches(path: str) -> Iterator[list[tuple[int, dict]]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        batch = []
+        # Row numbers as the admin sees them in a spreadsheet (line 1 is the header)
+        for line_no, row in enumerate(csv.DictReader(f), start=2):
+            batch.append((line_no, row))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _import_batch(db: Session, org_id: int, batch: list[tuple[int, dict]], seen: set[str], out) -> tuple[int, list, list]:
+    skipped, errors, candidates = [], [], []
+    for line_no, row in batch:
+        email = (row.get("email") or "").strip()
+        name = (row.get("name") or "").strip()
+        if not email:
+            errors.append(f"Row {line_no}: missing email")
+            out.writerow(["", name, "error", "", "missing email"])
+        elif email in seen:
+            skipped.append(email)
+            out.writerow([email, name, "skipped", "", "duplicate in file"])
+        else:
+            seen.add(email)
+            candidates.append((email, name))
+
+    existing = set(db.execute(select(User.email).where(User.email.in_([e for e, _ in candidates]))).scalars())
+    new = [(e, n) for e, n in candidates if e not in existing]
+    for email, name in candidates:
+        if email in existing:
+            skipped.append(email)
+            out.writerow([email, name, "skipped", "", "already registered"])
+    if not new:
+        return 0, skipped, errors
+
+    temp_passwords = [secrets.token_urlsafe(6) for _ in new]
+    rows = [
+        {"email": email, "full_name": name, "hashed_password": hashed, "role": "teacher", "organization_id": org_id}
+        for (email, name), hashed in zip(new, hash_many(temp_passwords))
+    ]
+    stmt = dialect_insert(db.get_bind(), User.__table__).on_conflict_do_nothing(index_elements=["email"])
+    inserted = set(db.execute(stmt.returning(User.email), rows).scalars())
+    db.execute(
+        update(Organization).where(Organization.id == org_id).values(used_seats=Organization.used_seats + len(inserted))
+    )
+    db.commit()
+
+    for (email, name), password in zip(new, temp_passwords):
+        if email in inserted:
+            out.writerow([email, name, "created", password, ""])
+        else:
+            skipped.append(email)
+            out.writerow([email, name, "skipped", "", "already registered"])
+    return len(inserted), skipped, errors
+
+
+def run_import(job: Job, path: str, org_id: int, admin_id: int) -> dict:
+    created, skipped, errors = 0, [], []
+    seen: set[str] = set()
+    fd, result_path = tempfile.mkstemp(prefix="import_", suffix=".csv")
+    job.file = result_path
+    db = SessionLocal()
+    try:
+        # utf-8-sig: Excel opens the BOM-prefixed file with the right encoding
+        with os.fdopen(fd, "w", newline="", encoding="utf-8-sig") as f:
+            out = csv.writer(f)
+            out.writerow(RESULT_COLUMNS)
+            for batch in _batches(path):
+                n, batch_skipped, batch_errors = _import_batch(db, org_id, batch, seen, out)
+                created += n
+                skipped += batch_skipped
+                errors += batch_errors
+                job.advance(len(batch))
+        audit(db, "Bulk CSV Import", f"{created} created", admin_id, "success")
+        db.commit()
+    finally:
+        db.close()
+        os.remove(path)
+    return {"created": created, "skipped": skipped, "errors": errors}
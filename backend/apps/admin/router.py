@@ -1,35 +1,43 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, update
 from typing import List, Optional
 from datetime import datetime, timedelta
 import csv
-import io
+import os
+import tempfile
 import uuid
-from database import get_db
+from fastapi.responses import FileResponse, JSONResponse
+from database import get_db, SessionLocal
+from config import BULK_SYNC_LIMIT, ORG_STATS_CACHE_SECONDS
+from services.cache import TTLCache
+from services import jobs
+from services.audit import audit, audit_writer
+from services import catalog, passwords
+from services.passwords import hash_password_sync
 
 from apps.auth.models import User, AuditLog
-from apps.generator.models import TokenUsage
+from apps.generator.models import UsageDaily
 from apps.admin.models import Organization, Payment, InviteToken, GlobalSetting
 from apps.payments.models import UserSubscription
-from apps.auth.router import create_access_token
+from apps.auth.router import create_access_token, ANNOUNCEMENT
 
 from apps.auth.schemas import UserResponse, AuditLogResponse
 from apps.admin.schemas import (
     OrganizationResponse, OrganizationCreate, OrganizationUpdate,
     PaymentResponse, PaymentCreate,
     CreateTeacherRequest, UpdateTeacherRequest, ResetPasswordRequest,
-    TokenUsageStats, OrgStatsResponse, TeacherStatItem, BulkImportResponse, ImportedTeacher,
+    TokenUsageStats, OrgStatsResponse, TeacherStatItem,
     InviteCreate, InviteResponse, FinancialStats, GlobalSettingResponse, GlobalSettingUpdate,
     BulkActionRequest
 )
 from apps.auth.dependencies import require_admin, get_current_user
+from apps.auth.context import invalidate_request_context
+from apps.admin import bulk, csv_import
+from apps.gamification.services import set_profile_organization
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-from passlib.context import CryptContext
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # ── Teachers ────────────────────────────────────────────────────
 
 @router.post("/teachers", response_model=UserResponse)
@@ -40,7 +48,7 @@ def create_teacher(req: CreateTeacherRequest, db: Session = Depends(get_db), adm
     
     new_teacher = User(
         email=req.email,
-        hashed_password=pwd_context.hash(req.password),
+        hashed_password=hash_password_sync(req.password),
         full_name=req.full_name,
         role="teacher",
         school=req.school,
@@ -49,12 +57,9 @@ def create_teacher(req: CreateTeacherRequest, db: Session = Depends(get_db), adm
         organization_id=req.organization_id,
     )
     db.add(new_teacher)
+    audit(db, "Create Teacher", req.email, admin.id, "success")
     db.commit()
     db.refresh(new_teacher)
-    
-    log = AuditLog(action="Create Teacher", target=req.email, user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
     return new_teacher
 
 @router.get("/teachers", response_model=List[UserResponse])
@@ -106,16 +111,14 @@ def update_teacher(user_id: int, req: UpdateTeacherRequest, db: Session = Depend
         elif hasattr(user, key):
             setattr(user, key, value)
     
+    audit(db, "Update Teacher", user.email, admin.id, "success")
     db.commit()
     db.refresh(user)
+    invalidate_request_context([user_id])
     
     # Load subscription for response
     user.plan = user.subscription.plan if user.subscription else "free"
     user.expires_at = user.subscription.expires_at if user.subscription else None
-    
-    log = AuditLog(action="Update Teacher", target=user.email, user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
     return user
 
 @router.post("/teachers/{user_id}/toggle-status")
@@ -125,16 +128,14 @@ def toggle_teacher_status(user_id: int, db: Session = Depends(get_db), admin: Us
         raise HTTPException(status_code=404, detail="Teacher not found")
     
     user.is_active = not getattr(user, 'is_active', True)
+    action = "Unblock Teacher" if user.is_active else "Block Teacher"
+    audit(db, action, user.email, admin.id, "warning")
     db.commit()
+    invalidate_request_context([user_id])
     db.refresh(user)
     
     # Load subscription for response info if needed (returning dict here, but let's match schema style)
     plan = user.subscription.plan if user.subscription else "free"
-    
-    action = "Unblock Teacher" if user.is_active else "Block Teacher"
-    log = AuditLog(action=action, target=user.email, user_id=admin.id, log_type="warning")
-    db.add(log)
-    db.commit()
     return {"id": user.id, "email": user.email, "is_active": user.is_active, "plan": plan}
 
 @router.post("/teachers/{user_id}/reset-password")
@@ -143,11 +144,8 @@ def reset_teacher_password(user_id: int, req: ResetPasswordRequest, db: Session
     if not user:
         raise HTTPException(status_code=404, detail="Teacher not found")
     
-    user.hashed_password = pwd_context.hash(req.new_password)
-    db.commit()
-    
-    log = AuditLog(action="Reset Password", target=user.email, user_id=admin.id, log_type="warning")
-    db.add(log)
+    user.hashed_password = hash_password_sync(req.new_password)
+    audit(db, "Reset Password", user.email, admin.id, "warning", critical=True)
     db.commit()
     return {"message": "Password reset successfully"}
 
@@ -161,25 +159,24 @@ def delete_teacher(user_id: int, db: Session = Depends(get_db), admin: User = De
     
     # 1. Cleanup dependencies
     # Imports inside to avoid circular deps if they exist
-    from apps.generator.models import TokenUsage, GenerationLog
+    from apps.generator.models import TokenUsage, GenerationLog, UsageDaily
     from apps.payments.models import UserSubscription, UserPayment
     
     try:
         db.query(TokenUsage).filter(TokenUsage.user_id == user_id).delete()
+        db.query(UsageDaily).filter(UsageDaily.user_id == user_id).delete()
         db.query(GenerationLog).filter(GenerationLog.user_id == user_id).delete()
         db.query(UserSubscription).filter(UserSubscription.user_id == user_id).delete()
         db.query(UserPayment).filter(UserPayment.user_id == user_id).delete()
         
         # Finally delete the user
         db.delete(user)
+        audit(db, "Delete Teacher", email, admin.id, "danger", critical=True)
         db.commit()
+        invalidate_request_context([user_id])
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete teacher: {str(e)}")
-    
-    log = AuditLog(action="Delete Teacher", target=email, user_id=admin.id, log_type="danger")
-    db.add(log)
-    db.commit()
     return {"message": "Teacher deleted and all related records cleared"}
 
 @router.post("/teachers/{user_id}/promote")
@@ -190,9 +187,9 @@ def promote_to_org_admin(user_id: int, db: Session = Depends(get_db), admin: Use
     if not user.organization_id:
         raise HTTPException(status_code=400, detail="Teacher must belong to an organization first")
     user.role = "org_admin"
-    log = AuditLog(action="Promote Org Admin", target=user.email, user_id=admin.id, log_type="success")
-    db.add(log)
+    audit(db, "Promote Org Admin", user.email, admin.id, "success")
     db.commit()
+    invalidate_request_context([user.id])
     return {"id": user.id, "email": user.email, "role": user.role}
 
 @router.post("/teachers/{user_id}/demote")
@@ -201,124 +198,97 @@ def demote_from_org_admin(user_id: int, db: Session = Depends(get_db), admin: Us
     if not user:
         raise HTTPException(status_code=404, detail="Org admin not found")
     user.role = "teacher"
-    log = AuditLog(action="Demote Org Admin", target=user.email, user_id=admin.id, log_type="warning")
-    db.add(log)
+    audit(db, "Demote Org Admin", user.email, admin.id, "warning")
     db.commit()
+    invalidate_request_context([user.id])
     return {"id": user.id, "email": user.email, "role": user.role}
 
+def _run_bulk(db: Session, admin: User, user_ids: List[int], kind: str, action, message: str,
+              audit_action: str, audit_target: str, log_type: str, **params):
+    """Runs a set-based bulk action inline, or as a chunked background job above BULK_SYNC_LIMIT users."""
+    user_ids = list(dict.fromkeys(user_ids))
+    admin_id = admin.id
+    if len(user_ids) > BULK_SYNC_LIMIT:
+        def run(job):
+            count = bulk.run_in_chunks(job, action, user_ids, **params)
+            job_db = SessionLocal()
+            try:
+                audit(job_db, audit_action, audit_target.format(count=count, **params), admin_id, log_type)
+                job_db.commit()
+            finally:
+                job_db.close()
+            return {"updated": count}
+
+        job = jobs.submit(kind, len(user_ids), run, user_id=admin_id)
+        return JSONResponse(status_code=202, content={"message": f"Started for {len(user_ids)} users", "job": job.to_dict()})
+
+    changed = action(db, user_ids, **params)
+    audit(db, audit_action, audit_target.format(count=len(changed), **params), admin_id, log_type)
+    db.commit()
+    invalidate_request_context(changed)
+    return {"message": message.format(count=len(changed), **params), "updated": len(changed)}
+
 @router.post("/teachers/bulk-block")
 def bulk_block_teachers(req: BulkActionRequest, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
-    users = db.query(User).filter(User.id.in_(req.user_ids), User.role == "teacher").all()
-    count = 0
-    for u in users:
-        u.is_active = False
-        count += 1
-    db.commit()
-    
-    log = AuditLog(action="Bulk Block", target=f"{count} users", user_id=admin.id, log_type="warning")
-    db.add(log)
-    db.commit()
-    return {"message": f"Blocked {count} teachers"}
+    return _run_bulk(db, admin, req.user_ids, "bulk-block", bulk.set_active, "Blocked {count} teachers",
+                     "Bulk Block", "{count} users", "warning", active=False)
 
 @router.post("/teachers/bulk-unblock")
 def bulk_unblock_teachers(req: BulkActionRequest, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
-    users = db.query(User).filter(User.id.in_(req.user_ids), User.role == "teacher").all()
-    count = 0
-    for u in users:
-        u.is_active = True
-        count += 1
-    db.commit()
-
-    log = AuditLog(action="Bulk Unblock", target=f"{count} users", user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
-    return {"message": f"Unblocked {count} teachers"}
+    return _run_bulk(db, admin, req.user_ids, "bulk-unblock", bulk.set_active, "Unblocked {count} teachers",
+                     "Bulk Unblock", "{count} users", "success", active=True)
 
 @router.post("/teachers/bulk-change-plan")
 def bulk_change_plan(req: BulkActionRequest, plan: str = "free", db: Session = Depends(get_db), admin: User = Depends(require_admin)):
-    users = db.query(User).filter(User.id.in_(req.user_ids), User.role == "teacher").all()
-    count = 0
-    for u in users:
-        sub = db.query(UserSubscription).filter(UserSubscription.user_id == u.id).first()
-        if sub:
-            sub.plan = plan.lower()
-            sub.expires_at = datetime.utcnow() + timedelta(days=365)
-        else:
-            sub = UserSubscription(
-                user_id=u.id,
-                plan=plan.lower(),
-                expires_at=datetime.utcnow() + timedelta(days=365)
-            )
-            db.add(sub)
-        count += 1
-    db.commit()
-
-    log = AuditLog(action="Bulk Change Plan", target=f"{count} users → {plan}", user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
-    return {"message": f"Changed plan for {count} teachers to {plan}"}
+    return _run_bulk(db, admin, req.user_ids, "bulk-change-plan", bulk.change_plan, "Changed plan for {count} teachers to {plan}",
+                     "Bulk Change Plan", "{count} users → {plan}", "success", plan=plan.lower())
 
 @router.post("/teachers/bulk-extend-subscription")
 def bulk_extend_subscription(req: BulkActionRequest, days: int = 30, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
-    users = db.query(User).filter(User.id.in_(req.user_ids), User.role == "teacher").all()
-    count = 0
-    for u in users:
-        sub = db.query(UserSubscription).filter(UserSubscription.user_id == u.id).first()
-        if sub and sub.expires_at:
-            sub.expires_at = sub.expires_at + timedelta(days=days)
-        elif sub:
-            sub.expires_at = datetime.utcnow() + timedelta(days=days)
-        else:
-            sub = UserSubscription(
-                user_id=u.id,
-                plan="pro",
-                expires_at=datetime.utcnow() + timedelta(days=days)
-            )
-            db.add(sub)
-        count += 1
-    db.commit()
-
-    log = AuditLog(action="Bulk Extend Subscription", target=f"{count} users +{days}d", user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
-    return {"message": f"Extended subscription for {count} teachers by {days} days"}
+    return _run_bulk(db, admin, req.user_ids, "bulk-extend-subscription", bulk.extend_subscription,
+                     "Extended subscription for {count} teachers by {days} days",
+                     "Bulk Extend Subscription", "{count} users +{days}d", "success", days=days)
 
 @router.post("/teachers/bulk-delete")
 def bulk_delete_teachers(req: BulkActionRequest, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
     users = db.query(User).filter(User.id.in_(req.user_ids), User.role == "teacher").all()
     user_ids = [u.id for u in users]
     
-    from apps.generator.models import TokenUsage, GenerationLog
+    from apps.generator.models import TokenUsage, GenerationLog, UsageDaily
     from apps.payments.models import UserSubscription, UserPayment
     
     try:
         db.query(TokenUsage).filter(TokenUsage.user_id.in_(user_ids)).delete(synchronize_session=False)
+        db.query(UsageDaily).filter(UsageDaily.user_id.in_(user_ids)).delete(synchronize_session=False)
         db.query(GenerationLog).filter(GenerationLog.user_id.in_(user_ids)).delete(synchronize_session=False)
         db.query(UserSubscription).filter(UserSubscription.user_id.in_(user_ids)).delete(synchronize_session=False)
         db.query(UserPayment).filter(UserPayment.user_id.in_(user_ids)).delete(synchronize_session=False)
         
         db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        audit(db, "Bulk Delete", f"{len(user_ids)} users", admin.id, "danger", critical=True)
         db.commit()
+        invalidate_request_context(user_ids)
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Bulk delete failed: {str(e)}")
-        
-    log = AuditLog(action="Bulk Delete", target=f"{len(user_ids)} users", user_id=admin.id, log_type="danger")
-    db.add(log)
-    db.commit()
     return {"message": f"Deleted {len(user_ids)} teachers and their usage records"}
 
 # ── Analytics ─────────────────────────────────────────────────
 
 @router.get("/analytics", response_model=List[TokenUsageStats])
 def get_analytics(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    totals = (
+        db.query(UsageDaily.user_id, func.sum(UsageDaily.tokens).label("total_tokens"))
+        .group_by(UsageDaily.user_id)
+        .subquery()
+    )
     stats = db.query(
         User.id,
         User.full_name,
         User.email,
-        func.sum(TokenUsage.tokens_total).label("total_tokens"),
-        func.max(TokenUsage.created_at).label("last_active")
-    ).outerjoin(TokenUsage).filter(User.role == "teacher").group_by(User.id).all()
+        totals.c.total_tokens,
+        User.last_active_at.label("last_active")
+    ).outerjoin(totals, totals.c.user_id == User.id).filter(User.role == "teacher").all()
     
     return [
         TokenUsageStats(
@@ -346,12 +316,9 @@ def get_orgs(
 def create_org(req: OrganizationCreate, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
     org = Organization(**req.dict())
     db.add(org)
+    audit(db, "Create Org", org.name, admin.id, "success")
     db.commit()
     db.refresh(org)
-    
-    log = AuditLog(action="Create Org", target=org.name, user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
     return org
 
 @router.put("/organizations/{org_id}", response_model=OrganizationResponse)
@@ -363,12 +330,9 @@ def update_org(org_id: int, req: OrganizationUpdate, db: Session = Depends(get_d
     for field, value in req.dict(exclude_unset=True).items():
         setattr(org, field, value)
     
+    audit(db, "Update Org", org.name, admin.id, "success")
     db.commit()
     db.refresh(org)
-    
-    log = AuditLog(action="Update Org", target=org.name, user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
     return org
 
 @router.delete("/organizations/{org_id}")
@@ -378,58 +342,74 @@ def delete_org(org_id: int, db: Session = Depends(get_db), admin: User = Depends
         raise HTTPException(status_code=404, detail="Organization not found")
 
     name = org.name
+    members = [uid for (uid,) in db.query(User.id).filter(User.organization_id == org_id)]
     db.query(User).filter(User.organization_id == org_id).update({"organization_id": None})
+    set_profile_organization(db, members, None)
     db.delete(org)
+    audit(db, "Delete Org", name, admin.id, "danger", critical=True)
     db.commit()
-    
-    log = AuditLog(action="Delete Org", target=name, user_id=admin.id, log_type="danger")
-    db.add(log)
-    db.commit()
+    invalidate_request_context(members)  # their organization and its Gemini key are gone
     return {"message": "Organization deleted"}
 
+# Short per-worker cache: the school dashboard is polled, the numbers move slowly
+_org_stats_cache = TTLCache(ttl=ORG_STATS_CACHE_SECONDS, maxsize=512)
+
+
 @router.get("/organizations/{org_id}/stats", response_model=OrgStatsResponse)
 def get_org_stats(org_id: int, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
-    org = db.query(Organization).filter(Organization.id == org_id).first()
-    if not org:
-        raise HTTPException(status_code=404, detail="Organization not found")
-        
+    cached = _org_stats_cache.get(org_id) if ORG_STATS_CACHE_SECONDS > 0 else None
+    if cached is not None:
+        return cached
+
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    teachers = db.query(User).filter(User.role == "teacher", User.organization_id == org_id).all()
-    
-    teacher_stats = []
-    total_generations = 0
-    active_last_7 = 0
-    
-    for t in teachers:
-        tokens_30d = db.query(TokenUsage).filter(
-            TokenUsage.user_id == t.id,
-            TokenUsage.created_at >= thirty_days_ago
-        ).count()
-        
-        last_log = db.query(TokenUsage).filter(TokenUsage.user_id == t.id).order_by(TokenUsage.created_at.desc()).first()
-        last_active = last_log.created_at.strftime("%Y-%m-%d") if last_log else None
-        
-        if last_log and last_log.created_at >= seven_days_ago:
-            active_last_7 += 1
-            
-        total_generations += tokens_30d
-        
-        teacher_stats.append(TeacherStatItem(
-            name=t.full_name or "Unknown",
-            email=t.email,
-            generations_30d=tokens_30d,
-            last_active=last_active
-        ))
-
-    return OrgStatsResponse(
-        org_name=org.name,
-        total_teachers=len(teachers),
-        active_last_7_days=active_last_7,
-        total_generations=total_generations,
-        teachers=teacher_stats
+
+    # One round-trip regardless of school size: per-teacher 30-day totals from
+    # the daily rollup, org-wide totals as window aggregates over the same rows.
+    generations_30d = (
+        db.query(UsageDaily.user_id, func.sum(UsageDaily.generations).label("generations"))
+        .filter(UsageDaily.day >= thirty_days_ago.date())
+        .group_by(UsageDaily.user_id)
+        .subquery()
+    )
+    generations = func.coalesce(generations_30d.c.generations, 0)
+    rows = db.query(
+        Organization.name.label("org_name"),
+        User.full_name,
+        User.email,
+        User.last_active_at,
+        generations.label("generations"),
+        func.count(User.id).over().label("total_teachers"),
+        func.coalesce(func.sum(generations).over(), 0).label("total_generations"),
+        func.sum(case((User.last_active_at >= seven_days_ago, 1), else_=0)).over().label("active_last_7"),
+    ).select_from(Organization).outerjoin(
+        User, and_(User.organization_id == Organization.id, User.role == "teacher")
+    ).outerjoin(
+        generations_30d, generations_30d.c.user_id == User.id
+    ).filter(Organization.id == org_id).order_by(User.id).all()
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="Organization not found")
+
+    first = rows[0]
+    stats = OrgStatsResponse(
+        org_name=first.org_name,
+        total_teachers=first.total_teachers,
+        active_last_7_days=int(first.active_last_7 or 0),
+        total_generations=int(first.total_generations),
+        teachers=[
+            TeacherStatItem(
+                name=t.full_name or "Unknown",
+                email=t.email,
+                generations_30d=int(t.generations),
+                last_active=t.last_active_at.strftime("%Y-%m-%d") if t.last_active_at else None
+            )
+            for t in rows if t.email is not None  # org without teachers yields one empty row
+        ]
     )
+    if ORG_STATS_CACHE_SECONDS > 0:
+        _org_stats_cache.set(org_id, stats)
+    return stats
 
 @router.get("/organizations/{org_id}/users", response_model=List[UserResponse])
 def get_org_users(org_id: int, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
@@ -448,54 +428,26 @@ def get_org_users(org_id: int, db: Session = Depends(get_db), admin: User = Depe
 
     return teachers
 
-@router.post("/organizations/{org_id}/import-csv", response_model=BulkImportResponse)
+@router.post("/organizations/{org_id}/import-csv", status_code=202)
 async def import_csv(org_id: int, file: UploadFile = File(...), db: Session = Depends(get_db), admin: User = Depends(require_admin)):
     org = db.query(Organization).filter(Organization.id == org_id).first()
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
-        
-    content = await file.read()
+
+    # Spool to disk in chunks: the job outlives the request (and the UploadFile)
+    fd, path = tempfile.mkstemp(prefix="import_upload_", suffix=".csv")
+    with os.fdopen(fd, "wb") as f:
+        while chunk := await file.read(1 << 20):
+            f.write(chunk)
     try:
-        text = content.decode("utf-8")
-    except UnicodeDecodeError:
+        total = csv_import.count_rows(path)
+    except (UnicodeDecodeError, csv.Error):
+        os.remove(path)
         raise HTTPException(status_code=400, detail="Ensure the CSV is UTF-8 encoded")
-        
-    reader = csv.DictReader(io.StringIO(text))
-    created = []
-    skipped = []
-    errors = []
-    
-    for row in reader:
-        email = row.get("email", "").strip()
-        name = row.get("name", "").strip()
-        if not email:
-            errors.append("Row missing email")
-            continue
-            
-        existing = db.query(User).filter(User.email == email).first()
-        if existing:
-            skipped.append(email)
-            continue
-            
-        temp_pwd = str(uuid.uuid4())[:8]
-        user = User(
-            email=email,
-            full_name=name,
-            hashed_password=pwd_context.hash(temp_pwd),
-            role="teacher",
-            organization_id=org_id
-        )
-        db.add(user)
-        created.append(ImportedTeacher(email=email, temp_password=temp_pwd))
-        
-    org.used_seats += len(created)
-    db.commit()
-    
-    log = AuditLog(action="Bulk CSV Import", target=f"{len(created)} created", user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
-    
-    return BulkImportResponse(created=created, skipped=skipped, errors=errors)
+
+    admin_id = admin.id
+    job = jobs.submit("import-csv", total, lambda job: csv_import.run_import(job, path, org_id, admin_id), user_id=admin_id)
+    return job.to_dict()
 
 # ── Invites ───────────────────────────────────────────────────
 
@@ -515,12 +467,9 @@ def create_invite(org_id: int, req: InviteCreate, db: Session = Depends(get_db),
         max_uses=req.max_uses
     )
     db.add(new_invite)
+    audit(db, "Create Invite", f"Org {org.name}", admin.id, "success")
     db.commit()
     db.refresh(new_invite)
-    
-    log = AuditLog(action="Create Invite", target=f"Org {org.name}", user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
     return new_invite
 
 @router.get("/organizations/{org_id}/invites", response_model=List[InviteResponse])
@@ -540,20 +489,17 @@ def set_org_token_limit(
     org = db.query(Organization).filter(Organization.id == org_id).first()
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
-    updated = db.query(User).filter(
-        User.organization_id == org_id,
-        User.role.in_(["teacher", "org_admin"]),
-    ).all()
-    for user in updated:
-        user.tokens_limit = tokens_limit
-    log = AuditLog(
-        action=f"Set Org Token Limit: {tokens_limit}",
-        target=org.name,
-        user_id=admin.id,
-        log_type="success",
-    )
-    db.add(log)
-    db.commit()
+    # Single UPDATE ... RETURNING instead of loading every teacher into the session
+    updated = db.execute(
+        update(User)
+        .where(User.organization_id == org_id, User.role.in_(["teacher", "org_admin"]))
+        .values(tokens_limit=tokens_limit)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    audit(db, f"Set Org Token Limit: {tokens_limit}", org.name, admin.id, "success")
+    db.commit()
+    invalidate_request_context(updated)
     return {"updated": len(updated), "tokens_limit": tokens_limit}
 
 
@@ -622,6 +568,23 @@ def get_financial_stats(db: Session = Depends(get_db), admin: User = Depends(req
         ]
     )
 
+# ── Background jobs ───────────────────────────────────────────
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, admin: User = Depends(require_admin)):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/result")
+def download_job_result(job_id: str, admin: User = Depends(require_admin)):
+    job = jobs.get(job_id)
+    # Import results contain temp passwords — only for the admin who started the job
+    if not job or not job.file or job.user_id != admin.id:
+        raise HTTPException(status_code=404, detail="Result not found")
+    return FileResponse(job.file, media_type="text/csv", filename=f"{job.kind}_{job.id[:8]}.csv")
+
 # ── Audit Logs ────────────────────────────────────────────────
 
 @router.get("/audit-logs", response_model=List[AuditLogResponse])
@@ -633,6 +596,16 @@ def get_audit_logs(
 ):
     return db.query(AuditLog).order_by(AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
 
+@router.get("/password-hashing")
+def get_password_hashing_stats(admin: User = Depends(require_admin)):
+    # Pool size, in-flight/queued calls, rejections and queue wait of this worker
+    return passwords.stats()
+
+@router.get("/audit-logs/writer")
+def get_audit_writer_stats(admin: User = Depends(require_admin)):
+    # Queue depth, written/dropped/failed counters and flush latency of this worker
+    return audit_writer.stats()
+
 # ── Global Settings ───────────────────────────────────────────
 
 @router.get("/settings/{key}", response_model=GlobalSettingResponse)
@@ -659,6 +632,7 @@ def set_setting(req: GlobalSettingResponse if False else dict, db: Session = Dep
     
     db.commit()
     db.refresh(setting)
+    catalog.invalidate(ANNOUNCEMENT)
     return setting
 
 @router.post("/impersonate/{user_id}")
@@ -670,8 +644,7 @@ def impersonate_user(user_id: int, db: Session = Depends(get_db), admin: User =
     # Generate token for the target user
     access_token = create_access_token(data={"sub": user.email})
     
-    log = AuditLog(action="Impersonate User", target=user.email, user_id=admin.id, log_type="info")
-    db.add(log)
+    audit(db, "Impersonate User", user.email, admin.id, "info", critical=True)
     db.commit()
     
     return {
@@ -710,14 +683,9 @@ def set_org_gemini_key_endpoint(
         raise HTTPException(status_code=404, detail="Organization not found")
     api_key = (body.get("api_key") or "").strip() or None
     org.custom_gemini_key = api_key
-    log = AuditLog(
-        action="Set Org Gemini Key",
-        target=f"org:{org.name}",
-        user_id=admin.id,
-        log_type="info",
-    )
-    db.add(log)
+    audit(db, "Set Org Gemini Key", f"org:{org.name}", admin.id, "info", critical=True)
     db.commit()
+    invalidate_request_context()  # every teacher of the org caches the key
     return {
         "org_id": org_id,
         "has_custom_key": bool(org.custom_gemini_key),
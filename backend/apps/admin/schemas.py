@@ -90,17 +90,6 @@ class OrgStatsResponse(BaseModel):
     total_generations: int
     teachers: List[TeacherStatItem]
 
-# ── B2B: Bulk Import ─────────────────────────────────────────────
-
-class ImportedTeacher(BaseModel):
-    email: str
-    temp_password: str
-
-class BulkImportResponse(BaseModel):
-    created: List[ImportedTeacher]
-    skipped: List[str]
-    errors: List[str]
-
 # ── B2B: Invite System ──────────────────────────────────────────
 
 class InviteCreate(BaseModel):
@@ -0,0 +1,108 @@
+"""
+Per-request auth/plan context for the AI routes.
+
+User, subscription, organization key and quota state come from one joined
+query, are memoized on request.state and cached for AUTH_CONTEXT_TTL_SECONDS.
+The context is a detached snapshot — anything that must be exact (quota) is
+enforced in SQL, see generator/services.reserve_tokens.
+
+Call invalidate_request_context() after blocking or deleting a user,
+changing a role, plan, limits, organization or org key, and after a payment.
+
+The cache is per worker process and so is invalidation: it takes effect at
+once on the worker that made the change, while every other worker keeps its
+copy until the TTL runs out. A blocked or demoted user can therefore keep
+using the AI routes for up to AUTH_CONTEXT_TTL_SECONDS; lower it if that
+window matters more than the saved queries.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+
+from fastapi import Depends, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from apps.auth.dependencies import oauth2_scheme, _email_from_token, _ensure_active
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.payments.models import UserSubscription
+from config import AUTH_CONTEXT_TTL_SECONDS
+from database import get_async_db
+from services.cache import TTLCache
+
+_contexts = TTLCache(ttl=AUTH_CONTEXT_TTL_SECONDS, maxsize=10_000)
+
+
+@dataclass
+class RequestContext:
+    id: int
+    email: str
+    role: str
+    is_active: bool
+    organization_id: Optional[int]
+    tokens_used_this_month: Optional[int]
+    tokens_limit: Optional[int]
+    tokens_reset_at: Optional[datetime]
+    subscription_plan: Optional[str]
+    subscription_expires_at: Optional[datetime]
+    custom_gemini_key: Optional[str]
+
+    @property
+    def plan(self) -> str:
+        """Active plan name; evaluated on access so a cached entry can't outlive the expiry."""
+        if self.subscription_plan and self.subscription_expires_at and self.subscription_expires_at > datetime.utcnow():
+            return self.subscription_plan
+        return "free"
+
+    @property
+    def subscription_expired(self) -> bool:
+        return self.subscription_expires_at is not None and self.subscription_expires_at < datetime.utcnow()
+
+
+_context_query = (
+    select(
+        User.id, User.email, User.role, User.is_active, User.organization_id,
+        User.tokens_used_this_month, User.tokens_limit, User.tokens_reset_at,
+        UserSubscription.plan.label("subscription_plan"),
+        UserSubscription.expires_at.label("subscription_expires_at"),
+        Organization.custom_gemini_key,
+    )
+    .outerjoin(UserSubscription, UserSubscription.user_id == User.id)
+    .outerjoin(Organization, Organization.id == User.organization_id)
+)
+
+
+async def load_request_context(email: str, db: AsyncSession) -> Optional[RequestContext]:
+    row = (await db.execute(_context_query.where(User.email == email))).mappings().first()
+    return RequestContext(**row) if row else None
+
+
+async def get_request_context(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> RequestContext:
+    """Async-route replacement for get_current_user: one query, or none on a cache hit."""
+    ctx = getattr(request.state, "auth_context", None)
+    if ctx is not None:
+        return ctx
+
+    email = _email_from_token(token)
+    ctx = _contexts.get(email)
+    if ctx is None:
+        ctx = await load_request_context(email, db)
+        if ctx is not None:
+            _contexts.set(email, ctx)
+    _ensure_active(ctx)
+    request.state.auth_context = ctx
+    return ctx
+
+
+def invalidate_request_context(user_ids: Optional[Iterable[int]] = None) -> None:
+    """Drops cached contexts for the given users, or all of them (org-wide changes)."""
+    if user_ids is None:
+        _contexts.clear()
+        return
+    ids = set(user_ids)
+    _contexts.discard_if(lambda ctx: ctx.id in ids)
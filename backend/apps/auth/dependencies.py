@@ -8,36 +8,43 @@ from config import SECRET_KEY, ALGORITHM
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def _email_from_token(token: str) -> str:
     if token is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
+        raise _credentials_exception()
+    return email
+
+def _ensure_active(user: User) -> User:
     if user is None:
-        raise credentials_exception
-        
+        raise _credentials_exception()
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account is blocked"
         )
-        
+
     return user
 
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    email = _email_from_token(token)
+    user = db.query(User).filter(User.email == email).first()
+    return _ensure_active(user)
+
 def get_current_active_user(current_user: User = Depends(get_current_user)):
     return current_user
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -22,6 +22,7 @@ class User(Base):
     tokens_used_this_month = Column(Integer, default=0)
     tokens_limit = Column(Integer, default=30000)  # -1 = unlimited
     tokens_reset_at = Column(DateTime, nullable=True)  # when quota was last reset
+    last_active_at = Column(DateTime, nullable=True)  # last generation, kept by the write path
 
     # Relationships are handled via strings to avoid circular imports.
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True)
@@ -47,6 +48,9 @@ class PasswordResetToken(Base):
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("idx_audit_logs_timestamp", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     action = Column(String)
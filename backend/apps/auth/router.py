@@ -1,24 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from rate_limiter import limiter
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db
 from apps.auth.models import User, PasswordResetToken
 from apps.auth.schemas import UserLogin, Token, ChangePasswordRequest, UserRegister, ForgotPasswordRequest, ResetPasswordRequest
 from apps.admin.schemas import RegisterWithInviteRequest
 from apps.admin.models import InviteToken, Organization, GlobalSetting
 from apps.auth.dependencies import get_current_user
+from apps.auth.context import RequestContext, get_request_context
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from datetime import timedelta, datetime
 from jose import jwt
-from passlib.context import CryptContext
 import secrets
 import os
 from services.email_service import send_reset_email
+from services.passwords import hash_password, verify_password
+from services import catalog
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def create_access_token(data: dict):
     to_encode = data.copy()
     now_utc = datetime.utcnow()
@@ -30,10 +32,11 @@ def create_access_token(data: dict):
 
 @router.post("/login", response_model=Token)
 @limiter.limit("5/minute")
-def login(request: Request, user_data: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == user_data.email).first()
+async def login(request: Request, user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == user_data.email))).scalars().first()
     
-    if not user or not pwd_context.verify(user_data.password, user.hashed_password):
+    valid, new_hash = await verify_password(user_data.password, user.hashed_password) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -45,6 +48,11 @@ def login(request: Request, user_data: UserLogin, db: Session = Depends(get_db))
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account is blocked. Contact your administrator.",
         )
+
+    if new_hash:
+        # Stored with an outdated bcrypt cost — upgrade it while we have the plaintext
+        user.hashed_password = new_hash
+        await db.commit()
         
     access_token = create_access_token(data={"sub": user.email})
     return {
@@ -82,29 +90,31 @@ def update_me(data: dict, db: Session = Depends(get_db), user: User = Depends(ge
     return {"message": "Profile updated"}
 
 @router.put("/change-password")
-def change_password(req: ChangePasswordRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def change_password(req: ChangePasswordRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
     # Verify old password
-    if not pwd_context.verify(req.old_password, user.hashed_password):
+    current_hash = (await db.execute(select(User.hashed_password).where(User.id == user.id))).scalar()
+    valid, _ = await verify_password(req.old_password, current_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect old password"
         )
     
     # Hash new password
-    hashed_password = pwd_context.hash(req.new_password)
-    user.hashed_password = hashed_password
-    db.commit()
+    hashed_password = await hash_password(req.new_password)
+    await db.execute(update(User).where(User.id == user.id).values(hashed_password=hashed_password))
+    await db.commit()
     
     return {"message": "Password updated successfully"}
 
 @router.post("/register-with-invite", response_model=Token)
-def register_with_invite(req: RegisterWithInviteRequest, db: Session = Depends(get_db)):
+async def register_with_invite(req: RegisterWithInviteRequest, db: AsyncSession = Depends(get_async_db)):
     # 1. Validate Invite
-    invite = db.query(InviteToken).filter(
+    invite = (await db.execute(select(InviteToken).where(
         InviteToken.token == req.token,
         InviteToken.is_active == 1,
         InviteToken.expires_at > datetime.utcnow()
-    ).first()
+    ))).scalars().first()
     
     if not invite:
         raise HTTPException(status_code=400, detail="Invalid or expired invite token")
@@ -113,12 +123,12 @@ def register_with_invite(req: RegisterWithInviteRequest, db: Session = Depends(g
         raise HTTPException(status_code=400, detail="Invite capacity reached")
         
     # 2. Check organization seats
-    org = db.query(Organization).filter(Organization.id == invite.org_id).first()
+    org = await db.get(Organization, invite.org_id)
     if not org or org.used_seats >= org.license_seats:
         raise HTTPException(status_code=400, detail="No available seats in organization")
 
     # 3. Check if user already exists
-    existing = db.query(User).filter(User.email == req.email).first()
+    existing = (await db.execute(select(User.id).where(User.email == req.email))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
         
@@ -126,7 +136,7 @@ def register_with_invite(req: RegisterWithInviteRequest, db: Session = Depends(g
     new_user = User(
         email=req.email,
         full_name=req.full_name,
-        hashed_password=pwd_context.hash(req.password),
+        hashed_password=await hash_password(req.password),
         role="teacher",
         organization_id=invite.org_id,
         is_active=True
@@ -137,8 +147,7 @@ def register_with_invite(req: RegisterWithInviteRequest, db: Session = Depends(g
     invite.uses_count += 1
     org.used_seats += 1
     
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     # 6. Auto-login
     access_token = create_access_token(data={"sub": new_user.email})
@@ -155,9 +164,9 @@ def onboarding_complete(db: Session = Depends(get_db), user: User = Depends(get_
     return {"message": "Onboarding completed"}
 
 @router.post("/register", response_model=Token)
-def register(req: UserRegister, db: Session = Depends(get_db)):
+async def register(req: UserRegister, db: AsyncSession = Depends(get_async_db)):
     # Check if user already exists
-    existing = db.query(User).filter(User.email == req.email).first()
+    existing = (await db.execute(select(User.id).where(User.email == req.email))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
         
@@ -165,13 +174,12 @@ def register(req: UserRegister, db: Session = Depends(get_db)):
     new_user = User(
         email=req.email,
         full_name=req.full_name,
-        hashed_password=pwd_context.hash(req.password),
+        hashed_password=await hash_password(req.password),
         role="teacher",
         is_active=True
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     # Auto-login
     access_token = create_access_token(data={"sub": new_user.email})
@@ -213,37 +221,41 @@ def forgot_password(request: Request, req: ForgotPasswordRequest, db: Session =
 
 
 @router.post("/reset-password")
-def reset_password(req: ResetPasswordRequest, db: Session = Depends(get_db)):
-    reset_token = db.query(PasswordResetToken).filter(
+async def reset_password(req: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    reset_token = (await db.execute(select(PasswordResetToken).where(
         PasswordResetToken.token == req.token,
         PasswordResetToken.is_used == False,
         PasswordResetToken.expires_at > datetime.utcnow()
-    ).first()
+    ))).scalars().first()
 
     if not reset_token:
         raise HTTPException(status_code=400, detail="Ссылка недействительна или устарела")
 
-    user = db.query(User).filter(User.id == reset_token.user_id).first()
+    user = await db.get(User, reset_token.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
     if len(req.new_password) < 6:
         raise HTTPException(status_code=400, detail="Пароль должен быть не менее 6 символов")
 
-    user.hashed_password = pwd_context.hash(req.new_password)
+    user.hashed_password = await hash_password(req.new_password)
     reset_token.is_used = True
-    db.commit()
+    await db.commit()
 
     return {"message": "Пароль успешно изменён"}
 
 
+ANNOUNCEMENT = "announcement"
+
 @router.get("/announcement")
-def get_announcement(db: Session = Depends(get_db)):
-    # We fetch the special key 'system_alert'
-    alert = db.query(GlobalSetting).filter(GlobalSetting.key == "system_alert").first()
-    enabled = db.query(GlobalSetting).filter(GlobalSetting.key == "alert_enabled").first()
-    
-    return {
-        "text": alert.value if alert else "",
-        "enabled": (enabled.value == "true") if enabled else False
-    }
+def get_announcement(request: Request, db: Session = Depends(get_db)):
+    def load():
+        # The special keys 'system_alert' / 'alert_enabled', in one query
+        settings = dict(db.query(GlobalSetting.key, GlobalSetting.value).filter(
+            GlobalSetting.key.in_(("system_alert", "alert_enabled"))
+        ).all())
+        return {
+            "text": settings.get("system_alert") or "",
+            "enabled": settings.get("alert_enabled") == "true"
+        }
+    return catalog.etag_response(request, catalog.cached(ANNOUNCEMENT, load))
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from typing import List
 from database import get_db
 from apps.classes.models import ClassGroup
-from apps.classes.schemas import ClassCreate, ClassResponse
+from apps.classes.schemas import ClassCreate, ClassResponse, ClassStudentsRequest
+from apps.gamification.models import StudentProfile
+from apps.gamification.services import get_or_create_profile
 from apps.auth.dependencies import get_current_user
 from apps.auth.models import User
 
@@ -70,6 +73,45 @@ def delete_class(
     if db_class.teacher_id != current_user.id and current_user.role != "super_admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this class")
 
+    db.query(StudentProfile).filter(StudentProfile.class_group_id == class_id).update(
+        {"class_group_id": None}, synchronize_session=False
+    )
     db.delete(db_class)
     db.commit()
     return {"message": "Class deleted"}
+
+
+@router.post("/{class_id}/students")
+def set_class_students(
+    class_id: int,
+    req: ClassStudentsRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Puts students into the class (their class leaderboard scope). Teachers
+    can take students no class has yet or move them between their own
+    classes, not pull them out of another teacher's.
+    """
+    db_class = db.query(ClassGroup).filter(ClassGroup.id == class_id).first()
+    if not db_class:
+        raise HTTPException(status_code=404, detail="Class not found")
+    if db_class.teacher_id != current_user.id and current_user.role != "super_admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to modify this class")
+
+    users = db.query(User.id).filter(User.id.in_(req.user_ids))
+    if db_class.organization_id is not None:
+        users = users.filter(User.organization_id == db_class.organization_id)
+    if current_user.role != "super_admin":
+        own_classes = db.query(ClassGroup.id).filter(ClassGroup.teacher_id == current_user.id)
+        users = users.outerjoin(StudentProfile, StudentProfile.user_id == User.id).filter(or_(
+            StudentProfile.class_group_id.is_(None), StudentProfile.class_group_id.in_(own_classes),
+        ))
+    student_ids = [uid for (uid,) in users]
+    for uid in student_ids:
+        get_or_create_profile(db, uid)
+    db.query(StudentProfile).filter(StudentProfile.user_id.in_(student_ids)).update(
+        {"class_group_id": class_id}, synchronize_session=False
+    )
+    db.commit()
+    return {"class_id": class_id, "students": len(student_ids)}
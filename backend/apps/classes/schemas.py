@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class ClassBase(BaseModel):
@@ -19,3 +19,6 @@ class ClassResponse(ClassBase):
 
     class Config:
         from_attributes = True
+
+class ClassStudentsRequest(BaseModel):
+    user_ids: List[int]
@@ -0,0 +1,85 @@
+"""
+Leaderboards: global / class / organization scope, all-time / week / season.
+
+All-time rankings read student_profiles.xp; weekly and seasonal ones read
+season_stats, which process_activity_completion keeps up to date. Top-N is
+an ordered range scan over the (scope, xp) indexes and "my rank" is one
+indexed count of the students ahead — nothing is recomputed per request.
+Top-N lists are cached per worker for LEADERBOARD_CACHE_SECONDS.
+"""
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from apps.auth.models import User
+from apps.gamification.models import StudentProfile, SeasonStats
+from apps.gamification.services import period_key
+from config import LEADERBOARD_CACHE_SECONDS
+from services.cache import TTLCache
+
+SCOPES = ("global", "class", "org")
+PERIODS = ("all", "week", "season")
+
+_top_cache = TTLCache(ttl=LEADERBOARD_CACHE_SECONDS, maxsize=2048)
+
+
+def _scope_filter(scope: str, scope_id: Optional[int]):
+    if scope == "class":
+        return StudentProfile.class_group_id == scope_id
+    if scope == "org":
+        return StudentProfile.organization_id == scope_id
+    return None
+
+
+def _ranked(db: Session, scope: str, scope_id: Optional[int], period: str):
+    """Base query and its xp column for the scope/period."""
+    season = period_key(period)
+    if season is None:
+        xp = StudentProfile.xp
+        query = db.query(StudentProfile).select_from(StudentProfile)
+    else:
+        xp = SeasonStats.total_xp
+        query = db.query(SeasonStats).select_from(SeasonStats).join(
+            StudentProfile, StudentProfile.user_id == SeasonStats.user_id
+        ).filter(SeasonStats.season_name == season)
+    condition = _scope_filter(scope, scope_id)
+    if condition is not None:
+        query = query.filter(condition)
+    return query, xp
+
+
+def top(db: Session, scope: str = "global", scope_id: Optional[int] = None, period: str = "all", limit: int = 10) -> list:
+    key = (scope, scope_id, period, limit)
+    cached = _top_cache.get(key) if LEADERBOARD_CACHE_SECONDS > 0 else None
+    if cached is not None:
+        return cached
+
+    query, xp = _ranked(db, scope, scope_id, period)
+    # Names come from the same query — no per-row User lookup
+    rows = query.join(User, User.id == StudentProfile.user_id).with_entities(
+        StudentProfile.user_id, xp.label("xp"), StudentProfile.level, User.full_name, User.email
+    ).order_by(xp.desc(), StudentProfile.user_id).limit(limit).all()
+
+    result = []
+    for position, row in enumerate(rows, start=1):
+        # Ties share a rank (1, 2, 2, 4)
+        rank = result[-1]["rank"] if result and result[-1]["xp"] == row.xp else position
+        result.append({
+            "rank": rank,
+            "user_id": row.user_id,
+            "name": row.full_name or row.email,
+            "xp": row.xp,
+            "level": row.level,
+        })
+    if LEADERBOARD_CACHE_SECONDS > 0:
+        _top_cache.set(key, result)
+    return result
+
+
+def my_rank(db: Session, user_id: int, scope: str = "global", scope_id: Optional[int] = None, period: str = "all") -> dict:
+    """Rank = 1 + students in the scope with more XP."""
+    query, xp = _ranked(db, scope, scope_id, period)
+    my_xp = query.filter(StudentProfile.user_id == user_id).with_entities(xp).scalar() or 0
+    ahead = query.filter(xp > my_xp).with_entities(func.count()).scalar()
+    return {"rank": ahead + 1, "xp": my_xp}
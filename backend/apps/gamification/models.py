@@ -1,25 +1,52 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Index, UniqueConstraint
 from database import Base
 from datetime import datetime
 
 class StudentProfile(Base):
     __tablename__ = "student_profiles"
+    __table_args__ = (
+        # Leaderboards: top-N and "my rank" are index range scans per scope
+        Index("idx_student_profiles_xp", "xp", "user_id", "level"),
+        Index("idx_student_profiles_class_xp", "class_group_id", "xp"),
+        Index("idx_student_profiles_org_xp", "organization_id", "xp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, index=True)
     xp = Column(Integer, default=0)
     coins = Column(Integer, default=0)
     level = Column(Integer, default=1)
+    # Leaderboard scopes, denormalized from the class roster / users.organization_id
+    class_group_id = Column(Integer, ForeignKey("class_groups.id"), nullable=True)
+    organization_id = Column(Integer, nullable=True)
 
 class DailyProgress(Base):
+    """One row per user and Tashkent day (date is local midnight); per-activity counts live in daily_activity_counts."""
     __tablename__ = "daily_progress"
+    __table_args__ = (
+        # Upsert key of the completion path; also what serialises one user's completions
+        Index("uq_daily_progress_user_date", "user_id", "date", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     date = Column(DateTime, index=True)
     total_xp_today = Column(Integer, default=0)
     total_coins_today = Column(Integer, default=0)
-    activity_history = Column(Text) # JSON string
+    activity_history = Column(Text) # legacy JSON, no longer written (see daily_activity_counts)
+
+class DailyActivityCount(Base):
+    """Completions per day: kind "activity" is keyed by activity_id, kind "type" by activity_type."""
+    __tablename__ = "daily_activity_counts"
+    __table_args__ = (
+        UniqueConstraint("progress_id", "kind", "key", name="uq_daily_activity_counts_progress_kind_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    progress_id = Column(Integer, ForeignKey("daily_progress.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
 
 class XPTransaction(Base):
     __tablename__ = "xp_transactions"
@@ -31,6 +58,20 @@ class XPTransaction(Base):
     activity_id = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class ActivityEvent(Base):
+    """Client event ids already applied by /activity/complete-batch, with the reward they got — makes retries no-ops."""
+    __tablename__ = "activity_events"
+    __table_args__ = (
+        UniqueConstraint("user_id", "event_id", name="uq_activity_events_user_event"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    event_id = Column(String, nullable=False)
+    xp_earned = Column(Integer, nullable=False, default=0)
+    coins_earned = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class CoinTransaction(Base):
     __tablename__ = "coin_transactions"
     
@@ -42,7 +83,12 @@ class CoinTransaction(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class SeasonStats(Base):
+    """XP earned per period; season_name is "week:2026-W42" or "season:2026-Q4" (Tashkent time)."""
     __tablename__ = "season_stats"
+    __table_args__ = (
+        Index("uq_season_stats_user_season", "user_id", "season_name", unique=True),
+        Index("idx_season_stats_season_xp", "season_name", "total_xp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
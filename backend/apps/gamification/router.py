@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from database import get_db
 from apps.gamification.models import StudentProfile, ShopItem, Purchase, CoinTransaction
-from apps.gamification.schemas import StudentProfileResponse, ActivityCompletionRequest, ShopItemResponse, PurchaseRequest
-from apps.gamification.services import get_or_create_daily_progress, process_activity_completion
+from apps.gamification.schemas import (
+    StudentProfileResponse, ActivityCompletionRequest, ActivityBatchRequest, ShopItemResponse, PurchaseRequest
+)
+from apps.gamification.services import (
+    get_daily_progress, get_or_create_profile, process_activity_completion, process_activity_batch,
+    DAILY_XP_LIMIT, DAILY_COINS_LIMIT
+)
+from apps.gamification import leaderboard
 from apps.auth.dependencies import get_current_user
 from apps.auth.models import User
-from typing import List
+from apps.classes.models import ClassGroup
+from config import ACTIVITY_BATCH_MAX_EVENTS
+from services import catalog
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -15,37 +24,64 @@ profile_router = APIRouter(prefix="/gamification", tags=["gamification"])
 
 @profile_router.get("/profile", response_model=StudentProfileResponse)
 def get_profile(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    profile = db.query(StudentProfile).filter(StudentProfile.user_id == user.id).first()
-    if not profile:
-        profile = StudentProfile(user_id=user.id, xp=0, coins=0, level=1)
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
-    return profile
+    return get_or_create_profile(db, user.id)
 
 @profile_router.get("/daily-stats")
 def get_daily_stats(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    progress = get_or_create_daily_progress(db, user.id)
+    progress = get_daily_progress(db, user.id)
     return {
-        "xp_today": progress.total_xp_today,
-        "coins_today": progress.total_coins_today,
-        "limit_xp": 300,
-        "limit_coins": 60
+        "xp_today": progress.total_xp_today if progress else 0,
+        "coins_today": progress.total_coins_today if progress else 0,
+        "limit_xp": DAILY_XP_LIMIT,
+        "limit_coins": DAILY_COINS_LIMIT
     }
 
+def _leaderboard_scope(scope: str, period: str, class_id: Optional[int], db: Session, user: User) -> Optional[int]:
+    """Validates scope/period and returns the class/org id the board is for."""
+    if scope not in leaderboard.SCOPES or period not in leaderboard.PERIODS:
+        raise HTTPException(status_code=400, detail=f"scope must be one of {leaderboard.SCOPES}, period one of {leaderboard.PERIODS}")
+    if scope == "class":
+        own_class_id = db.query(StudentProfile.class_group_id).filter(StudentProfile.user_id == user.id).scalar()
+        if class_id is None:
+            class_id = own_class_id
+        if class_id is None:
+            raise HTTPException(status_code=400, detail="class_id is required for the class leaderboard")
+        if class_id != own_class_id and user.role != "super_admin":
+            db_class = db.query(ClassGroup.teacher_id, ClassGroup.organization_id).filter(ClassGroup.id == class_id).first()
+            if not db_class:
+                raise HTTPException(status_code=404, detail="Class not found")
+            org_admin = user.role == "org_admin" and db_class.organization_id is not None and db_class.organization_id == user.organization_id
+            if db_class.teacher_id != user.id and not org_admin:
+                raise HTTPException(status_code=403, detail="Not a member of this class")
+        return class_id
+    if scope == "org":
+        if user.organization_id is None:
+            raise HTTPException(status_code=400, detail="User is not in an organization")
+        return user.organization_id
+    return None
+
 @profile_router.get("/leaderboard")
-def get_leaderboard(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    top_students = db.query(StudentProfile).order_by(StudentProfile.xp.desc()).limit(10).all()
-    result = []
-    for s in top_students:
-        u = db.query(User).filter(User.id == s.user_id).first()
-        if u:
-            result.append({
-                "name": u.full_name or u.email,
-                "xp": s.xp,
-                "level": s.level
-            })
-    return result
+def get_leaderboard(
+    scope: str = "global",
+    period: str = "all",
+    class_id: Optional[int] = None,
+    limit: int = 10,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    scope_id = _leaderboard_scope(scope, period, class_id, db, user)
+    return leaderboard.top(db, scope, scope_id, period, limit=min(max(limit, 1), 100))
+
+@profile_router.get("/leaderboard/me")
+def get_my_rank(
+    scope: str = "global",
+    period: str = "all",
+    class_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    scope_id = _leaderboard_scope(scope, period, class_id, db, user)
+    return {"scope": scope, "period": period, **leaderboard.my_rank(db, user.id, scope, scope_id, period)}
 
 router.include_router(profile_router)
 
@@ -71,14 +107,53 @@ def complete_activity(req: ActivityCompletionRequest, db: Session = Depends(get_
         }
     }
 
+def _awardable_students(db: Session, user: User, user_ids: set[int]) -> set[int]:
+    """Of user_ids: the caller, students in the caller's classes, or any existing user for super_admin."""
+    allowed = {user.id} & user_ids
+    others = user_ids - allowed
+    if not others:
+        return allowed
+    if user.role == "super_admin":
+        query = db.query(User.id).filter(User.id.in_(others))
+    else:
+        query = db.query(StudentProfile.user_id).join(
+            ClassGroup, ClassGroup.id == StudentProfile.class_group_id
+        ).filter(StudentProfile.user_id.in_(others), ClassGroup.teacher_id == user.id)
+    return allowed | {uid for (uid,) in query}
+
+@activity_router.post("/complete-batch")
+def complete_activity_batch(req: ActivityBatchRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    """End-of-game submission: every student's completions in one request and one transaction."""
+    if not req.events:
+        raise HTTPException(status_code=400, detail="No events")
+    if len(req.events) > ACTIVITY_BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=400, detail=f"At most {ACTIVITY_BATCH_MAX_EVENTS} events per request")
+
+    allowed = _awardable_students(db, user, {e.user_id for e in req.events})
+    accepted = [e.model_dump() for e in req.events if e.user_id in allowed]
+    result = process_activity_batch(db, accepted) if accepted else {"events": [], "students": []}
+
+    applied = iter(result["events"])
+    events = [
+        next(applied) if e.user_id in allowed else
+        {"event_id": e.event_id, "user_id": e.user_id, "status": "forbidden", "xp_earned": 0, "coins_earned": 0}
+        for e in req.events
+    ]
+    return {"events": events, "students": result["students"]}
+
 router.include_router(activity_router)
 
 # --- SHOP ---
 shop_router = APIRouter(prefix="/shop", tags=["shop"])
 
+SHOP_ITEMS = "shop_items"
+
 @shop_router.get("/items", response_model=List[ShopItemResponse])
-def get_shop_items(db: Session = Depends(get_db)):
-    return db.query(ShopItem).all()
+def get_shop_items(request: Request, db: Session = Depends(get_db)):
+    entry = catalog.cached(SHOP_ITEMS, lambda: [
+        ShopItemResponse.model_validate(item).model_dump() for item in db.query(ShopItem).order_by(ShopItem.id)
+    ])
+    return catalog.etag_response(request, entry)
 
 @shop_router.post("/purchase")
 def purchase_item(req: PurchaseRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
@@ -125,6 +200,7 @@ def create_item(item_data: ShopItemResponse, db: Session = Depends(get_db), user
     db.add(new_item)
     db.commit()
     db.refresh(new_item)
+    catalog.invalidate(SHOP_ITEMS)
     return new_item
 
 router.include_router(shop_router)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class StudentProfileResponse(BaseModel):
     xp: int
@@ -13,6 +13,15 @@ class ActivityCompletionRequest(BaseModel):
     activity_type: str
     activity_id: str
 
+class ActivityEventRequest(BaseModel):
+    event_id: str
+    user_id: int
+    activity_type: str
+    activity_id: str
+
+class ActivityBatchRequest(BaseModel):
+    events: List[ActivityEventRequest]
+
 class ShopItemBase(BaseModel):
     name: str
     description: Optional[str] = None
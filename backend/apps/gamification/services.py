@@ -1,7 +1,12 @@
+from sqlalchemy import case, func, select, update
 from sqlalchemy.orm import Session
-from apps.gamification.models import StudentProfile, XPTransaction, CoinTransaction, DailyProgress
+from apps.auth.models import User
+from apps.gamification.models import (
+    StudentProfile, XPTransaction, CoinTransaction, DailyProgress, DailyActivityCount, SeasonStats, ActivityEvent
+)
+from database import dialect_insert
 from datetime import datetime, timedelta
-import json
+from typing import Optional
 
 XP_PER_ACTIVITY = 25
 COINS_PER_ACTIVITY = 6
@@ -11,93 +16,206 @@ VARIETY_BONUS_INCREMENT = 0.05
 MAX_VARIETY_BONUS = 0.20
 DIMINISHING_RETURNS = [1.0, 0.7, 0.4, 0.1, 0.0]
 
+_profiles = StudentProfile.__table__
+_progress = DailyProgress.__table__
+_counts = DailyActivityCount.__table__
+_events = ActivityEvent.__table__
+
 def get_tashkent_now():
     return datetime.utcnow() + timedelta(hours=5)
 
-def get_or_create_daily_progress(db: Session, user_id: int):
-    now = get_tashkent_now()
-    today_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    progress = db.query(DailyProgress).filter(
-        DailyProgress.user_id == user_id,
-        DailyProgress.date >= today_date,
-        DailyProgress.date < today_date + timedelta(days=1)
-    ).first()
-    
-    if not progress:
-        progress = DailyProgress(
-            user_id=user_id,
-            date=today_date,
-            total_xp_today=0,
-            total_coins_today=0,
-            activity_history="{}"
-        )
-        db.add(progress)
+def get_today():
+    """Tashkent midnight — the daily_progress.date of the current day."""
+    return get_tashkent_now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+def get_daily_progress(db: Session, user_id: int) -> Optional[DailyProgress]:
+    return db.query(DailyProgress).filter(DailyProgress.user_id == user_id, DailyProgress.date == get_today()).first()
+
+def set_profile_organization(db: Session, user_ids: list[int], organization_id: Optional[int]) -> None:
+    """
+    Moves the users' profiles to another organization's leaderboard. Called
+    in the transaction that changes users.organization_id (no commit).
+    """
+    if user_ids:
+        db.execute(update(_profiles).where(_profiles.c.user_id.in_(user_ids)).values(organization_id=organization_id))
+
+def get_or_create_profile(db: Session, user_id: int) -> StudentProfile:
+    profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
+    if not profile:
+        # organization_id is copied so org leaderboards don't need a join to users;
+        # set_profile_organization() keeps it in step
+        org_id = db.query(User.organization_id).filter(User.id == user_id).scalar()
+        profile = StudentProfile(user_id=user_id, xp=0, coins=0, level=1, organization_id=org_id)
+        db.add(profile)
         db.commit()
-        db.refresh(progress)
-        
-    return progress
+        db.refresh(profile)
+    return profile
+
+# ── Weekly / seasonal XP (season_stats) ─────────────────────────
+
+def period_key(period: str, now: Optional[datetime] = None) -> Optional[str]:
+    """season_stats.season_name for "week" / "season" (calendar quarter); None for all-time."""
+    now = now or get_tashkent_now()
+    if period == "week":
+        year, week, _ = now.isocalendar()
+        return f"week:{year}-W{week:02d}"
+    if period == "season":
+        return f"season:{now.year}-Q{(now.month - 1) // 3 + 1}"
+    return None
+
+def add_period_xp(db: Session, user_id: int, amount: int) -> None:
+    """Adds XP to the current week and season rows; committed with the caller's transaction."""
+    table = SeasonStats.__table__
+    stmt = dialect_insert(db.get_bind(), table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "season_name"],
+        set_={"total_xp": table.c.total_xp + stmt.excluded.total_xp},
+    )
+    now = get_tashkent_now()
+    db.execute(stmt, [
+        {"user_id": user_id, "season_name": period_key(period, now), "total_xp": amount}
+        for period in ("week", "season")
+    ])
 
 def calculate_level(total_xp: int):
     if total_xp < 100:
         return 1
     return int((total_xp / 100) ** (1 / 1.5)) + 1
 
-def process_activity_completion(db: Session, user_id: int, activity_type: str, activity_id: str):
-    profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
-    if not profile:
-        profile = StudentProfile(user_id=user_id, xp=0, coins=0, level=1)
-        db.add(profile)
-        db.commit()
-    
-    progress = get_or_create_daily_progress(db, user_id)
-    history = json.loads(progress.activity_history)
-    
-    count_for_this_activity = history.get(activity_id, 0)
-    multiplier = DIMINISHING_RETURNS[min(count_for_this_activity, len(DIMINISHING_RETURNS) - 1)]
-    
-    activity_metadata = history.get("__metadata__", {})
-    types_today = set(activity_metadata.keys())
-    
-    bonus_multiplier = 1.0 + min(len(types_today) * VARIETY_BONUS_INCREMENT, MAX_VARIETY_BONUS)
-    
-    reward_xp = int(XP_PER_ACTIVITY * multiplier * bonus_multiplier)
-    reward_coins = int(COINS_PER_ACTIVITY * multiplier)
-    
-    if progress.total_xp_today + reward_xp > DAILY_XP_LIMIT:
-        reward_xp = max(0, DAILY_XP_LIMIT - progress.total_xp_today)
-        
-    if progress.total_coins_today + reward_coins > DAILY_COINS_LIMIT:
-        reward_coins = max(0, DAILY_COINS_LIMIT - progress.total_coins_today)
-        
+# ── Activity completion ─────────────────────────────────────────
+# One transaction of upserts and relative updates: no value is read, changed
+# in Python and written back, so concurrent completions can't lose XP.
+
+def _lock_progress(db: Session, user_id: int):
+    """Upserts today's progress row and returns (id, xp, coins); the no-op update row-locks it until commit."""
+    stmt = dialect_insert(db.get_bind(), _progress).values(
+        user_id=user_id, date=get_today(), total_xp_today=0, total_coins_today=0
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "date"],
+        set_={"total_xp_today": _progress.c.total_xp_today},
+    ).returning(_progress.c.id, _progress.c.total_xp_today, _progress.c.total_coins_today)
+    return db.execute(stmt).one()
+
+def _bump_count(db: Session, progress_id: int, kind: str, key: str) -> int:
+    """Increments a daily counter and returns the new count."""
+    stmt = dialect_insert(db.get_bind(), _counts).values(progress_id=progress_id, kind=kind, key=key, count=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["progress_id", "kind", "key"],
+        set_={"count": _counts.c.count + 1},
+    ).returning(_counts.c.count)
+    return db.execute(stmt).scalar_one()
+
+def _capped_add(column, amount: int, limit: int):
+    """SQL for column + amount, stopping at the daily limit (a total already past it is left as is)."""
+    current = func.coalesce(column, 0)
+    return case(
+        (current + amount <= limit, current + amount),
+        (current >= limit, current),
+        else_=limit,
+    )
+
+def _apply_completion(db: Session, user_id: int, activity_type: str, activity_id: str) -> dict:
+    """Applies one completion in the caller's transaction (no commit)."""
+    # organization_id is copied so org leaderboards don't need a join to users;
+    # set_profile_organization() keeps it in step
+    org_id = select(User.organization_id).where(User.id == user_id).scalar_subquery()
+    db.execute(
+        dialect_insert(db.get_bind(), _profiles)
+        .values(user_id=user_id, xp=0, coins=0, level=1, organization_id=org_id)
+        .on_conflict_do_nothing(index_elements=["user_id"])
+    )
+
+    progress = _lock_progress(db, user_id)
+    times_done = _bump_count(db, progress.id, "activity", activity_id) - 1
+    new_type = _bump_count(db, progress.id, "type", activity_type) == 1
+    types_today = db.execute(
+        select(func.count()).select_from(_counts).where(_counts.c.progress_id == progress.id, _counts.c.kind == "type")
+    ).scalar_one() - (1 if new_type else 0)
+
+    multiplier = DIMINISHING_RETURNS[min(times_done, len(DIMINISHING_RETURNS) - 1)]
+    bonus_multiplier = 1.0 + min(types_today * VARIETY_BONUS_INCREMENT, MAX_VARIETY_BONUS)
+    base_xp = int(XP_PER_ACTIVITY * multiplier * bonus_multiplier)
+    base_coins = int(COINS_PER_ACTIVITY * multiplier)
+
+    # Daily caps are applied by the UPDATE itself; the reward is whatever it actually added
+    totals = db.execute(
+        update(_progress).where(_progress.c.id == progress.id).values(
+            total_xp_today=_capped_add(_progress.c.total_xp_today, base_xp, DAILY_XP_LIMIT),
+            total_coins_today=_capped_add(_progress.c.total_coins_today, base_coins, DAILY_COINS_LIMIT),
+        ).returning(_progress.c.total_xp_today, _progress.c.total_coins_today)
+    ).one()
+    reward_xp = totals.total_xp_today - (progress.total_xp_today or 0)
+    reward_coins = totals.total_coins_today - (progress.total_coins_today or 0)
+
+    profile = db.execute(
+        update(_profiles).where(_profiles.c.user_id == user_id).values(
+            xp=func.coalesce(_profiles.c.xp, 0) + reward_xp,
+            coins=func.coalesce(_profiles.c.coins, 0) + reward_coins,
+        ).returning(_profiles.c.xp, _profiles.c.coins, _profiles.c.level)
+    ).one()
+    level = calculate_level(profile.xp)
+    if level != profile.level:
+        db.execute(update(_profiles).where(_profiles.c.user_id == user_id).values(level=level))
+
     if reward_xp > 0:
-        profile.xp += reward_xp
-        profile.level = calculate_level(profile.xp)
-        progress.total_xp_today += reward_xp
-        
-        xp_tx = XPTransaction(user_id=user_id, amount=reward_xp, activity_type=activity_type, activity_id=activity_id)
-        db.add(xp_tx)
-        
+        db.add(XPTransaction(user_id=user_id, amount=reward_xp, activity_type=activity_type, activity_id=activity_id))
+        add_period_xp(db, user_id, reward_xp)
+
     if reward_coins > 0:
-        profile.coins += reward_coins
-        progress.total_coins_today += reward_coins
-        
-        coin_tx = CoinTransaction(user_id=user_id, amount=reward_coins, transaction_type="reward", description=f"Reward for {activity_type}")
-        db.add(coin_tx)
-        
-    history[activity_id] = count_for_this_activity + 1
-    activity_metadata[activity_type] = activity_metadata.get(activity_type, 0) + 1
-    history["__metadata__"] = activity_metadata
-    
-    progress.activity_history = json.dumps(history)
-    
-    db.commit()
-    db.refresh(profile)
-    
+        db.add(CoinTransaction(user_id=user_id, amount=reward_coins, transaction_type="reward", description=f"Reward for {activity_type}"))
+
     return {
         "xp_earned": reward_xp,
         "coins_earned": reward_coins,
         "new_xp": profile.xp,
         "new_coins": profile.coins,
-        "new_level": profile.level
+        "new_level": level
     }
+
+def process_activity_completion(db: Session, user_id: int, activity_type: str, activity_id: str):
+    result = _apply_completion(db, user_id, activity_type, activity_id)
+    db.commit()
+    return result
+
+def process_activity_batch(db: Session, events: list[dict]) -> dict:
+    """
+    Applies many completions in one transaction. Each event is keyed by
+    (user_id, event_id) in activity_events: an event seen before is reported
+    as "duplicate" with the reward it got the first time and not applied again.
+    Events run grouped by user (in request order within a user), so concurrent
+    batches lock progress rows in the same order.
+    """
+    results: list[Optional[dict]] = [None] * len(events)
+    students: dict[int, dict] = {}
+    for index in sorted(range(len(events)), key=lambda i: events[i]["user_id"]):
+        event = events[index]
+        user_id = event["user_id"]
+        inserted = db.execute(
+            dialect_insert(db.get_bind(), _events)
+            .values(user_id=user_id, event_id=event["event_id"], xp_earned=0, coins_earned=0, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=["user_id", "event_id"])
+            .returning(_events.c.id)
+        ).scalar()
+        if inserted is None:
+            seen = db.execute(
+                select(_events.c.xp_earned, _events.c.coins_earned)
+                .where(_events.c.user_id == user_id, _events.c.event_id == event["event_id"])
+            ).one()
+            results[index] = {"event_id": event["event_id"], "user_id": user_id, "status": "duplicate",
+                              "xp_earned": seen.xp_earned, "coins_earned": seen.coins_earned}
+            continue
+
+        reward = _apply_completion(db, user_id, event["activity_type"], event["activity_id"])
+        db.execute(update(_events).where(_events.c.id == inserted).values(
+            xp_earned=reward["xp_earned"], coins_earned=reward["coins_earned"]
+        ))
+        results[index] = {"event_id": event["event_id"], "user_id": user_id, "status": "applied",
+                          "xp_earned": reward["xp_earned"], "coins_earned": reward["coins_earned"]}
+        student = students.setdefault(user_id, {"user_id": user_id, "xp_earned": 0, "coins_earned": 0})
+        student["xp_earned"] += reward["xp_earned"]
+        student["coins_earned"] += reward["coins_earned"]
+        student.update(xp=reward["new_xp"], coins=reward["new_coins"], level=reward["new_level"])
+
+    db.commit()
+    return {"events": results, "students": list(students.values())}
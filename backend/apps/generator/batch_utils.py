@@ -1,20 +1,87 @@
-import io
+import asyncio
+import logging
 import zipfile
-from typing import List, Dict, Any
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
 
-def create_batch_zip(variants: List[Dict[str, Any]], tool_type: str) -> io.BytesIO:
+from config import BATCH_CONCURRENCY
+from services import gemini_service
+
+logger = logging.getLogger(__name__)
+
+
+def batch_concurrency() -> int:
     """
-    Создает ZIP-архив в памяти, содержащий несколько вариантов заданий.
+    Сколько вариантов генерировать одновременно: BATCH_CONCURRENCY, но не
+    больше одного запроса на каждый свободный ключ Gemini — иначе пачка
+    запросов разом уводит ключи в cooldown. Без свободных ключей запросы
+    уходят в OpenAI, и ограничивает только BATCH_CONCURRENCY.
     """
-    buffer = io.BytesIO()
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        for i, variant in enumerate(variants):
-            content = format_variant_content(variant, tool_type)
-            file_name = f"variant_{i+1}.txt"
-            zip_file.writestr(file_name, content)
-    
-    buffer.seek(0)
-    return buffer
+    capacity = gemini_service.key_manager.capacity()
+    if capacity:
+        return max(1, min(BATCH_CONCURRENCY, capacity))
+    return BATCH_CONCURRENCY
+
+
+async def run_concurrently(
+    calls: List[Callable[[], Awaitable[Tuple[Any, int]]]], limit: int
+) -> AsyncIterator[Tuple[Any, int]]:
+    """
+    Запускает вызовы (каждый возвращает (результат, токены)) не более чем по
+    `limit` одновременно и отдаёт результаты в порядке готовности. Упавший
+    вызов даёт (None, 0). Если итерацию бросили, оставшиеся вызовы отменяются.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+
+    tasks = [asyncio.create_task(run(call)) for call in calls]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            try:
+                yield await finished
+            except Exception:
+                logger.exception("Batch variant failed")
+                yield None, 0
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class _ZipSink:
+    """Поток без seek() для ZipFile: копит записанное, пока его не заберут."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_batch_zip(variants: AsyncIterator[Dict[str, Any]], tool_type: str) -> AsyncIterator[bytes]:
+    """
+    ZIP-архив вариантов по частям: каждый файл отдаётся, как только готов его
+    вариант, оглавление архива — в конце. Архив целиком в памяти не держится.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        number = 0
+        async for variant in variants:
+            number += 1
+            zip_file.writestr(f"variant_{number}.txt", format_variant_content(variant, tool_type))
+            yield sink.take()
+    yield sink.take()
+
 
 def format_variant_content(variant: Dict[str, Any], tool_type: str) -> str:
     """
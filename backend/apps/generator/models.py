@@ -1,33 +1,94 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, ForeignKey, JSON, Boolean, LargeBinary, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
+import json
+from apps.generator.storage import encode_content, decode_content, count_items, extract_search_text
 
 class TokenUsage(Base):
     __tablename__ = "token_usage"
+    __table_args__ = (
+        Index("idx_token_usage_user_id", "user_id"),
+        Index("idx_token_usage_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     feature_name = Column(String) # e.g., "math_gen", "crossword"
     tokens_total = Column(Integer)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Partition key on PostgreSQL (monthly, see services/partitions.py); the
+    # primary key there is (id, created_at)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="token_usage")
 
 class GenerationLog(Base):
     __tablename__ = "generation_logs"
+    __table_args__ = (
+        Index("idx_generation_logs_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), index=True)
     generator_type = Column(String) # 'math', 'quiz', 'crossword', 'assignment'
     topic = Column(String)
-    content = Column(String) # JSON stored as string for simplicity
-    created_at = Column(DateTime, default=datetime.utcnow)
+    content = Column(String, nullable=True) # legacy: JSON as string, cleared by backfill
+    content_json = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)
+    content_zstd = Column(LargeBinary, nullable=True) # zstd(JSON) for large payloads
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow) # partition key, as in token_usage
     is_favorite = Column(Integer, default=0) # 0 False, 1 True (SQLite compat)
+
+    # Extracted for analytics
+    item_count = Column(Integer, nullable=True)
+    language = Column(String, nullable=True)
+    difficulty = Column(String, nullable=True)
+    # Plain text of the payload for full-text search (content_zstd isn't readable from SQL)
+    search_text = Column(Text, nullable=True)
     
     user = relationship("User")
 
+    @property
+    def payload(self):
+        return decode_content(self.content_json, self.content_zstd, self.content)
+
+    @payload.setter
+    def payload(self, value):
+        self.content_json, self.content_zstd = encode_content(value)
+        self.content = None
+        self.item_count = count_items(value)
+        self.search_text = extract_search_text(value)
+
+    @property
+    def content_text(self) -> str:
+        """JSON string, as the API has always returned it."""
+        if self.content is not None and self.content_json is None and self.content_zstd is None:
+            return self.content
+        return json.dumps(self.payload, ensure_ascii=False)
+
+class UsageDaily(Base):
+    """
+    Daily rollup of generations per (user, feature, day), maintained by the
+    generation write path (recorder.py). Dashboards read this instead of
+    scanning token_usage / generation_logs. organization_id is the user's org
+    at the time of the generation.
+    """
+    __tablename__ = "usage_daily"
+    __table_args__ = (
+        UniqueConstraint("user_id", "feature", "day", name="uq_usage_daily_user_feature_day"),
+        Index("idx_usage_daily_org_day", "organization_id", "day"),
+        Index("idx_usage_daily_day", "day"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    organization_id = Column(Integer, nullable=True)  # no FK: history outlives the org
+    feature = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    generations = Column(Integer, nullable=False, default=0)
+    tokens = Column(BigInteger, nullable=False, default=0)
+
 class Template(Base):
     __tablename__ = "templates"
 
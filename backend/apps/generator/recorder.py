@@ -0,0 +1,231 @@
+"""
+Post-generation write path.
+
+record_generation() writes TokenUsage, GenerationLog, the usage_daily rollup
+and the quota settlement as one unit of work — one transaction instead of
+three commits. With
+GENERATION_WRITE_BUFFER=true the records are queued and a background task
+flushes them in batches (one transaction per batch) off the request path.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from apps.auth.models import User
+from apps.generator.models import TokenUsage, GenerationLog, UsageDaily
+from apps.generator.services import TokenReservation, used_tokens_plus
+from config import GENERATION_WRITE_BUFFER, get_env_int
+from database import dialect_insert, get_async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+_BUFFER_MAX_BATCH = get_env_int("GENERATION_BUFFER_MAX_BATCH", 200)
+_BUFFER_MAX_QUEUE = get_env_int("GENERATION_BUFFER_MAX_QUEUE", 5000)
+_BUFFER_FLUSH_MS = get_env_int("GENERATION_BUFFER_FLUSH_MS", 500)
+
+_users = User.__table__
+_increment_quota = (
+    update(_users)
+    .where(_users.c.id == bindparam("b_user_id"))
+    .values(
+        tokens_used_this_month=used_tokens_plus(bindparam("b_tokens")),
+        last_active_at=bindparam("b_active_at"),
+    )
+)
+_usage_daily = UsageDaily.__table__
+
+# Queued by stop() behind the last record: the flush loop finishes its batch and returns
+_STOP = object()
+
+
+def _upsert_usage_daily(bind):
+    stmt = dialect_insert(bind, _usage_daily)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "feature", "day"],
+        set_={
+            "generations": _usage_daily.c.generations + stmt.excluded.generations,
+            "tokens": _usage_daily.c.tokens + stmt.excluded.tokens,
+            "organization_id": stmt.excluded.organization_id,
+        },
+    )
+
+
+def _build_record(user: User, feature: str, tokens: int, reserved: int, gen_type: Optional[str], topic: Optional[str],
+                  content: Any, language: Optional[str], difficulty: Optional[str]) -> dict:
+    now = datetime.utcnow()
+    return {
+        "user_id": user.id,
+        "organization_id": user.organization_id,
+        "created_at": now,
+        # Reserved tokens are already counted; only the difference is charged
+        "quota_delta": 0 if user.role == "super_admin" else tokens - reserved,
+        "feature": feature,
+        "tokens": tokens,
+        "gen_type": gen_type or feature,
+        "topic": topic,
+        "content": content,
+        "language": language,
+        "difficulty": difficulty,
+    }
+
+
+def _stage(db: AsyncSession, records: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Adds rows for the records to the session, returns (quota updates, daily rollup rows)."""
+    increments: dict[int, list] = {}
+    rollups: dict[tuple, dict] = {}
+    for r in records:
+        if r["tokens"] > 0:
+            db.add(TokenUsage(user_id=r["user_id"], feature_name=r["feature"], tokens_total=r["tokens"]))
+        if r["content"] is not None:
+            db.add(GenerationLog(
+                user_id=r["user_id"],
+                generator_type=r["gen_type"],
+                topic=r["topic"],
+                payload=r["content"],
+                language=r["language"],
+                difficulty=r["difficulty"],
+            ))
+        # Every user in the batch gets last_active_at, even with nothing to charge
+        inc = increments.setdefault(r["user_id"], [0, r["created_at"]])
+        inc[0] += r["quota_delta"]
+        inc[1] = max(inc[1], r["created_at"])
+
+        day = r["created_at"].date()
+        row = rollups.setdefault((r["user_id"], r["feature"], day), {
+            "user_id": r["user_id"], "feature": r["feature"], "day": day, "generations": 0, "tokens": 0,
+        })
+        row["organization_id"] = r["organization_id"]
+        row["generations"] += 1
+        row["tokens"] += r["tokens"]
+    updates = [{"b_user_id": uid, "b_tokens": n, "b_active_at": at} for uid, (n, at) in increments.items()]
+    return updates, list(rollups.values())
+
+
+async def _write(db: AsyncSession, records: list[dict]) -> None:
+    updates, rollups = _stage(db, records)
+    await db.flush()
+    await db.execute(_increment_quota, updates)
+    await db.execute(_upsert_usage_daily(db.get_bind()), rollups)
+    await db.commit()
+
+
+async def record_generation(
+    db: AsyncSession,
+    user: User,
+    feature: str,
+    tokens: int,
+    *,
+    gen_type: Optional[str] = None,
+    topic: Optional[str] = None,
+    content: Any = None,
+    language: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    reservation: Optional[TokenReservation] = None,
+    buffered: bool = True,
+) -> None:
+    """
+    Records a finished generation: usage row, history row (if content is given)
+    and the quota increment. Anything else already added to `db` (e.g. a
+    GeneratedBook) is committed in the same transaction. Pass buffered=False
+    when the caller needs the rows to exist on return. With a reservation only
+    the difference between actual and reserved tokens is charged.
+    """
+    reserved = reservation.reserved if reservation else 0
+    record = _build_record(user, feature, tokens, reserved, gen_type, topic, content, language, difficulty)
+    if not (buffered and generation_buffer.submit(record)):
+        await _write(db, [record])
+    # Only now: if the write raised, the reservation's exit still refunds the estimate
+    if reservation:
+        reservation.settle()
+
+
+class GenerationWriteBuffer:
+    """Bounded in-process queue of generation records, flushed in batches."""
+
+    def __init__(self, enabled: bool, max_batch: int, max_queue: int, flush_interval: float):
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.failed = 0
+
+    def submit(self, record: dict) -> bool:
+        """False if buffering is off or the queue is full — caller writes inline."""
+        if self._task is None:
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        task, self._task = self._task, None  # stop accepting new records
+        # Not cancel(): the loop may hold a batch it has taken off the queue, or be writing one
+        await self._queue.put(_STOP)
+        await task
+        await self._drain()
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+
+    async def _drain(self) -> None:
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+            if len(batch) >= self.max_batch:
+                await self._flush(batch)
+                batch = []
+        if batch:
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[dict]) -> None:
+        try:
+            async with get_async_sessionmaker()() as db:
+                await _write(db, batch)
+            self.flushed += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to flush %d generation records", len(batch))
+
+
+generation_buffer = GenerationWriteBuffer(
+    enabled=GENERATION_WRITE_BUFFER,
+    max_batch=_BUFFER_MAX_BATCH,
+    max_queue=_BUFFER_MAX_QUEUE,
+    flush_interval=_BUFFER_FLUSH_MS / 1000,
+)
@@ -1,17 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, cast, Date
-from database import get_db
-from apps.generator.models import TokenUsage, GenerationLog, Template
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from database import get_db, get_async_db, get_async_sessionmaker
+from apps.generator.models import GenerationLog, Template, UsageDaily
 from apps.classes.models import ClassGroup
 from apps.auth.models import User
 from apps.generator.schemas import MathRequest, CrosswordRequest, QuizRequest, AssignmentRequest, JeopardyRequest, GenerationLogResponse, TemplateCreate, TemplateResponse, BatchRequest, HangmanRequest, SpellingRequest, MathPuzzleRequest, WordPairsRequest
-from apps.generator.services import check_token_quota, increment_token_usage, get_quota_info, priority_guard, get_material_context
+from apps.generator.services import token_reservation, adjust_tokens, get_quota_info, priority_guard, get_material_context_async
+from apps.generator.recorder import record_generation
 from services.openai_service import generate_math_problems, generate_crossword_words, generate_quiz, generate_assignment, generate_jeopardy, generate_hangman_words, generate_spelling_words, generate_math_puzzles, generate_word_pairs
 from apps.auth.dependencies import get_current_user
-from apps.generator.batch_utils import create_batch_zip
+from apps.auth.context import RequestContext, get_request_context
+from apps.generator.batch_utils import batch_concurrency, run_concurrently, stream_batch_zip
+from services.search import search_history
+from services import catalog
+import asyncio
+from contextlib import AsyncExitStack
 from typing import Optional, List
-import json
 import io
 from datetime import datetime, timedelta
 from config import RATE_LIMIT_PER_HOUR
@@ -20,25 +26,10 @@ from fastapi.responses import StreamingResponse
 
 router = APIRouter(prefix="/generate", tags=["generator"])
 
-def log_usage(db: Session, user_id: int, feature: str, tokens: int):
-    usage = TokenUsage(user_id=user_id, feature_name=feature, tokens_total=tokens)
-    db.add(usage)
-    db.commit()
-
-def save_generation(db: Session, user_id: int, gen_type: str, topic: str, content: dict):
-    log = GenerationLog(
-        user_id=user_id,
-        generator_type=gen_type,
-        topic=topic,
-        content=json.dumps(content, ensure_ascii=False)
-    )
-    db.add(log)
-    db.commit()
-
-def get_class_context(db: Session, class_id: Optional[int]):
+async def get_class_context(db: AsyncSession, class_id: Optional[int]):
     if not class_id:
         return "", ""
-    cls = db.query(ClassGroup).filter(ClassGroup.id == class_id).first()
+    cls = await db.get(ClassGroup, class_id)
     if cls:
         return cls.grade or "", cls.description or ""
     return "", ""
@@ -47,22 +38,20 @@ _rate_limit = f"{RATE_LIMIT_PER_HOUR}/hour"
 
 @router.post("/math")
 @limiter.limit(_rate_limit)
-async def gen_math(request: Request, req: MathRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    grade, context = get_class_context(db, req.class_id)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    problems, tokens = await generate_math_problems(req.topic, req.count, req.difficulty, grade, context, req.language, mat_ctx)
-    
-    if problems is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+async def gen_math(request: Request, req: MathRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
+    async with token_reservation(user, "math", db) as reservation:
+        grade, context = await get_class_context(db, req.class_id)
+        mat_ctx = await get_material_context_async(req.material_id, user, db, req.topic, req.material_raw)
+        problems, tokens = await generate_math_problems(req.topic, req.count, req.difficulty, grade, context, req.language, mat_ctx)
 
-    if tokens > 0:
-        log_usage(db, user.id, "math", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "math", req.topic, {"problems": problems})
-        
-    return {"problems": problems or []}
+        if problems is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+
+        if tokens > 0:
+            await record_generation(db, user, "math", tokens, reservation=reservation, topic=req.topic, content={"problems": problems}, language=req.language, difficulty=req.difficulty)
+
+        return {"problems": problems or []}
 
 @router.post("/demo/math")
 @limiter.limit("5/day")
@@ -88,9 +77,8 @@ async def gen_math_demo(request: Request, req: MathRequest):
 
 @router.post("/crossword")
 @limiter.limit(_rate_limit)
-async def gen_crossword(request: Request, req: CrosswordRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
+async def gen_crossword(request: Request, req: CrosswordRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
 
     if req.custom_words:
         words = []
@@ -100,142 +88,127 @@ async def gen_crossword(request: Request, req: CrosswordRequest, db: Session = D
             else:
                 word, clue = entry, ""
             words.append({"word": word.strip(), "clue": clue.strip()})
-        save_generation(db, user.id, "crossword", req.topic, {"words": words})
+        await record_generation(db, user, "crossword", 0, topic=req.topic, content={"words": words}, language=req.language)
         return {"words": words}
 
-    grade, context = get_class_context(db, req.class_id)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    words, tokens = await generate_crossword_words(req.topic, req.word_count, req.language, grade, context, mat_ctx)
+    async with token_reservation(user, "crossword", db) as reservation:
+        grade, context = await get_class_context(db, req.class_id)
+        mat_ctx = await get_material_context_async(req.material_id, user, db, req.topic, req.material_raw)
+        words, tokens = await generate_crossword_words(req.topic, req.word_count, req.language, grade, context, mat_ctx)
 
-    if words is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+        if words is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
 
-    if tokens > 0:
-        log_usage(db, user.id, "crossword", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "crossword", req.topic, {"words": words})
+        if tokens > 0:
+            await record_generation(db, user, "crossword", tokens, reservation=reservation, topic=req.topic, content={"words": words}, language=req.language)
 
-    return {"words": words or []}
+        return {"words": words or []}
 
 @router.post("/quiz")
 @limiter.limit(_rate_limit)
-async def gen_quiz(request: Request, req: QuizRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    grade, context = get_class_context(db, req.class_id)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    questions, tokens = await generate_quiz(req.topic, req.count, grade, context, req.language, req.difficulty, mat_ctx)
-    
-    if questions is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+async def gen_quiz(request: Request, req: QuizRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
+    async with token_reservation(user, "quiz", db) as reservation:
+        grade, context = await get_class_context(db, req.class_id)
+        mat_ctx = await get_material_context_async(req.material_id, user, db, req.topic, req.material_raw)
+        questions, tokens = await generate_quiz(req.topic, req.count, grade, context, req.language, req.difficulty, mat_ctx)
 
-    if tokens > 0:
-        log_usage(db, user.id, "quiz", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "quiz", req.topic, {"questions": questions})
-        
-    return {"questions": questions or []}
+        if questions is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+
+        if tokens > 0:
+            await record_generation(db, user, "quiz", tokens, reservation=reservation, topic=req.topic, content={"questions": questions}, language=req.language, difficulty=req.difficulty)
+
+        return {"questions": questions or []}
 
 @router.post("/jeopardy")
 @limiter.limit(_rate_limit)
-async def gen_jeopardy(request: Request, req: JeopardyRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    grade, context = get_class_context(db, req.class_id)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    data, tokens = await generate_jeopardy(req.topic, grade, context, req.language, mat_ctx)
-    
-    if data is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+async def gen_jeopardy(request: Request, req: JeopardyRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
+    async with token_reservation(user, "jeopardy", db) as reservation:
+        grade, context = await get_class_context(db, req.class_id)
+        mat_ctx = await get_material_context_async(req.material_id, user, db, req.topic, req.material_raw)
+        data, tokens = await generate_jeopardy(req.topic, grade, context, req.language, mat_ctx)
 
-    if tokens > 0:
-        log_usage(db, user.id, "jeopardy", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "jeopardy", req.topic, data)
-        
-    return data or {"categories": []}
+        if data is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+
+        if tokens > 0:
+            await record_generation(db, user, "jeopardy", tokens, reservation=reservation, topic=req.topic, content=data, language=req.language)
+
+        return data or {"categories": []}
 
 @router.post("/assignment")
 @limiter.limit(_rate_limit)
-async def gen_assignment(request: Request, req: AssignmentRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    grade, context = get_class_context(db, req.class_id)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    assignment, tokens = await generate_assignment(req.subject, req.topic, req.count, grade, context, req.language, mat_ctx)
-    
-    if assignment is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+async def gen_assignment(request: Request, req: AssignmentRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
+    async with token_reservation(user, "assignment", db) as reservation:
+        grade, context = await get_class_context(db, req.class_id)
+        mat_ctx = await get_material_context_async(req.material_id, user, db, f"{req.subject} {req.topic}", req.material_raw)
+        assignment, tokens = await generate_assignment(req.subject, req.topic, req.count, grade, context, req.language, mat_ctx)
 
-    if tokens > 0:
-        log_usage(db, user.id, "assignment", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "assignment", req.topic, assignment)
-        
-    return {"result": assignment}
+        if assignment is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+
+        if tokens > 0:
+            await record_generation(db, user, "assignment", tokens, reservation=reservation, topic=req.topic, content=assignment, language=req.language)
+
+        return {"result": assignment}
 
 @router.post("/hangman")
 @limiter.limit(_rate_limit)
-async def gen_hangman(request: Request, req: HangmanRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    words, tokens = await generate_hangman_words(req.topic, req.count, req.language, mat_ctx)
-    if words is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
-    if tokens > 0:
-        log_usage(db, user.id, "hangman", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "hangman", req.topic, {"words": words})
-    return {"words": words or []}
+async def gen_hangman(request: Request, req: HangmanRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
+    async with token_reservation(user, "hangman", db) as reservation:
+        mat_ctx = await get_material_context_async(req.material_id, user, db, req.topic, req.material_raw)
+        words, tokens = await generate_hangman_words(req.topic, req.count, req.language, mat_ctx)
+        if words is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+        if tokens > 0:
+            await record_generation(db, user, "hangman", tokens, reservation=reservation, topic=req.topic, content={"words": words}, language=req.language)
+        return {"words": words or []}
 
 
 @router.post("/spelling")
 @limiter.limit(_rate_limit)
-async def gen_spelling(request: Request, req: SpellingRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    words, tokens = await generate_spelling_words(req.topic, req.count, req.difficulty, req.language, mat_ctx)
-    if words is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
-    if tokens > 0:
-        log_usage(db, user.id, "spelling", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "spelling", req.topic, {"words": words})
-    return {"words": words or []}
+async def gen_spelling(request: Request, req: SpellingRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
+    async with token_reservation(user, "spelling", db) as reservation:
+        mat_ctx = await get_material_context_async(req.material_id, user, db, req.topic, req.material_raw)
+        words, tokens = await generate_spelling_words(req.topic, req.count, req.difficulty, req.language, mat_ctx)
+        if words is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+        if tokens > 0:
+            await record_generation(db, user, "spelling", tokens, reservation=reservation, topic=req.topic, content={"words": words}, language=req.language, difficulty=req.difficulty)
+        return {"words": words or []}
 
 
 @router.post("/math-puzzle")
 @limiter.limit(_rate_limit)
-async def gen_math_puzzle(request: Request, req: MathPuzzleRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    puzzles, tokens = await generate_math_puzzles(req.topic, req.count, req.puzzle_type, req.language, mat_ctx)
-    if puzzles is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
-    if tokens > 0:
-        log_usage(db, user.id, "math_puzzle", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "math_puzzle", req.topic, {"puzzles": puzzles, "puzzle_type": req.puzzle_type})
-    return {"puzzles": puzzles or [], "puzzle_type": req.puzzle_type}
+async def gen_math_puzzle(request: Request, req: MathPuzzleRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
+    async with token_reservation(user, "math_puzzle", db) as reservation:
+        mat_ctx = await get_material_context_async(req.material_id, user, db, req.topic, req.material_raw)
+        puzzles, tokens = await generate_math_puzzles(req.topic, req.count, req.puzzle_type, req.language, mat_ctx)
+        if puzzles is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+        if tokens > 0:
+            await record_generation(db, user, "math_puzzle", tokens, reservation=reservation, topic=req.topic, content={"puzzles": puzzles, "puzzle_type": req.puzzle_type}, language=req.language)
+        return {"puzzles": puzzles or [], "puzzle_type": req.puzzle_type}
 
 
 @router.post("/word-pairs")
 @limiter.limit(_rate_limit)
-async def gen_word_pairs(request: Request, req: WordPairsRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    mat_ctx = get_material_context(req.material_id, user, db)
-    pairs, tokens = await generate_word_pairs(req.topic, req.count, req.source_lang, req.target_lang, mat_ctx)
-    if pairs is None:
-        raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
-    if tokens > 0:
-        log_usage(db, user.id, "word_pairs", tokens)
-        increment_token_usage(user, tokens, db)
-        save_generation(db, user.id, "word_pairs", req.topic, {"pairs": pairs})
-    return {"pairs": pairs or []}
+async def gen_word_pairs(request: Request, req: WordPairsRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    await priority_guard(user)
+    async with token_reservation(user, "word_pairs", db) as reservation:
+        mat_ctx = await get_material_context_async(req.material_id, user, db, req.topic, req.material_raw)
+        pairs, tokens = await generate_word_pairs(req.topic, req.count, req.source_lang, req.target_lang, mat_ctx)
+        if pairs is None:
+            raise HTTPException(status_code=500, detail="AI Generation failed. Please try again.")
+        if tokens > 0:
+            await record_generation(db, user, "word_pairs", tokens, reservation=reservation, topic=req.topic, content={"pairs": pairs}, language=req.target_lang)
+        return {"pairs": pairs or []}
 
 
 @router.get("/quota")
@@ -245,18 +218,32 @@ def get_my_quota(db: Session = Depends(get_db), user: User = Depends(get_current
 @router.get("/history", response_model=List[GenerationLogResponse])
 def get_history(limit: int = 20, offset: int = 0, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     logs = db.query(GenerationLog).filter(GenerationLog.user_id == user.id).order_by(GenerationLog.created_at.desc()).offset(offset).limit(limit).all()
+    return [_history_item(log) for log in logs]
+
+@router.get("/history/search", response_model=List[GenerationLogResponse])
+def search_my_history(
+    q: str = Query(..., min_length=2, max_length=200),
+    generator_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    logs = search_history(db, user.id, q, generator_type, date_from, date_to, limit, offset)
+    return [_history_item(log) for log in logs]
+
+def _history_item(log: GenerationLog) -> dict:
     # Format dates as strings
-    result = []
-    for log in logs:
-        result.append({
-            "id": log.id,
-            "generator_type": log.generator_type,
-            "topic": log.topic,
-            "content": log.content,
-            "created_at": log.created_at.isoformat(),
-            "is_favorite": log.is_favorite
-        })
-    return result
+    return {
+        "id": log.id,
+        "generator_type": log.generator_type,
+        "topic": log.topic,
+        "content": log.content_text,
+        "created_at": log.created_at.isoformat(),
+        "is_favorite": log.is_favorite
+    }
 
 @router.post("/history/{log_id}/favorite")
 def toggle_favorite(log_id: int, request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
@@ -278,7 +265,7 @@ def send_email_endpoint(log_id: int, request: Request, db: Session = Depends(get
     
     # We load the content to check its format
     try:
-        content_str = str(log.content)
+        content_str = log.content_text
     except:
         content_str = "Содержимое задания недоступно или имеет сложный формат."
         
@@ -303,65 +290,71 @@ def get_public_history(log_id: int, db: Session = Depends(get_db)):
     return {
         "generator_type": log.generator_type,
         "topic": log.topic,
-        "content": log.content,
+        "content": log.content_text,
         "created_at": log.created_at.isoformat()
     }
 
 @router.get("/stats/me")
 def get_personal_stats(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    now = datetime.utcnow()
-    month_start = datetime(now.year, now.month, 1)
-    
-    # 1. Total & Monthly count
-    total = db.query(GenerationLog).filter(GenerationLog.user_id == user.id).count()
-    monthly = db.query(GenerationLog).filter(
-        GenerationLog.user_id == user.id,
-        GenerationLog.created_at >= month_start
-    ).count()
-    
+    # All counts come from the usage_daily rollup — no scan of generation_logs
+    today = datetime.utcnow().date()
+    month_start = today.replace(day=1)
+    mine = UsageDaily.user_id == user.id
+
+    # 1. Totals per feature (total, top features and jeopardy games in one query)
+    per_feature = db.query(
+        UsageDaily.feature,
+        func.sum(UsageDaily.generations).label('count')
+    ).filter(mine).group_by(UsageDaily.feature).order_by(func.sum(UsageDaily.generations).desc()).all()
+
+    monthly = db.query(func.sum(UsageDaily.generations)).filter(mine, UsageDaily.day >= month_start).scalar() or 0
+
     # 2. Activity by day (last 14 days)
-    forty_days_ago = now - timedelta(days=14)
-    # Using cast to Date for grouping by day in PostgreSQL/SQLite
     activity = db.query(
-        cast(GenerationLog.created_at, Date).label('day'),
-        func.count(GenerationLog.id).label('count')
-    ).filter(
-        GenerationLog.user_id == user.id,
-        GenerationLog.created_at >= forty_days_ago
-    ).group_by(cast(GenerationLog.created_at, Date)).all()
-    
-    activity_data = [{"date": str(a.day), "count": a.count} for a in activity]
-    
-    # 3. Top features
-    top_features = db.query(
-        GenerationLog.generator_type,
-        func.count(GenerationLog.id).label('count')
-    ).filter(GenerationLog.user_id == user.id).group_by(GenerationLog.generator_type).order_by(func.count(GenerationLog.id).desc()).limit(5).all()
-    
-    feature_data = [{"name": f.generator_type, "count": f.count} for f in top_features]
-    
-    # 4. Games launched (for Jeopardy type)
-    games = db.query(GenerationLog).filter(
-        GenerationLog.user_id == user.id,
-        GenerationLog.generator_type == 'jeopardy'
-    ).count()
-    
+        UsageDaily.day,
+        func.sum(UsageDaily.generations).label('count')
+    ).filter(mine, UsageDaily.day >= today - timedelta(days=14)).group_by(UsageDaily.day).order_by(UsageDaily.day).all()
+
+    activity_data = [{"date": str(a.day), "count": int(a.count)} for a in activity]
+    feature_data = [{"name": f.feature, "count": int(f.count)} for f in per_feature[:5]]
+
     return {
-        "total_generations": total,
-        "generations_this_month": monthly,
-        "games_launched": games,
+        "total_generations": sum(int(f.count) for f in per_feature),
+        "generations_this_month": int(monthly),
+        "games_launched": sum(int(f.count) for f in per_feature if f.feature == 'jeopardy'),
         "activity_by_day": activity_data,
         "top_features": feature_data
     }
 
+SYSTEM_TEMPLATES = ("templates", "system")
+
+def _user_templates_key(user_id: int) -> tuple:
+    return ("templates", user_id)
+
+async def _load_templates(db: AsyncSession, condition) -> list[dict]:
+    rows = (await db.execute(select(Template).where(condition).order_by(Template.id))).scalars()
+    return [TemplateResponse.model_validate(t).model_dump() for t in rows]
+
 @router.get("/templates", response_model=List[TemplateResponse])
-def get_templates(feature: Optional[str] = None, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    query = db.query(Template).filter(
-        (Template.user_id == user.id) | (Template.is_system == True)
+async def get_templates(
+    request: Request,
+    feature: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    user: RequestContext = Depends(get_request_context),
+):
+    # System templates are shared by everyone, own ones are cached per user
+    system = await catalog.cached_data(SYSTEM_TEMPLATES, lambda: _load_templates(db, Template.is_system == True))
+    own = await catalog.cached_data(
+        _user_templates_key(user.id),
+        lambda: _load_templates(db, Template.user_id == user.id),
     )
+    templates = sorted({t["id"]: t for t in system + own}.values(), key=lambda t: t["id"])
     if feature:
-        query = query.filter(Template.feature == feature)
-    return query.all()
+        templates = [t for t in templates if t["feature"] == feature]
+    return catalog.etag_response(request, catalog.CachedBody.of(templates), private=True)
+
+def _invalidate_templates(template: Template) -> None:
+    catalog.invalidate(SYSTEM_TEMPLATES if template.is_system else _user_templates_key(template.user_id))
 
 @router.post("/templates", response_model=TemplateResponse)
 def create_template(req: TemplateCreate, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
@@ -371,11 +364,12 @@ def create_template(req: TemplateCreate, db: Session = Depends(get_db), user: Us
         name=req.name,
         description=req.description,
         params=req.params,
-        is_system=req.is_system if user.is_admin else False # Only admin can create system templates
+        is_system=req.is_system if user.role == "super_admin" else False # Only admin can create system templates
     )
     db.add(template)
     db.commit()
     db.refresh(template)
+    _invalidate_templates(template)
     return template
 
 @router.delete("/templates/{template_id}")
@@ -384,7 +378,7 @@ def delete_template(template_id: int, db: Session = Depends(get_db), user: User
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    if template.is_system and not user.is_admin:
+    if template.is_system and user.role != "super_admin":
         raise HTTPException(status_code=403, detail="Cannot delete system templates")
         
     if not template.is_system and template.user_id != user.id:
@@ -392,63 +386,101 @@ def delete_template(template_id: int, db: Session = Depends(get_db), user: User
         
     db.delete(template)
     db.commit()
+    _invalidate_templates(template)
     return {"message": "Template deleted"}
 
-@router.post("/batch")
-@limiter.limit(_rate_limit)
-async def gen_batch(request: Request, req: BatchRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    check_token_quota(user, db)
-    grade, context = get_class_context(db, req.class_id)
-    
-    variants = []
-    total_tokens = 0
-    
-    for i in range(req.count):
-        if req.tool_type == "math":
+def _batch_call(req: BatchRequest, grade: str, context: str):
+    """One variant's generation for the batch tool type, as (variant or None, tokens); None if unsupported."""
+    params = req.params
+    if req.tool_type == "math":
+        async def call():
             res, tokens = await generate_math_problems(
-                req.params.get("topic", ""),
-                req.params.get("count", 10),
-                req.params.get("difficulty", "medium"),
-                grade, context, req.language
+                params.get("topic", ""), params.get("count", 10), params.get("difficulty", "medium"),
+                grade, context, req.language,
             )
-            if res: variants.append({"problems": res})
-            
-        elif req.tool_type == "quiz":
+            return ({"problems": res} if res else None), tokens
+    elif req.tool_type == "quiz":
+        async def call():
             res, tokens = await generate_quiz(
-                req.params.get("topic", ""),
-                req.params.get("count", 5),
-                req.language, grade, context
+                params.get("topic", ""), params.get("count", 5), grade=grade, context=context, language=req.language,
             )
-            if res: variants.append({"questions": res})
-            
-        elif req.tool_type == "assignment":
+            return ({"questions": res} if res else None), tokens
+    elif req.tool_type == "assignment":
+        async def call():
             res, tokens = await generate_assignment(
-                req.params.get("subject", ""),
-                req.params.get("topic", ""),
-                req.params.get("count", 5),
-                req.language, grade, context
+                params.get("subject", ""), params.get("topic", ""), params.get("count", 5),
+                grade=grade, context=context, language=req.language,
             )
-            if res: variants.append({"content": res})
-            
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported tool type for batch generation")
-            
-        total_tokens += tokens
-
-    if not variants:
-        raise HTTPException(status_code=500, detail="Batch generation failed")
-
-    if total_tokens > 0:
-        log_usage(db, user.id, f"batch_{req.tool_type}", total_tokens)
-        increment_token_usage(user, total_tokens, db)
-        save_generation(db, user.id, f"batch_{req.tool_type}", req.params.get("topic", "Batch"), {"variants_count": len(variants)})
-
-    zip_buffer = create_batch_zip(variants, req.tool_type)
-    
+            return ({"content": res} if res else None), tokens
+    else:
+        return None
+    return call
+
+
+async def _settle_batch(user: RequestContext, req: BatchRequest, reservation, tokens: int, variants: int) -> None:
+    """Charges a streamed batch in a session of its own: the request's may be gone with the client."""
+    async with get_async_sessionmaker()() as db:
+        try:
+            if tokens > 0:
+                await record_generation(db, user, f"batch_{req.tool_type}", tokens, reservation=reservation, topic=req.params.get("topic", "Batch"), content={"variants_count": variants}, language=req.language, difficulty=req.params.get("difficulty"))
+        finally:
+            # Nothing generated, or the write failed: the reservation's own exit is no longer around to refund
+            if not reservation.settled:
+                await db.rollback()
+                await adjust_tokens(user.id, -reservation.settle(), db)
+
+
+@router.post("/batch")
+@limiter.limit(_rate_limit)
+async def gen_batch(request: Request, req: BatchRequest, db: AsyncSession = Depends(get_async_db), user: RequestContext = Depends(get_request_context)):
+    """
+    Variants are generated concurrently (batch_concurrency()) and the ZIP is
+    streamed as they finish. The response starts with the first successful
+    variant, so a batch where every variant fails is still a 500; the tokens
+    are settled once the last one is in, or when the client goes away.
+    """
+    grade, context = await get_class_context(db, req.class_id)
+    call = _batch_call(req, grade, context)
+    if call is None:
+        raise HTTPException(status_code=400, detail="Unsupported tool type for batch generation")
+
+    state = {"tokens": 0, "variants": 0}
+    async with AsyncExitStack() as stack:
+        reservation = await stack.enter_async_context(token_reservation(user, req.tool_type, db, units=req.count))
+        results = run_concurrently([call] * req.count, batch_concurrency())
+        stack.push_async_callback(results.aclose)
+        first = None
+        async for variant, tokens in results:
+            state["tokens"] += tokens
+            if variant:
+                first = variant
+                break
+        if first is None:
+            raise HTTPException(status_code=500, detail="Batch generation failed")
+        # From here the stream closes the results and settles the reservation
+        stack.pop_all()
+
+    async def variants():
+        state["variants"] += 1
+        yield first
+        async for variant, tokens in results:
+            state["tokens"] += tokens
+            if variant:
+                state["variants"] += 1
+                yield variant
+
+    async def body():
+        try:
+            async for chunk in stream_batch_zip(variants(), req.tool_type):
+                yield chunk
+        finally:
+            await results.aclose()
+            await asyncio.shield(_settle_batch(user, req, reservation, state["tokens"], state["variants"]))
+
     filename = f"batch_{req.tool_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-    
+
     return StreamingResponse(
-        zip_buffer,
+        body(),
         media_type="application/x-zip-compressed",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
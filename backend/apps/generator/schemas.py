@@ -8,6 +8,7 @@ class MathRequest(BaseModel):
     language: str = "Russian"
     class_id: Optional[int] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class CrosswordRequest(BaseModel):
     topic: str
@@ -16,6 +17,7 @@ class CrosswordRequest(BaseModel):
     class_id: Optional[int] = None
     custom_words: Optional[List[str]] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class QuizRequest(BaseModel):
     topic: str
@@ -24,6 +26,7 @@ class QuizRequest(BaseModel):
     difficulty: Optional[str] = "medium"
     class_id: Optional[int] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class AssignmentRequest(BaseModel):
     subject: str
@@ -32,12 +35,14 @@ class AssignmentRequest(BaseModel):
     language: str = "Russian"
     class_id: Optional[int] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class JeopardyRequest(BaseModel):
     topic: str
     language: str = "Russian"
     class_id: Optional[int] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class GenerationLogResponse(BaseModel):
     id: int
@@ -76,6 +81,7 @@ class HangmanRequest(BaseModel):
     language: str = "Russian"
     class_id: Optional[int] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class SpellingRequest(BaseModel):
     topic: str
@@ -84,6 +90,7 @@ class SpellingRequest(BaseModel):
     language: str = "Russian"
     class_id: Optional[int] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class MathPuzzleRequest(BaseModel):
     topic: str
@@ -92,6 +99,7 @@ class MathPuzzleRequest(BaseModel):
     language: str = "Russian"
     class_id: Optional[int] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class WordPairsRequest(BaseModel):
     topic: str
@@ -100,6 +108,7 @@ class WordPairsRequest(BaseModel):
     target_lang: str = "English"
     class_id: Optional[int] = None
     material_id: Optional[int] = None
+    material_raw: bool = False  # send the material's text instead of its digest
 
 class BatchRequest(BaseModel):
     tool_type: str  # math, quiz, assignment
@@ -2,13 +2,18 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import HTTPException
+from sqlalchemy import case, func, or_, select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from apps.auth.models import User
+from apps.auth.context import RequestContext, invalidate_request_context
 from apps.payments.models import UserSubscription
 from config import DEFAULT_TOKEN_LIMIT
 
 PLAN_PRIORITY = {"school": 3, "pro": 2, "free": 1}
 
+_users = User.__table__
+
 
 def get_org_gemini_key(user: User, db: Session) -> Optional[str]:
     """Returns org's custom Gemini API key if set, else None (falls back to shared pool)."""
@@ -21,29 +26,83 @@ def get_org_gemini_key(user: User, db: Session) -> Optional[str]:
     return None
 
 
+# ── Quota upkeep ───────────────────────────────────────────────
+# The expired-subscription downgrade and the monthly reset, shared by the
+# sync (check_token_quota) and async (reserve_tokens) paths. Each rule is
+# decided from the user as loaded and applied by a conditional UPDATE, so a
+# stale snapshot (a cached RequestContext) can't undo a newer change.
+
+FREE_TOKEN_LIMIT = 30_000
+QUOTA_PERIOD = timedelta(days=30)
+
+
+def _quota_reset_due(user, now: datetime) -> bool:
+    return user.tokens_reset_at is None or (now - user.tokens_reset_at) > QUOTA_PERIOD
+
+
+def _downgrade_expired_stmt(user_id: int):
+    return (
+        update(_users)
+        .where(_users.c.id == user_id, _users.c.tokens_limit > FREE_TOKEN_LIMIT)
+        .values(tokens_limit=FREE_TOKEN_LIMIT)
+    )
+
+
+def _reset_quota_stmt(user_id: int, now: datetime):
+    return (
+        update(_users)
+        .where(
+            _users.c.id == user_id,
+            or_(_users.c.tokens_reset_at.is_(None), _users.c.tokens_reset_at < now - QUOTA_PERIOD),
+        )
+        .values(tokens_used_this_month=0, tokens_reset_at=now)
+    )
+
+
+def _quota_upkeep(user, subscription_expired: bool, now: datetime) -> list:
+    """The UPDATEs `user` (a User or RequestContext) is due; empty when nothing is."""
+    statements = []
+    if subscription_expired and user.tokens_limit and user.tokens_limit > FREE_TOKEN_LIMIT:
+        statements.append(_downgrade_expired_stmt(user.id))
+    if _quota_reset_due(user, now):
+        statements.append(_reset_quota_stmt(user.id, now))
+    return statements
+
+
+def _apply_upkeep(user: User, statements: list, db: Session) -> None:
+    if not statements:
+        return
+    for statement in statements:
+        db.execute(statement)
+    db.commit()
+    db.refresh(user)
+    invalidate_request_context([user.id])
+
+
 def reset_quota_if_needed(user: User, db: Session) -> None:
     now = datetime.utcnow()
-    if user.tokens_reset_at is None or (now - user.tokens_reset_at) > timedelta(days=30):
-        user.tokens_used_this_month = 0
-        user.tokens_reset_at = now
-        db.commit()
+    _apply_upkeep(user, _quota_upkeep(user, False, now), db)
 
 
 def get_user_plan(user: User, db: Session) -> str:
     """Returns user's current active plan name."""
     sub = db.query(UserSubscription).filter(UserSubscription.user_id == user.id).first()
+    return _active_plan(sub)
+
+
+def _active_plan(sub: Optional[UserSubscription]) -> str:
     if sub and sub.expires_at and sub.expires_at > datetime.utcnow():
         return sub.plan
     return "free"
 
 
-async def priority_guard(user: User, db: Session) -> None:
+async def priority_guard(user: RequestContext) -> None:
     """If all Gemini keys are busy — drop Free first, make Pro wait, never drop School."""
     from services.gemini_service import key_manager
     if key_manager.has_available_keys():
         return
 
-    priority = PLAN_PRIORITY.get(get_user_plan(user, db), 1)
+    priority = PLAN_PRIORITY.get(user.plan, 1)
 
     if priority == 1:  # Free — instant 429
         raise HTTPException(status_code=429, detail={
@@ -69,14 +128,10 @@ def check_token_quota(user: User, db: Session) -> None:
     if user.role == "super_admin":
         return
 
-    # Downgrade if subscription expired
+    now = datetime.utcnow()
     sub = db.query(UserSubscription).filter(UserSubscription.user_id == user.id).first()
-    if sub and sub.expires_at and sub.expires_at < datetime.utcnow():
-        if user.tokens_limit and user.tokens_limit > 30_000:
-            user.tokens_limit = 30_000
-            db.commit()
-
-    reset_quota_if_needed(user, db)
+    expired = bool(sub and sub.expires_at and sub.expires_at < now)
+    _apply_upkeep(user, _quota_upkeep(user, expired, now), db)
 
     if user.tokens_limit is None:
         user.tokens_limit = DEFAULT_TOKEN_LIMIT
@@ -86,16 +141,31 @@ def check_token_quota(user: User, db: Session) -> None:
         return
 
     if user.tokens_used_this_month >= user.tokens_limit:
-        raise HTTPException(
-            status_code=402,
-            detail={
-                "error": "token_quota_exceeded",
-                "message": "Достигнут месячный лимит генераций. Обновите тариф для продолжения.",
-                "tokens_used": user.tokens_used_this_month,
-                "tokens_limit": user.tokens_limit,
-                "upgrade_url": "/checkout",
-            }
-        )
+        raise _quota_exceeded(user)
+
+
+async def _prepare_quota_async(user: RequestContext, db: AsyncSession) -> None:
+    """Quota upkeep (see _quota_upkeep) before a reservation."""
+    statements = _quota_upkeep(user, user.subscription_expired, datetime.utcnow())
+    if not statements:
+        return
+    for statement in statements:
+        await db.execute(statement)
+    await db.commit()
+    invalidate_request_context([user.id])
+
+
+def _quota_exceeded(user: User) -> HTTPException:
+    return HTTPException(
+        status_code=402,
+        detail={
+            "error": "token_quota_exceeded",
+            "message": "Достигнут месячный лимит генераций. Обновите тариф для продолжения.",
+            "tokens_used": user.tokens_used_this_month,
+            "tokens_limit": user.tokens_limit,
+            "upgrade_url": "/checkout",
+        }
+    )
 
 
 def increment_token_usage(user: User, tokens_used: int, db: Session) -> None:
@@ -103,22 +173,158 @@ def increment_token_usage(user: User, tokens_used: int, db: Session) -> None:
         return
 
     if tokens_used and tokens_used > 0:
-        user.tokens_used_this_month = (user.tokens_used_this_month or 0) + tokens_used
+        # SQL-side increment: concurrent generations must not overwrite each other
+        db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(tokens_used_this_month=func.coalesce(User.tokens_used_this_month, 0) + tokens_used)
+        )
         db.commit()
 
 
+# ── Token reservations ──────────────────────────────────────────
+# Before the AI call the estimated cost is reserved with one atomic UPDATE;
+# afterwards the difference from the actual usage is charged or refunded.
+# Parallel generations can't overrun the limit together.
+
+FEATURE_TOKEN_ESTIMATES = {
+    "math": 1500,
+    "crossword": 1200,
+    "quiz": 2000,
+    "jeopardy": 3000,
+    "assignment": 2500,
+    "hangman": 800,
+    "spelling": 800,
+    "math_puzzle": 1500,
+    "word_pairs": 1000,
+    "storybook": 6000,
+}
+DEFAULT_TOKEN_ESTIMATE = 1500
+
+
+def used_tokens_plus(delta):
+    """tokens_used_this_month + delta, never below zero."""
+    new_value = func.coalesce(_users.c.tokens_used_this_month, 0) + delta
+    return case((new_value < 0, 0), else_=new_value)
+
+
+async def reserve_tokens(user: RequestContext, estimate: int, db: AsyncSession) -> int:
+    """Atomically books `estimate` tokens against the quota. Returns the amount reserved."""
+    if user.role == "super_admin" or estimate <= 0:
+        return 0
+
+    await _prepare_quota_async(user, db)
+    limit = func.coalesce(_users.c.tokens_limit, DEFAULT_TOKEN_LIMIT)
+    used = (await db.execute(
+        update(_users)
+        .where(
+            _users.c.id == user.id,
+            or_(limit == -1, func.coalesce(_users.c.tokens_used_this_month, 0) + estimate <= limit),
+        )
+        .values(
+            tokens_used_this_month=func.coalesce(_users.c.tokens_used_this_month, 0) + estimate,
+            tokens_limit=limit,
+        )
+        .returning(_users.c.tokens_used_this_month)
+    )).scalar()
+    if used is None:
+        await db.rollback()
+        raise _quota_exceeded(user)
+    await db.commit()
+    return estimate
+
+
+async def adjust_tokens(user_id: int, delta: int, db: AsyncSession) -> None:
+    """Settles the difference between reserved and actual usage (negative = refund)."""
+    if not delta:
+        return
+    await db.execute(
+        update(_users)
+        .where(_users.c.id == user_id)
+        .values(tokens_used_this_month=used_tokens_plus(delta))
+    )
+    await db.commit()
+
+
+class TokenReservation:
+    """
+    async with token_reservation(user, "quiz", db) as reservation:
+        ... AI call ...
+        await record_generation(..., reservation=reservation)
+
+    record_generation() settles the reservation in its own transaction; if the
+    block exits without that (error, nothing generated) the tokens are refunded.
+    """
+
+    def __init__(self, user: RequestContext, db: AsyncSession, estimate: int):
+        self.user = user
+        self.db = db
+        self.estimate = estimate
+        self.reserved = 0
+        self.settled = False
+
+    async def __aenter__(self) -> "TokenReservation":
+        self.reserved = await reserve_tokens(self.user, self.estimate, self.db)
+        return self
+
+    def settle(self) -> int:
+        """Marks the reservation as consumed; returns the amount already charged."""
+        self.settled = True
+        return self.reserved
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self.settled or not self.reserved:
+            return
+        await self.db.rollback()
+        await adjust_tokens(self.user.id, -self.reserved, self.db)
+
+
+def token_reservation(user: RequestContext, feature: str, db: AsyncSession, units: int = 1) -> TokenReservation:
+    estimate = FEATURE_TOKEN_ESTIMATES.get(feature, DEFAULT_TOKEN_ESTIMATE) * units
+    return TokenReservation(user, db, estimate)
+
+
 def get_material_context(material_id: int | None, user: User, db: Session) -> str:
     """Returns extracted text for the material, or empty string if not found/not owned."""
     if not material_id:
         return ""
-    from apps.library.models import UserMaterial
-    mat = db.query(UserMaterial).filter(
+    from apps.library.models import MaterialContent, UserMaterial
+    text = db.query(MaterialContent.extracted_text).join(
+        UserMaterial, UserMaterial.content_id == MaterialContent.id
+    ).filter(
         UserMaterial.id == material_id,
         UserMaterial.user_id == user.id,
-    ).first()
-    if not mat:
+    ).scalar()
+    return text or ""
+
+
+async def get_material_context_async(
+    material_id: int | None, user: RequestContext, db: AsyncSession, query: str = "", raw: bool = False,
+) -> str:
+    """
+    The material's digest (apps.library.digest) or, with `raw` or until it
+    has one, its parts most relevant to `query` (the topic).
+    """
+    if not material_id:
+        return ""
+    from apps.library import digest
+    from apps.library.material_index import select_context
+    from apps.library.models import MaterialContent, UserMaterial
+    row = (await db.execute(
+        select(UserMaterial.content_id, MaterialContent.digest, MaterialContent.digest_failed_at)
+        .join(MaterialContent, MaterialContent.id == UserMaterial.content_id)
+        .where(UserMaterial.id == material_id, UserMaterial.user_id == user.id)
+    )).first()
+    if row is None:
         return ""
-    return mat.extracted_text or ""
+    if not raw:
+        summary = digest.parse_digest(row.digest)
+        if summary:
+            return summary
+    text = await select_context(db, row.content_id, query)
+    if text and not raw and digest.retry_due(row.digest_failed_at):
+        digest.schedule_digest(row.content_id, user.id)
+    return text
 
 
 def get_quota_info(user: User, db: Session) -> dict:
@@ -0,0 +1,79 @@
+"""
+GenerationLog content storage.
+
+Small payloads go to JSONB (`content_json`) and stay queryable from SQL.
+Payloads over GENERATION_COMPRESS_THRESHOLD bytes are zstd-compressed into
+`content_zstd`. Legacy rows holding a JSON string in `content` are read as
+before until scripts/backfill_generation_content.py moves them over.
+"""
+import json
+from typing import Any, Optional
+
+import zstandard
+
+from config import GENERATION_COMPRESS_THRESHOLD
+
+_ZSTD_LEVEL = 3
+
+# Keys under which the generators return their list of items
+_ITEM_KEYS = ("problems", "questions", "words", "pairs", "puzzles")
+
+
+def encode_content(content: Any) -> tuple[Optional[Any], Optional[bytes]]:
+    """Returns (content_json, content_zstd) — exactly one of them is set."""
+    raw = json.dumps(content, ensure_ascii=False).encode("utf-8")
+    if len(raw) < GENERATION_COMPRESS_THRESHOLD:
+        return content, None
+    # ZstdCompressor isn't thread-safe; one per call is cheap
+    return None, zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(raw)
+
+
+def decode_content(content_json: Any, content_zstd: Optional[bytes], legacy: Optional[str]) -> Any:
+    if content_zstd is not None:
+        return json.loads(zstandard.ZstdDecompressor().decompress(content_zstd))
+    if content_json is not None:
+        return content_json
+    if legacy:
+        try:
+            return json.loads(legacy)
+        except json.JSONDecodeError:
+            return legacy
+    return None
+
+
+def count_items(content: Any) -> Optional[int]:
+    """Number of generated items (questions, words, problems...) for analytics."""
+    if isinstance(content, list):
+        return len(content)
+    if not isinstance(content, dict):
+        return None
+    if isinstance(content.get("categories"), list):
+        return sum(len(c.get("questions", [])) for c in content["categories"] if isinstance(c, dict))
+    if isinstance(content.get("variants_count"), int):
+        return content["variants_count"]
+    for key in _ITEM_KEYS:
+        if isinstance(content.get(key), list):
+            return len(content[key])
+    return None
+
+
+# Enough to search by topic/questions; long stories and the like are cut off
+SEARCH_TEXT_MAX_CHARS = 8000
+
+
+def extract_search_text(content: Any, limit: int = SEARCH_TEXT_MAX_CHARS) -> Optional[str]:
+    """String values of the payload (questions, words, clues...) joined for full-text search."""
+    parts: list[str] = []
+    size = 0
+    stack = [content]
+    while stack and size < limit:
+        value = stack.pop()
+        if isinstance(value, str):
+            parts.append(value)
+            size += len(value) + 1
+        elif isinstance(value, dict):
+            stack.extend(reversed(list(value.values())))
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+    return " ".join(parts)[:limit] or None
+
@@ -0,0 +1,72 @@
+"""
+Shared material contents, deduplicated by file hash.
+
+The same textbook PDF is uploaded by many teachers. An upload whose bytes
+(and type) match an existing content only takes a reference to it: no
+parsing, no second copy of the text, and the digest and chunk index built
+for the first upload serve everyone. Ownership, file names and plan limits
+stay per user, in user_materials.
+
+ref_count changes with single UPDATE/upsert statements, so two uploads of a
+new file can't create two contents, and a delete racing an upload can't
+remove a content the upload has just referenced: the content is deleted
+only by a statement that still sees ref_count at zero.
+"""
+import hashlib
+from typing import Optional
+
+from sqlalchemy import Row, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from apps.library.models import MaterialChunk, MaterialContent, MaterialTerm
+from database import dialect_insert
+
+_contents = MaterialContent.__table__
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+async def acquire_existing(db: AsyncSession, sha256: str, file_type: str) -> Optional[Row]:
+    """References the content of an identical earlier upload: (id, char_count), or None if there is none."""
+    return (await db.execute(
+        update(_contents)
+        .where(_contents.c.sha256 == sha256, _contents.c.file_type == file_type)
+        .values(ref_count=_contents.c.ref_count + 1)
+        .returning(_contents.c.id, _contents.c.char_count)
+    )).first()
+
+
+async def acquire_new(db: AsyncSession, sha256: str, file_type: str, text: str) -> tuple[int, bool]:
+    """
+    Stores freshly extracted text, or references the content a concurrent
+    upload of the same file stored first. Returns (content id, created).
+    """
+    stmt = dialect_insert(db.get_bind(), _contents).values(
+        sha256=sha256, file_type=file_type, extracted_text=text, char_count=len(text), ref_count=1,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["sha256", "file_type"],
+        set_={"ref_count": _contents.c.ref_count + 1},
+    ).returning(_contents.c.id, _contents.c.ref_count)
+    row = (await db.execute(stmt)).one()
+    # A content at zero references is deleted in the same transaction, so 1 means this insert
+    return row.id, row.ref_count == 1
+
+
+def release(db: Session, content_id: int) -> None:
+    """Drops one reference; the last one deletes the content with its index. Committed by the caller."""
+    remaining = db.execute(
+        update(_contents)
+        .where(_contents.c.id == content_id)
+        .values(ref_count=_contents.c.ref_count - 1)
+        .returning(_contents.c.ref_count)
+    ).scalar()
+    if remaining is None or remaining > 0:
+        return
+    # SQLite doesn't enforce the ON DELETE CASCADE, so the index goes explicitly
+    db.execute(delete(MaterialTerm).where(MaterialTerm.content_id == content_id))
+    db.execute(delete(MaterialChunk).where(MaterialChunk.content_id == content_id))
+    db.execute(delete(_contents).where(_contents.c.id == content_id, _contents.c.ref_count <= 0))
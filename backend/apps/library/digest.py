@@ -0,0 +1,147 @@
+"""
+Material digests: a compact summary of a material (key terms, facts,
+definitions, vocabulary pairs) built by the AI once and sent to every
+generation in place of the material's text.
+
+The digest belongs to the shared content (apps.library.contents), so a file
+uploaded by many users is summarized once. It is built in the background
+right after the first upload, so the upload doesn't wait for it; contents
+without one (older uploads, a failed or still-running build) give their
+relevant chunks (apps.library.material_index) and schedule a build on first
+use. Its tokens are charged once, to the user whose upload or generation
+started the build. A build whose answer is unusable is still charged, and
+marks the content (digest_failed_at) so it isn't retried before
+MATERIAL_DIGEST_RETRY_HOURS. A generation asks for the text itself with
+`material_raw`.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import func, select, update
+
+from apps.generator.services import adjust_tokens
+from apps.library.models import MaterialContent
+from config import MATERIAL_DIGEST_INPUT_CHARS, MATERIAL_DIGEST_MAX_CHARS, MATERIAL_DIGEST_RETRY_HOURS, OPENAI_API_KEY
+from database import get_async_sessionmaker
+from services import gemini_service
+from services.openai_service import generate_material_digest
+
+logger = logging.getLogger(__name__)
+
+# Per-section limits, whatever the model returned
+_LIMITS = {"key_terms": 20, "facts": 15, "definitions": 10, "vocabulary": 15}
+
+_building: dict[int, asyncio.Task] = {}
+
+
+def digest_available() -> bool:
+    return bool(OPENAI_API_KEY) or gemini_service.key_manager.has_available_keys()
+
+
+def retry_due(failed_at: Optional[datetime]) -> bool:
+    """Whether a content may be (re)built: never failed, or failed long enough ago."""
+    return failed_at is None or failed_at < datetime.utcnow() - timedelta(hours=MATERIAL_DIGEST_RETRY_HOURS)
+
+
+def _text(value: Any) -> str:
+    return " ".join(str(value).split()) if isinstance(value, (str, int, float)) else ""
+
+
+def clean_digest(data: Any) -> Optional[dict]:
+    """The model's answer reduced to the expected shape; None if there is nothing usable."""
+    if not isinstance(data, dict):
+        return None
+    pairs = {"definitions": ("term", "definition"), "vocabulary": ("word", "meaning")}
+    digest = {"summary": _text(data.get("summary"))}
+    for section, limit in _LIMITS.items():
+        items = data.get(section) if isinstance(data.get(section), list) else []
+        if section in pairs:
+            first, second = pairs[section]
+            items = [
+                {first: _text(item.get(first)), second: _text(item.get(second))}
+                for item in items if isinstance(item, dict) and _text(item.get(first)) and _text(item.get(second))
+            ]
+        else:
+            items = [_text(item) for item in items if _text(item)]
+        digest[section] = items[:limit]
+    if not any(digest.values()):
+        return None
+    return digest
+
+
+def render_digest(digest: dict, max_chars: int = MATERIAL_DIGEST_MAX_CHARS) -> str:
+    """The digest as compact prompt text."""
+    lines = []
+    if digest.get("summary"):
+        lines.append(f"Summary: {digest['summary']}")
+    if digest.get("key_terms"):
+        lines.append("Key terms: " + "; ".join(digest["key_terms"]))
+    if digest.get("facts"):
+        lines.append("Facts:")
+        lines.extend(f"- {fact}" for fact in digest["facts"])
+    if digest.get("definitions"):
+        lines.append("Definitions:")
+        lines.extend(f"- {d['term']}: {d['definition']}" for d in digest["definitions"])
+    if digest.get("vocabulary"):
+        lines.append("Vocabulary:")
+        lines.extend(f"- {v['word']} — {v['meaning']}" for v in digest["vocabulary"])
+    return "\n".join(lines)[:max_chars]
+
+
+def parse_digest(stored: Optional[str]) -> Optional[str]:
+    """A stored digest rendered for the prompt, or None if there is none (yet)."""
+    if not stored:
+        return None
+    try:
+        return render_digest(json.loads(stored))
+    except (ValueError, TypeError, KeyError):
+        logger.warning("Unreadable material digest, ignoring it")
+        return None
+
+
+def schedule_digest(content_id: int, user_id: int) -> None:
+    """Starts building the content's digest in the background, unless this worker already is."""
+    if content_id in _building or not digest_available():
+        return
+    task = asyncio.create_task(build_digest(content_id, user_id))
+    _building[content_id] = task
+    task.add_done_callback(lambda _: _building.pop(content_id, None))
+
+
+async def build_digest(content_id: int, user_id: int) -> None:
+    try:
+        # The AI call takes seconds; no pooled connection is held across it
+        async with get_async_sessionmaker()() as db:
+            row = (await db.execute(
+                select(
+                    MaterialContent.digest,
+                    MaterialContent.digest_failed_at,
+                    func.substr(MaterialContent.extracted_text, 1, MATERIAL_DIGEST_INPUT_CHARS).label("text"),
+                ).where(MaterialContent.id == content_id)
+            )).first()
+        if row is None or row.digest or not retry_due(row.digest_failed_at) or not (row.text or "").strip():
+            return
+
+        data, tokens = await generate_material_digest(row.text)
+        digest = clean_digest(data)
+        if digest is None:
+            logger.warning("Material content %s: the digest came back empty", content_id)
+            values = {"digest_failed_at": datetime.utcnow()}
+        else:
+            values = {"digest": json.dumps(digest, ensure_ascii=False), "digest_failed_at": None}
+
+        async with get_async_sessionmaker()() as db:
+            # Another worker may have finished first; keep its digest
+            await db.execute(
+                update(MaterialContent)
+                .where(MaterialContent.id == content_id, MaterialContent.digest.is_(None))
+                .values(**values)
+            )
+            await db.commit()
+            if tokens:
+                await adjust_tokens(user_id, tokens, db)
+    except Exception:
+        logger.exception("Material content %s: digest build failed", content_id)
@@ -0,0 +1,137 @@
+"""
+Text extraction for uploaded materials.
+
+pypdf / python-docx are pure-Python and CPU-bound: a 5 MB PDF takes seconds.
+Parsing runs on a process pool of MATERIAL_EXTRACT_WORKERS processes, never
+on the event loop, and gives up after MATERIAL_EXTRACT_TIMEOUT_SECONDS. A
+worker stuck on a pathological file can't be interrupted, so a timeout
+replaces the pool (terminating its processes) instead of leaving the worker
+busy forever.
+
+Extraction stops as soon as `max_chars` characters are collected, so pages
+past that are never parsed. Chunking and term counting for the material
+index (apps.library.material_index) happen in the same worker call.
+"""
+import asyncio
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from config import MATERIAL_EXTRACT_TIMEOUT_SECONDS, MATERIAL_EXTRACT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """The file can't be read; the message is shown to the user."""
+
+
+# ── Worker-side (runs in the pool processes) ────────────────────
+
+def _take(parts, max_chars: int) -> str:
+    """Joins text parts with newlines, consuming the iterator only until max_chars are collected."""
+    collected, size = [], 0
+    for part in parts:
+        if not part:
+            continue
+        size += len(part) + (1 if collected else 0)
+        collected.append(part)
+        if size >= max_chars:
+            break
+    return "\n".join(collected)[:max_chars]
+
+
+def extract_text(ext: str, content: bytes, max_chars: int) -> str:
+    if ext == "txt":
+        # A character is at most 4 UTF-8 bytes: no need to decode the rest
+        return content[:max_chars * 4].decode("utf-8", errors="replace")[:max_chars]
+
+    if ext == "pdf":
+        try:
+            import pypdf
+        except ImportError:
+            raise ExtractionError("PDF parsing not available on this server.")
+        try:
+            reader = pypdf.PdfReader(io.BytesIO(content))
+            # reader.pages is lazy: pages past the budget are never parsed
+            return _take((page.extract_text() for page in reader.pages), max_chars)
+        except Exception as e:
+            raise ExtractionError(f"Could not read PDF: {e}")
+
+    if ext == "docx":
+        try:
+            import docx
+        except ImportError:
+            raise ExtractionError("DOCX parsing not available on this server.")
+        try:
+            document = docx.Document(io.BytesIO(content))
+            return _take((p.text for p in document.paragraphs), max_chars)
+        except Exception as e:
+            raise ExtractionError(f"Could not read DOCX: {e}")
+
+    raise ExtractionError(f"Unsupported file type: {ext}")
+
+
+def extract_and_index(ext: str, content: bytes, max_chars: int) -> tuple[str, list]:
+    from apps.library.material_index import build_index
+
+    text = extract_text(ext, content, max_chars)
+    return text, build_index(text)
+
+
+# ── Pool ────────────────────────────────────────────────────────
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+# One file per worker process at a time: the timeout then measures parsing, not queueing
+_slots = asyncio.Semaphore(MATERIAL_EXTRACT_WORKERS)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MATERIAL_EXTRACT_WORKERS)
+        return _pool
+
+
+def _replace_pool(stuck: ProcessPoolExecutor) -> None:
+    global _pool
+    with _lock:
+        if _pool is stuck:
+            _pool = None
+    # ProcessPoolExecutor can't cancel a running call; stop its processes directly
+    for process in list((getattr(stuck, "_processes", None) or {}).values()):
+        process.terminate()
+    stuck.shutdown(wait=False, cancel_futures=True)
+
+
+async def extract(ext: str, content: bytes, max_chars: int) -> tuple[str, list]:
+    """
+    The text and its index chunks (see material_index.build_index), computed
+    off the event loop; raises ExtractionError on unreadable files and on timeout.
+    """
+    async with _slots:
+        pool = get_pool()
+        future = pool.submit(extract_and_index, ext, content, max_chars)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), MATERIAL_EXTRACT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("Material extraction (%s, %d bytes) timed out, replacing the pool", ext, len(content))
+            _replace_pool(pool)
+            raise ExtractionError("The file took too long to process.")
+        except BrokenProcessPool:
+            # The pool was replaced (or a worker died) while this file was on it
+            _replace_pool(pool)
+            raise ExtractionError("The file could not be processed, please try again.")
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,186 @@
+"""
+Chunked index of uploaded materials, and relevance-based prompt context.
+
+When a file's content is first stored (apps.library.contents) its text is
+split into ~MATERIAL_CHUNK_CHARS chunks on paragraph and sentence boundaries
+(material_chunks) and every chunk's terms go into an inverted index
+(material_terms). A generation then ranks the content's chunks against its topic with BM25 — reading only the postings of the
+topic's terms — and sends the best ones, in document order, within
+MATERIAL_CONTEXT_TOKENS. With no topic, no matching chunk or a material
+indexed before this existed, the beginning of the text is used as before.
+
+Terms are lowercased words cut to their first STEM_CHARS characters: a crude
+but language-neutral stemmer that folds most Russian/Uzbek inflections
+(«фотосинтеза», «фотосинтезом» -> «фотоси») without a morphology library.
+Everything is plain SQL, so it works the same on PostgreSQL and SQLite.
+"""
+import math
+import re
+from collections import Counter
+from typing import Iterator, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from apps.library.models import MaterialChunk, MaterialContent, MaterialTerm
+from config import MATERIAL_CHUNK_CHARS, MATERIAL_CONTEXT_CHUNKS, MATERIAL_CONTEXT_TOKENS
+
+STEM_CHARS = 6
+CHARS_PER_TOKEN = 4  # rough, for the context budget
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+_STOPWORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от
+меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж
+вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без
+будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один
+почти мой тем чтобы нее были куда зачем всех никогда можно при наконец два об другой хоть после над
+больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+иногда лучше чуть том нельзя такой им более всегда конечно всю между это
+the a an and or of to in on at for is are was were be been by with as it its this that these those from
+but not no so if then than into about over also can will would should could has have had do does did
+va bu bilan uchun ham esa yoki lekin bir u ular men biz siz
+""".split())
+
+
+def terms(text: str) -> list[str]:
+    words = (w.lower() for w in _WORD.findall(text))
+    return [w[:STEM_CHARS] for w in words if len(w) > 1 and not w.isdigit() and w not in _STOPWORDS]
+
+
+def _pieces(text: str, size: int) -> Iterator[str]:
+    """Paragraphs; ones longer than `size` are cut at sentence ends, then at spaces."""
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= size:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            while len(sentence) > size:
+                cut = sentence.rfind(" ", 0, size)
+                cut = cut if cut > size // 2 else size
+                yield sentence[:cut].strip()
+                sentence = sentence[cut:]
+            if sentence.strip():
+                yield sentence.strip()
+
+
+def chunk_text(text: str, size: int = MATERIAL_CHUNK_CHARS) -> list[str]:
+    """Packs consecutive pieces into chunks of at most ~size characters."""
+    chunks, current = [], ""
+    for piece in _pieces(text, size):
+        if current and len(current) + 1 + len(piece) > size:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def build_index(text: str) -> list[tuple[str, int, dict[str, int]]]:
+    """(chunk text, term count, term frequencies) per chunk; CPU-only, runs in the extraction pool."""
+    index = []
+    for chunk in chunk_text(text):
+        chunk_terms = terms(chunk)
+        index.append((chunk, len(chunk_terms), dict(Counter(chunk_terms))))
+    return index
+
+
+# ── Storage ─────────────────────────────────────────────────────
+
+def index_rows(content_id: int, index: list[tuple[str, int, dict[str, int]]]) -> tuple[list[dict], list[dict]]:
+    """material_chunks and material_terms rows for a build_index() result."""
+    chunks = [
+        {"content_id": content_id, "position": position, "text": chunk, "length": length}
+        for position, (chunk, length, _) in enumerate(index)
+    ]
+    postings = [
+        {"content_id": content_id, "term": term, "position": position, "tf": tf}
+        for position, (_, _, frequencies) in enumerate(index)
+        for term, tf in frequencies.items()
+    ]
+    return chunks, postings
+
+
+async def store_index(db: AsyncSession, content_id: int, index: list[tuple[str, int, dict[str, int]]]) -> None:
+    """Replaces the content's chunks and postings; committed with the caller's transaction."""
+    await db.execute(delete(MaterialTerm).where(MaterialTerm.content_id == content_id))
+    await db.execute(delete(MaterialChunk).where(MaterialChunk.content_id == content_id))
+    chunks, postings = index_rows(content_id, index)
+    if chunks:
+        await db.execute(insert(MaterialChunk), chunks)
+    if postings:
+        await db.execute(insert(MaterialTerm), postings)
+
+
+# ── Context selection ───────────────────────────────────────────
+
+def rank_chunks(lengths: dict[int, int], postings: list[tuple[str, int, int]]) -> list[tuple[int, float]]:
+    """BM25 of each chunk position from (term, position, tf) postings, best first."""
+    if not lengths:
+        return []
+    n = len(lengths)
+    avg_length = sum(lengths.values()) / n or 1
+    df = Counter(term for term, _, _ in postings)
+    scores: dict[int, float] = {}
+    for term, position, tf in postings:
+        idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+        norm = tf + K1 * (1 - B + B * lengths.get(position, 0) / avg_length)
+        scores[position] = scores.get(position, 0.0) + idf * tf * (K1 + 1) / norm
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+async def select_context(
+    db: AsyncSession,
+    content_id: int,
+    query: Optional[str],
+    max_tokens: int = MATERIAL_CONTEXT_TOKENS,
+    max_chunks: int = MATERIAL_CONTEXT_CHUNKS,
+) -> str:
+    """The content's most relevant text for `query` within the budget. Ownership is the caller's check."""
+    budget = max_tokens * CHARS_PER_TOKEN
+    head = (await db.execute(
+        select(func.substr(MaterialContent.extracted_text, 1, budget)).where(MaterialContent.id == content_id)
+    )).scalar() or ""
+
+    lengths = dict((await db.execute(
+        select(MaterialChunk.position, MaterialChunk.length).where(MaterialChunk.content_id == content_id)
+    )).all())
+    query_terms = sorted(set(terms(query or "")))
+    if not lengths or not query_terms:
+        return head
+
+    postings = (await db.execute(
+        select(MaterialTerm.term, MaterialTerm.position, MaterialTerm.tf).where(
+            MaterialTerm.content_id == content_id, MaterialTerm.term.in_(query_terms)
+        )
+    )).all()
+    ranked = rank_chunks(lengths, [tuple(p) for p in postings])
+    if not ranked:
+        return head
+
+    texts = dict((await db.execute(
+        select(MaterialChunk.position, MaterialChunk.text).where(
+            MaterialChunk.content_id == content_id,
+            MaterialChunk.position.in_([position for position, _ in ranked[:max_chunks]]),
+        )
+    )).all())
+    chosen, used = [], 0
+    for position, _ in ranked[:max_chunks]:
+        text = texts.get(position, "")
+        if used + len(text) > budget:
+            continue
+        chosen.append(position)
+        used += len(text)
+    # Document order reads better than score order
+    return "\n…\n".join(texts[position] for position in sorted(chosen))
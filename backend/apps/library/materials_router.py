@@ -1,12 +1,20 @@
-import io
 import logging
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db
 from apps.auth.models import User
 from apps.auth.dependencies import get_current_user
+from apps.auth.context import RequestContext, get_request_context
 from apps.library.models import UserMaterial
-from apps.generator.services import get_user_plan
+from apps.library import contents, extraction
+from apps.library.digest import schedule_digest
+from apps.library.material_index import store_index
+from config import MATERIAL_INDEX_MAX_CHARS
+from services.search import search_materials
 
 logger = logging.getLogger(__name__)
 
@@ -14,58 +22,82 @@ router = APIRouter(prefix="/materials", tags=["materials"])
 
 PLAN_FILE_LIMITS = {"free": 5, "pro": 30, "school": 100}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB
-MAX_CONTEXT_CHARS = 12000        # ~3k tokens of context injected into prompt
 ALLOWED_TYPES = {"pdf", "docx", "txt"}
+MULTIPART_OVERHEAD = 64 * 1024   # boundaries and part headers around the file
+
+# The body is parsed by hand (see _read_upload), so describe it for the docs
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+
+class _UploadTooLarge(Exception):
+    pass
+
+
+async def _capped_stream(request: Request, limit: int):
+    """The request body, failing as soon as more than `limit` bytes have arrived."""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise _UploadTooLarge()
+        yield chunk
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail="File too large. Maximum 5 MB.")
+
+
+async def _read_upload(request: Request) -> tuple[str, bytes]:
+    """
+    Parses the multipart body (field "file") while it streams in. The size cap
+    applies to the raw body, so an oversized upload is cut off after
+    MAX_FILE_SIZE + MULTIPART_OVERHEAD bytes instead of being spooled whole.
+    """
+    limit = MAX_FILE_SIZE + MULTIPART_OVERHEAD
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise _too_large()
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data upload with a 'file' field.")
+    try:
+        form = await MultiPartParser(request.headers, _capped_stream(request, limit), max_files=1, max_fields=5).parse()
+    except _UploadTooLarge:
+        raise _too_large()
+    except MultiPartException as e:
+        raise HTTPException(status_code=422, detail=e.message)
+
+    upload = form.get("file")
+    if not isinstance(upload, StarletteUploadFile):
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data upload with a 'file' field.")
+    try:
+        content = await upload.read(MAX_FILE_SIZE + 1)
+    finally:
+        await form.close()
+    if len(content) > MAX_FILE_SIZE:
+        raise _too_large()
+    return upload.filename or "file", content
 
 
-def _extract_text(filename: str, content: bytes) -> str:
-    ext = filename.rsplit(".", 1)[-1].lower()
-
-    if ext == "txt":
-        return content.decode("utf-8", errors="replace")
-
-    if ext == "pdf":
-        try:
-            import pypdf
-            reader = pypdf.PdfReader(io.BytesIO(content))
-            parts = [page.extract_text() or "" for page in reader.pages]
-            return "\n".join(parts)
-        except ImportError:
-            raise HTTPException(status_code=422, detail="PDF parsing not available on this server.")
-        except Exception as e:
-            raise HTTPException(status_code=422, detail=f"Could not read PDF: {e}")
-
-    if ext == "docx":
-        try:
-            import docx
-            doc = docx.Document(io.BytesIO(content))
-            return "\n".join(p.text for p in doc.paragraphs)
-        except ImportError:
-            raise HTTPException(status_code=422, detail="DOCX parsing not available on this server.")
-        except Exception as e:
-            raise HTTPException(status_code=422, detail=f"Could not read DOCX: {e}")
-
-    raise HTTPException(status_code=422, detail=f"Unsupported file type: {ext}")
-
-
-@router.post("/upload")
+@router.post("/upload", openapi_extra=UPLOAD_OPENAPI)
 async def upload_material(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    user: RequestContext = Depends(get_request_context),
 ):
-    filename = file.filename or "file"
-    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-    if ext not in ALLOWED_TYPES:
-        raise HTTPException(status_code=422, detail="Allowed formats: PDF, DOCX, TXT")
-
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large. Maximum 5 MB.")
-
-    plan = get_user_plan(user, db)
+    # The plan limit is checked before any of the body is read
+    plan = user.plan
     limit = PLAN_FILE_LIMITS.get(plan, 5)
-    existing = db.query(UserMaterial).filter(UserMaterial.user_id == user.id).count()
+    existing = (await db.execute(
+        select(func.count(UserMaterial.id)).where(UserMaterial.user_id == user.id)
+    )).scalar()
     if existing >= limit:
         raise HTTPException(
             status_code=403,
@@ -77,19 +109,38 @@ async def upload_material(
             },
         )
 
-    text = _extract_text(filename, content)
-    text = text[:MAX_CONTEXT_CHARS]  # keep context manageable
+    filename, content = await _read_upload(request)
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext not in ALLOWED_TYPES:
+        raise HTTPException(status_code=422, detail="Allowed formats: PDF, DOCX, TXT")
+
+    # A file someone has already uploaded is not parsed, indexed or summarized again
+    sha256 = contents.content_hash(content)
+    shared = await contents.acquire_existing(db, sha256, ext)
+    if shared:
+        content_id, char_count = shared
+    else:
+        try:
+            # The whole text is kept; generations only take its relevant chunks (see material_index)
+            text, index = await extraction.extract(ext, content, MATERIAL_INDEX_MAX_CHARS)
+        except extraction.ExtractionError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        content_id, created = await contents.acquire_new(db, sha256, ext, text)
+        if created:
+            await store_index(db, content_id, index)
+        char_count = len(text)
 
     material = UserMaterial(
         user_id=user.id,
+        content_id=content_id,
         filename=filename,
         file_type=ext,
-        extracted_text=text,
-        char_count=len(text),
+        char_count=char_count,
     )
     db.add(material)
-    db.commit()
-    db.refresh(material)
+    await db.commit()
+    await db.refresh(material)
+    schedule_digest(content_id, user.id)
 
     return {
         "id": material.id,
@@ -123,6 +174,17 @@ def list_materials(
     ]
 
 
+@router.get("/search")
+def search_my_materials(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    return search_materials(db, user.id, q, limit, offset)
+
+
 @router.delete("/{material_id}")
 def delete_material(
     material_id: int,
@@ -135,6 +197,9 @@ def delete_material(
     ).first()
     if not material:
         raise HTTPException(status_code=404, detail="Material not found.")
+    content_id = material.content_id
     db.delete(material)
+    db.flush()
+    contents.release(db, content_id)
     db.commit()
     return {"ok": True}
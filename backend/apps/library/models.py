@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, BigInteger, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -33,15 +33,68 @@ class GeneratedBook(Base):
     user = relationship("User", back_populates="books")
 
 
+class MaterialContent(Base):
+    """
+    An uploaded file's extracted text, digest and index, stored once however
+    many users upload the same file. ref_count is the number of user_materials
+    pointing here; the row goes when it drops to zero (apps.library.contents).
+    sha256 is of the file bytes; NULL for materials uploaded before hashing.
+    """
+    __tablename__ = "material_contents"
+    __table_args__ = (
+        UniqueConstraint("sha256", "file_type", name="uq_material_contents_sha256_type"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String, nullable=True)
+    file_type = Column(String, nullable=False)
+    extracted_text = Column(Text, nullable=False)
+    char_count = Column(Integer, nullable=False, default=0)
+    digest = Column(Text, nullable=True)  # JSON summary sent to generations instead of the text (apps.library.digest)
+    digest_failed_at = Column(DateTime, nullable=True)  # last build that gave nothing usable; retried after a backoff
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class UserMaterial(Base):
+    """A user's upload: their own name for it and a reference to the shared content."""
     __tablename__ = "user_materials"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    content_id = Column(Integer, ForeignKey("material_contents.id"), nullable=False, index=True)
     filename = Column(String, nullable=False)
     file_type = Column(String, nullable=False)  # "pdf" | "docx" | "txt"
-    extracted_text = Column(Text, nullable=False)
     char_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
+    content = relationship("MaterialContent")
+
+
+class MaterialChunk(Base):
+    """A ~MATERIAL_CHUNK_CHARS piece of a content's text; length is its number of index terms (BM25 dl)."""
+    __tablename__ = "material_chunks"
+    __table_args__ = (
+        UniqueConstraint("content_id", "position", name="uq_material_chunks_content_position"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    content_id = Column(Integer, ForeignKey("material_contents.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    length = Column(Integer, nullable=False)
+
+
+class MaterialTerm(Base):
+    """Inverted index: how often `term` occurs in chunk `position` of a content."""
+    __tablename__ = "material_terms"
+    __table_args__ = (
+        Index("idx_material_terms_content_term", "content_id", "term"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    content_id = Column(Integer, ForeignKey("material_contents.id", ondelete="CASCADE"), nullable=False)
+    term = Column(String, nullable=False)
+    position = Column(Integer, nullable=False)
+    tf = Column(Integer, nullable=False)
@@ -1,15 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from database import get_db
+from database import get_db, get_async_db
 from apps.auth.models import User
 from apps.auth.dependencies import get_current_user
+from apps.auth.context import RequestContext, get_request_context
 from services import gemini_service, openai_service
 from config import GEMINI_API_KEYS_LIST, OPENAI_API_KEY
 from apps.library.schemas import StorybookRequest, SavedResourceCreate, SavedResourceResponse, BookResponse
 from apps.library.models import SavedResource, GeneratedBook
-from apps.generator.services import check_token_quota, increment_token_usage, priority_guard, get_user_plan, get_org_gemini_key
+from apps.generator.services import token_reservation, priority_guard
 from apps.generator.models import TokenUsage
+from apps.generator.recorder import record_generation
 from typing import List
 import traceback
 import logging
@@ -19,15 +23,17 @@ import random
 BOOK_DAILY_LIMITS = {"free": 2, "pro": 10, "school": 50}
 
 
-def check_book_daily_limit(user: User, db: Session) -> None:
-    plan = get_user_plan(user, db)
+async def check_book_daily_limit(user: RequestContext, db: AsyncSession) -> None:
+    plan = user.plan
     limit = BOOK_DAILY_LIMITS.get(plan, 2)
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    books_today = db.query(TokenUsage).filter(
-        TokenUsage.user_id == user.id,
-        TokenUsage.feature_name == "storybook",
-        TokenUsage.created_at >= today_start,
-    ).count()
+    books_today = (await db.execute(
+        select(func.count(TokenUsage.id)).where(
+            TokenUsage.user_id == user.id,
+            TokenUsage.feature_name == "storybook",
+            TokenUsage.created_at >= today_start,
+        )
+    )).scalar()
     if books_today >= limit:
         raise HTTPException(status_code=429, detail={
             "error": "book_daily_limit",
@@ -46,90 +52,86 @@ library_router = APIRouter(prefix="/library", tags=["library"])
 @library_router.post("/generate", response_model=BookResponse)
 async def gen_storybook(
     req: StorybookRequest,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: RequestContext = Depends(get_request_context),
 ):
-    await priority_guard(user, db)
-    check_token_quota(user, db)
-    check_book_daily_limit(user, db)
-
-    result = None
-    provider = None
-    custom_key = get_org_gemini_key(user, db)
-
-    # ── Попытка 1: Gemini ────────────────────────────────────────────────────
-    if custom_key or GEMINI_API_KEYS_LIST:
-        try:
-            logger.info("Trying Gemini for storybook generation%s...", " (org custom key)" if custom_key else "")
-            result = await gemini_service.generate_storybook(
-                title=req.title,
-                topic=req.topic,
-                age_group=req.age_group,
-                language=req.language,
-                genre=req.genre,
-                custom_api_key=custom_key,
-            )
-            if result:
-                provider = "gemini"
-                logger.info("Storybook generated successfully via Gemini")
-        except Exception as e:
-            logger.warning(f"Gemini failed: {e}. Falling back to OpenAI...")
-
-    # ── Попытка 2: OpenAI fallback ───────────────────────────────────────────
-    if result is None:
-        if not OPENAI_API_KEY:
+    await priority_guard(user)
+    await check_book_daily_limit(user, db)
+
+    async with token_reservation(user, "storybook", db) as reservation:
+        result = None
+        provider = None
+        custom_key = user.custom_gemini_key
+
+        # ── Попытка 1: Gemini ────────────────────────────────────────────────────
+        if custom_key or GEMINI_API_KEYS_LIST:
+            try:
+                logger.info("Trying Gemini for storybook generation%s...", " (org custom key)" if custom_key else "")
+                result = await gemini_service.generate_storybook(
+                    title=req.title,
+                    topic=req.topic,
+                    age_group=req.age_group,
+                    language=req.language,
+                    genre=req.genre,
+                    custom_api_key=custom_key,
+                )
+                if result:
+                    provider = "gemini"
+                    logger.info("Storybook generated successfully via Gemini")
+            except Exception as e:
+                logger.warning(f"Gemini failed: {e}. Falling back to OpenAI...")
+
+        # ── Попытка 2: OpenAI fallback ───────────────────────────────────────────
+        if result is None:
+            if not OPENAI_API_KEY:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Gemini quota exhausted and OPENAI_API_KEY is not configured. Please try again later.",
+                )
+            try:
+                logger.info("Falling back to OpenAI (gpt-4o-mini + DALL-E 3)...")
+                result = await openai_service.generate_storybook(
+                    title=req.title,
+                    topic=req.topic,
+                    age_group=req.age_group,
+                    language=req.language,
+                    genre=req.genre,
+                    openai_api_key=OPENAI_API_KEY,
+                )
+                if result:
+                    provider = "openai"
+                    logger.info("Storybook generated successfully via OpenAI fallback")
+            except Exception as e:
+                logger.error(f"OpenAI fallback also failed: {e}")
+                traceback.print_exc()
+
+        if result is None:
             raise HTTPException(
                 status_code=503,
-                detail="Gemini quota exhausted and OPENAI_API_KEY is not configured. Please try again later.",
-            )
-        try:
-            logger.info("Falling back to OpenAI (gpt-4o-mini + DALL-E 3)...")
-            result = await openai_service.generate_storybook(
-                title=req.title,
-                topic=req.topic,
-                age_group=req.age_group,
-                language=req.language,
-                genre=req.genre,
-                openai_api_key=OPENAI_API_KEY,
+                detail="Book generation failed on all providers. Please try again later.",
             )
-            if result:
-                provider = "openai"
-                logger.info("Storybook generated successfully via OpenAI fallback")
-        except Exception as e:
-            logger.error(f"OpenAI fallback also failed: {e}")
-            traceback.print_exc()
-
-    if result is None:
-        raise HTTPException(
-            status_code=503,
-            detail="Book generation failed on all providers. Please try again later.",
+
+        emojis = ["📚","🧚","🦁","🐉","🚀","🌊","🌟","🦋","🐬","🏰"]
+        book = GeneratedBook(
+            user_id=user.id,
+            title=result["title"],
+            description=result.get("description"),
+            age_group=result.get("age_group", req.age_group),
+            genre=result.get("genre", req.genre),
+            language=result.get("language", req.language),
+            cover_emoji=random.choice(emojis),
+            pages=json.dumps(result["pages"], ensure_ascii=False),
         )
+        db.add(book)
 
-    emojis = ["📚","🧚","🦁","🐉","🚀","🌊","🌟","🦋","🐬","🏰"]
-    book = GeneratedBook(
-        user_id=user.id,
-        title=result["title"],
-        description=result.get("description"),
-        age_group=result.get("age_group", req.age_group),
-        genre=result.get("genre", req.genre),
-        language=result.get("language", req.language),
-        cover_emoji=random.choice(emojis),
-        pages=json.dumps(result["pages"], ensure_ascii=False),
-    )
-    db.add(book)
-    db.commit()
-    db.refresh(book)
-
-    # Log storybook usage (for daily limit tracking + token quota)
-    pages_count = len(result.get("pages", []))
-    image_penalty = pages_count * 500  # each image = separate Gemini request
-    estimated_tokens = 2000 + image_penalty
-    usage = TokenUsage(user_id=user.id, feature_name="storybook", tokens_total=estimated_tokens)
-    db.add(usage)
-    increment_token_usage(user, estimated_tokens, db)
-
-    book.pages = result["pages"]
-    return book
+        # Book, usage row (daily limit tracking) and quota in one transaction
+        pages_count = len(result.get("pages", []))
+        image_penalty = pages_count * 500  # each image = separate Gemini request
+        estimated_tokens = 2000 + image_penalty
+        await record_generation(db, user, "storybook", estimated_tokens, reservation=reservation, buffered=False)
+
+        book.pages = result["pages"]
+        return book
 
 @library_router.get("/books")
 def get_books(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
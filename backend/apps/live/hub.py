@@ -0,0 +1,301 @@
+"""
+Live classroom sessions, kept in this worker's memory.
+
+A teacher opens a session from one of their generation logs and runs it from
+the board; student devices join with the session code over a WebSocket. The
+round, the answers and the scores only live here, and every change is pushed
+to the sockets — nothing is polled and nothing is written per answer. Rewards
+go through gamification's process_activity_batch once, when the session ends.
+
+Fan-out: each socket has a bounded send queue drained by its own writer task.
+A broadcast serializes its message once and only enqueues it, so one slow
+device never holds up the session or the other sockets. A device whose queue
+overflows is disconnected and gets a full snapshot when it rejoins.
+
+All session methods run on the event loop and never await, so no locks are
+needed. Sessions are pinned to the worker that created them: with several
+uvicorn workers, route /api/v1/live/* by session code (or give the hub one
+worker of its own).
+"""
+import asyncio
+import json
+import logging
+import secrets
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from uuid import uuid4
+
+from fastapi import WebSocket
+
+from apps.live.rounds import is_correct, public_round
+from config import LIVE_MAX_PLAYERS, LIVE_SEND_QUEUE, LIVE_SESSION_IDLE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Close codes sent to devices (4000-4999 are application-defined)
+CLOSE_SLOW_CONSUMER = 4008
+CLOSE_SESSION_GONE = 4404
+
+
+class Connection:
+    """A socket and its outbound queue."""
+
+    def __init__(self, websocket: WebSocket, max_queue: int = LIVE_SEND_QUEUE):
+        self.websocket = websocket
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._drain())
+
+    def send(self, message: str) -> bool:
+        """Queues an already-serialized message; False if the device isn't keeping up."""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _drain(self) -> None:
+        try:
+            while True:
+                await self.websocket.send_text(await self._queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is gone; its reader loop does the cleanup
+            pass
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer:
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+@dataclass
+class Player:
+    key: str  # "u<user_id>" for signed-in students, "g<device id>" for guests
+    name: str
+    user_id: Optional[int] = None
+    score: int = 0
+    correct: list[int] = field(default_factory=list)  # indexes of rounds answered right
+    connection: Optional[Connection] = None
+
+    def public(self) -> dict:
+        return {"key": self.key, "name": self.name, "score": self.score, "online": self.connection is not None}
+
+
+class LiveSession:
+    def __init__(self, code: str, host_id: int, log_id: int, generator_type: str, topic: Optional[str], rounds: list[dict]):
+        self.id = uuid4().hex  # reward event ids: codes are reused, this isn't
+        self.code = code
+        self.host_id = host_id
+        self.log_id = log_id
+        self.generator_type = generator_type
+        self.topic = topic
+        self.rounds = rounds
+        self.state = "lobby"  # lobby -> question -> reveal -> question ... -> finished
+        self.index = -1
+        self.players: dict[str, Player] = {}
+        self.hosts: set[Connection] = set()
+        self.answers: dict[str, Any] = {}  # player key -> answer to the current round
+        self.rewards: Optional[dict[int, dict]] = None  # user_id -> reward totals, once flushed
+        self.last_activity = time.monotonic()
+
+    # ── Fan-out ─────────────────────────────────────────────────
+
+    def _deliver(self, connections, message: dict) -> None:
+        text = json.dumps(message, ensure_ascii=False)
+        for connection in list(connections):
+            if not connection.send(text):
+                self._drop(connection)
+
+    def broadcast(self, message: dict) -> None:
+        self._deliver(self.connections(), message)
+
+    def to_hosts(self, message: dict) -> None:
+        self._deliver(self.hosts, message)
+
+    def to_player(self, key: str, message: dict) -> None:
+        player = self.players.get(key)
+        if player and player.connection:
+            self._deliver([player.connection], message)
+
+    def connections(self) -> list[Connection]:
+        return [*self.hosts, *(p.connection for p in self.players.values() if p.connection)]
+
+    def _drop(self, connection: Connection) -> None:
+        if connection.closed:
+            return
+        logger.info("Live session %s: dropping a slow device", self.code)
+        self.disconnect(connection)
+        asyncio.create_task(connection.close(CLOSE_SLOW_CONSUMER))
+
+    # ── Membership ──────────────────────────────────────────────
+
+    @property
+    def full(self) -> bool:
+        return len(self.players) >= LIVE_MAX_PLAYERS
+
+    def add_host(self, connection: Connection) -> None:
+        self.hosts.add(connection)
+        self._deliver([connection], self.snapshot(for_host=True))
+
+    def join(self, player: Player, connection: Connection) -> Player:
+        """Adds a player, or reattaches a returning one (score kept) to the new socket."""
+        existing = self.players.get(player.key)
+        if existing:
+            if existing.connection:
+                asyncio.create_task(existing.connection.close())
+            player = existing
+        else:
+            self.players[player.key] = player
+        player.connection = connection
+        self.touch()
+        self._deliver([connection], {**self.snapshot(), "you": player.public(), "answered": player.key in self.answers})
+        self.to_hosts({"type": "player", "player": player.public(), "players": len(self.players)})
+        return player
+
+    def disconnect(self, connection: Connection) -> None:
+        self.hosts.discard(connection)
+        for player in self.players.values():
+            if player.connection is connection:
+                player.connection = None
+                self.to_hosts({"type": "player", "player": player.public(), "players": len(self.players)})
+
+    def touch(self) -> None:
+        self.last_activity = time.monotonic()
+
+    # ── Game flow ───────────────────────────────────────────────
+
+    def snapshot(self, for_host: bool = False) -> dict:
+        current = self.rounds[self.index] if 0 <= self.index < len(self.rounds) else None
+        state = {
+            "type": "state",
+            "code": self.code,
+            "state": self.state,
+            "generator_type": self.generator_type,
+            "topic": self.topic,
+            "index": self.index,
+            "total": len(self.rounds),
+            "round": public_round(current) if current else None,
+            "answer": current["answer"] if current and (for_host or self.state == "reveal") else None,
+        }
+        if for_host:
+            state["players"] = [p.public() for p in self.players.values()]
+            state["answered"] = len(self.answers)
+        return state
+
+    def next_round(self) -> bool:
+        """Moves to the next question; False when there are none left."""
+        if self.state == "finished" or self.index + 1 >= len(self.rounds):
+            return False
+        self.index += 1
+        self.state = "question"
+        self.answers = {}
+        self.touch()
+        current = self.rounds[self.index]
+        self.broadcast({"type": "question", "index": self.index, "total": len(self.rounds), "round": public_round(current)})
+        self.to_hosts({"type": "answer_key", "index": self.index, "answer": current["answer"]})
+        return True
+
+    def answer(self, player_key: str, index: Any, value: Any) -> bool:
+        """Records a player's first answer to the open question; later ones are ignored."""
+        if self.state != "question" or index != self.index or player_key in self.answers:
+            return False
+        self.answers[player_key] = value
+        self.touch()
+        self.to_hosts({"type": "answered", "index": self.index, "count": len(self.answers), "players": len(self.players)})
+        return True
+
+    def reveal(self) -> None:
+        if self.state != "question":
+            return
+        self.state = "reveal"
+        current = self.rounds[self.index]
+        results = {}
+        for key, value in self.answers.items():
+            player = self.players.get(key)
+            results[key] = is_correct(current, value)
+            if player and results[key]:
+                player.score += current["points"]
+                player.correct.append(self.index)
+        self.touch()
+        self.broadcast({
+            "type": "reveal",
+            "index": self.index,
+            "answer": current["answer"],
+            "results": results,
+            "scores": {p.key: p.score for p in self.players.values()},
+        })
+
+    def standings(self) -> list[dict]:
+        return [p.public() for p in sorted(self.players.values(), key=lambda p: -p.score)]
+
+    def finish(self) -> None:
+        if self.state == "question":
+            self.reveal()
+        self.state = "finished"
+        self.touch()
+        self.broadcast({"type": "finished", "standings": self.standings()})
+
+    def reward_events(self) -> list[dict]:
+        """One completion per correctly answered round, for signed-in players."""
+        return [
+            {
+                "event_id": f"live:{self.id}:{index}",
+                "user_id": player.user_id,
+                "activity_type": self.generator_type,
+                "activity_id": f"live:{self.log_id}:{index}",
+            }
+            for player in self.players.values() if player.user_id is not None
+            for index in player.correct
+        ]
+
+
+class Hub:
+    """This worker's live sessions by code."""
+
+    def __init__(self):
+        self.sessions: dict[str, LiveSession] = {}
+
+    def create(self, host_id: int, log_id: int, generator_type: str, topic: Optional[str], rounds: list[dict]) -> LiveSession:
+        self.prune()
+        code = secrets.randbelow(900_000) + 100_000
+        while str(code) in self.sessions:
+            code = secrets.randbelow(900_000) + 100_000
+        session = LiveSession(str(code), host_id, log_id, generator_type, topic, rounds)
+        self.sessions[session.code] = session
+        return session
+
+    def get(self, code: str) -> Optional[LiveSession]:
+        return self.sessions.get(code)
+
+    def prune(self) -> None:
+        """Closes sessions nobody has touched for LIVE_SESSION_IDLE_SECONDS."""
+        cutoff = time.monotonic() - LIVE_SESSION_IDLE_SECONDS
+        for code, session in list(self.sessions.items()):
+            if session.last_activity < cutoff:
+                del self.sessions[code]
+                for connection in session.connections():
+                    asyncio.create_task(connection.close(CLOSE_SESSION_GONE))
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "players": sum(len(s.players) for s in self.sessions.values()),
+            "connections": sum(len(s.connections()) for s in self.sessions.values()),
+        }
+
+
+hub = Hub()
@@ -0,0 +1,72 @@
+"""
+Question rounds of a live session, built from a GenerationLog payload.
+
+Each generator stores its own shape (quiz questions with options, jeopardy
+categories, hangman words, math problems and puzzles); build_rounds() turns
+them into one list of {"prompt", "options", "hint", "points", "answer"}.
+Only public_round() — without the answer — is ever sent to student devices.
+"""
+from typing import Any, Optional
+
+LIVE_GENERATOR_TYPES = ("quiz", "jeopardy", "hangman", "math", "math_puzzle")
+
+DEFAULT_POINTS = 100
+
+
+def _round(prompt: Any, answer: Any, options: Optional[list] = None, hint: Optional[str] = None, points: Any = None) -> dict:
+    return {
+        "prompt": prompt,
+        "options": options,
+        "hint": hint,
+        "points": points if isinstance(points, int) and points > 0 else DEFAULT_POINTS,
+        "answer": answer,
+    }
+
+
+def build_rounds(generator_type: str, content: Any) -> list[dict]:
+    """Rounds for a supported generator type; items without a question or an answer are skipped."""
+    if not isinstance(content, dict):
+        return []
+    rounds = []
+    if generator_type == "quiz":
+        for q in content.get("questions") or []:
+            if isinstance(q, dict) and q.get("q") and q.get("a"):
+                rounds.append(_round(q["q"], q["a"], options=q.get("options")))
+    elif generator_type == "jeopardy":
+        for category in content.get("categories") or []:
+            if not isinstance(category, dict):
+                continue
+            for q in category.get("questions") or []:
+                if isinstance(q, dict) and q.get("q") and q.get("a"):
+                    rounds.append(_round(q["q"], q["a"], hint=category.get("name"), points=q.get("points")))
+    elif generator_type == "hangman":
+        for w in content.get("words") or []:
+            if isinstance(w, dict) and w.get("word"):
+                # The board shows the blanks; the hint is the question
+                rounds.append(_round("_ " * len(w["word"]), w["word"], hint=w.get("hint")))
+    elif generator_type == "math":
+        for p in content.get("problems") or []:
+            if isinstance(p, dict) and p.get("q") and p.get("a") is not None:
+                rounds.append(_round(p["q"], p["a"]))
+    elif generator_type == "math_puzzle":
+        for p in content.get("puzzles") or []:
+            if not isinstance(p, dict) or p.get("puzzle") is None:
+                continue
+            answer = p.get("answers", p.get("answer"))
+            if answer is not None:
+                rounds.append(_round(p["puzzle"], answer, hint=p.get("rule")))
+    return rounds
+
+
+def public_round(round_: dict) -> dict:
+    return {key: value for key, value in round_.items() if key != "answer"}
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return " ".join(str(value).split()).casefold()
+
+
+def is_correct(round_: dict, answer: Any) -> bool:
+    return answer is not None and _normalize(answer) == _normalize(round_["answer"])
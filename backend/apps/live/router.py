@@ -0,0 +1,192 @@
+"""
+Live sessions: REST to open/look up a session, one WebSocket per device.
+
+Socket URL: /api/v1/live/ws/{code}?token=<jwt> for the teacher and signed-in
+students, ?guest_id=<random device id>&name=<nickname> for guests (they play
+but earn no rewards). The host (the session's teacher) sends
+{"type": "next" | "reveal" | "end"}; players send
+{"type": "answer", "index": <round>, "answer": <value>}.
+"""
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from apps.auth.context import RequestContext, get_request_context
+from apps.auth.dependencies import require_admin
+from apps.gamification.services import process_activity_batch
+from apps.generator.models import GenerationLog
+from apps.live.hub import CLOSE_SESSION_GONE, Connection, LiveSession, Player, hub
+from apps.live.rounds import LIVE_GENERATOR_TYPES, build_rounds
+from apps.live.schemas import LiveSessionCreate
+from config import ACTIVITY_BATCH_MAX_EVENTS
+from database import SessionLocal, get_async_db, get_async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/live", tags=["live"])
+
+
+@router.post("/sessions")
+async def create_session(
+    req: LiveSessionCreate,
+    db: AsyncSession = Depends(get_async_db),
+    user: RequestContext = Depends(get_request_context),
+):
+    log = (await db.execute(
+        select(GenerationLog).where(GenerationLog.id == req.generation_log_id, GenerationLog.user_id == user.id)
+    )).scalar_one_or_none()
+    if not log:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    if log.generator_type not in LIVE_GENERATOR_TYPES:
+        raise HTTPException(status_code=400, detail=f"Live sessions support {', '.join(LIVE_GENERATOR_TYPES)}")
+    rounds = build_rounds(log.generator_type, log.payload)
+    if not rounds:
+        raise HTTPException(status_code=400, detail="This generation has no playable questions")
+
+    session = hub.create(user.id, log.id, log.generator_type, log.topic, rounds)
+    return {
+        "code": session.code,
+        "generator_type": session.generator_type,
+        "topic": session.topic,
+        "rounds": len(rounds),
+        "ws_path": f"/api/v1/live/ws/{session.code}",
+    }
+
+
+@router.get("/sessions/{code}")
+async def get_session(code: str):
+    """Join screen info; needs no login so guests can check a code."""
+    session = hub.get(code)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {
+        "code": session.code,
+        "generator_type": session.generator_type,
+        "topic": session.topic,
+        "state": session.state,
+        "players": len(session.players),
+        "full": session.full,
+    }
+
+
+@router.get("/stats")
+async def get_stats(admin=Depends(require_admin)):
+    return hub.stats()
+
+
+# ── WebSocket ───────────────────────────────────────────────────
+
+async def _socket_user(websocket: WebSocket, token: Optional[str]) -> Optional[RequestContext]:
+    if not token:
+        return None
+    async with get_async_sessionmaker()() as db:
+        return await get_request_context(websocket, token, db)
+
+
+def _flush_rewards(events: list[dict]) -> dict[int, dict]:
+    """Runs in a thread: applies the session's completions, ACTIVITY_BATCH_MAX_EVENTS per transaction."""
+    totals: dict[int, dict] = {}
+    db = SessionLocal()
+    try:
+        for start in range(0, len(events), ACTIVITY_BATCH_MAX_EVENTS):
+            result = process_activity_batch(db, events[start:start + ACTIVITY_BATCH_MAX_EVENTS])
+            for event in result["events"]:
+                student = totals.setdefault(event["user_id"], {"xp_earned": 0, "coins_earned": 0})
+                student["xp_earned"] += event["xp_earned"]
+                student["coins_earned"] += event["coins_earned"]
+    finally:
+        db.close()
+    return totals
+
+
+async def _end_session(session: LiveSession) -> None:
+    if session.state != "finished":
+        session.finish()
+    if session.rewards is not None:
+        return
+    try:
+        # Event ids are stable per session, so repeating "end" after a failure can't double-award
+        session.rewards = await asyncio.to_thread(_flush_rewards, session.reward_events())
+    except Exception:
+        logger.exception("Live session %s: reward flush failed", session.code)
+        session.to_hosts({"type": "error", "message": "Rewards could not be saved, send end again"})
+        return
+    for player in session.players.values():
+        if player.user_id in session.rewards:
+            session.to_player(player.key, {"type": "rewards", **session.rewards[player.user_id]})
+    session.to_hosts({"type": "rewards", "students": len(session.rewards)})
+
+
+async def _host_command(session: LiveSession, message: dict) -> None:
+    command = message.get("type")
+    if command == "next":
+        if not session.next_round():
+            await _end_session(session)
+    elif command == "reveal":
+        session.reveal()
+    elif command == "end":
+        await _end_session(session)
+
+
+@router.websocket("/ws/{code}")
+async def session_socket(
+    websocket: WebSocket,
+    code: str,
+    token: Optional[str] = None,
+    guest_id: Optional[str] = None,
+    name: Optional[str] = None,
+):
+    session = hub.get(code)
+    if not session:
+        await websocket.close(code=CLOSE_SESSION_GONE)
+        return
+    try:
+        user = await _socket_user(websocket, token)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+
+    is_host = user is not None and user.id == session.host_id
+    player = None
+    if not is_host:
+        if user is not None:
+            player = Player(key=f"u{user.id}", name=(name or user.email.split("@")[0])[:40], user_id=user.id)
+        elif guest_id and name and name.strip():
+            player = Player(key=f"g{guest_id[:64]}", name=name.strip()[:40])
+        else:
+            await websocket.close(code=4400)
+            return
+        if player.key not in session.players and session.full:
+            await websocket.close(code=4409)
+            return
+
+    await websocket.accept()
+    connection = Connection(websocket)
+    connection.start()
+    if is_host:
+        session.add_host(connection)
+    else:
+        player = session.join(player, connection)
+
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            if is_host:
+                await _host_command(session, message)
+            elif message.get("type") == "answer":
+                session.answer(player.key, message.get("index"), message.get("answer"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.disconnect(connection)
+        await connection.close()
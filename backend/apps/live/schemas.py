@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+
+class LiveSessionCreate(BaseModel):
+    generation_log_id: int
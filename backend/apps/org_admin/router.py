@@ -1,21 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime, timedelta
 import uuid
 
 from database import get_db
-from apps.auth.models import User, AuditLog
+from apps.auth.models import User
 from apps.admin.models import Organization, InviteToken, GlobalSetting
-from apps.generator.models import TokenUsage
+from apps.generator.models import TokenUsage, UsageDaily
 from apps.payments.models import UserSubscription
 from apps.auth.dependencies import require_org_admin
-from passlib.context import CryptContext
+from apps.auth.context import invalidate_request_context
+from services.audit import audit
+from services.passwords import hash_password_sync
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/org-admin", tags=["org-admin"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 # ── Schemas ────────────────────────────────────────────────────────────────────
@@ -94,13 +95,11 @@ def get_org_me(db: Session = Depends(get_db), admin: User = Depends(require_org_
         User.role.in_(["teacher", "org_admin"]),
     ).count()
 
-    # Sum tokens used this month by all org teachers
-    month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    tokens_this_month = db.query(func.sum(TokenUsage.tokens_used)).join(
-        User, User.id == TokenUsage.user_id
-    ).filter(
-        User.organization_id == org.id,
-        TokenUsage.created_at >= month_start,
+    # Sum tokens used this month by all org teachers (daily rollup)
+    month_start = datetime.utcnow().date().replace(day=1)
+    tokens_this_month = db.query(func.sum(UsageDaily.tokens)).filter(
+        UsageDaily.organization_id == org.id,
+        UsageDaily.day >= month_start,
     ).scalar() or 0
 
     return OrgStatsResponse(
@@ -119,7 +118,7 @@ def get_org_me(db: Session = Depends(get_db), admin: User = Depends(require_org_
 @router.get("/teachers", response_model=List[TeacherRow])
 def list_teachers(db: Session = Depends(get_db), admin: User = Depends(require_org_admin)):
     org = _get_org(admin, db)
-    teachers = db.query(User).filter(
+    teachers = db.query(User).options(joinedload(User.subscription)).filter(
         User.organization_id == org.id,
         User.role.in_(["teacher", "org_admin"]),
     ).order_by(User.id).all()
@@ -144,7 +143,7 @@ def create_teacher(
     teacher = User(
         email=req.email,
         full_name=req.full_name,
-        hashed_password=pwd_context.hash(req.password),
+        hashed_password=hash_password_sync(req.password),
         role="teacher",
         school=req.school,
         organization_id=org.id,
@@ -152,13 +151,10 @@ def create_teacher(
     )
     db.add(teacher)
     org.used_seats += 1
+    audit(db, "Org: Create Teacher", req.email, admin.id, "success")
     db.commit()
     db.refresh(teacher)
 
-    log = AuditLog(action="Org: Create Teacher", target=req.email, user_id=admin.id, log_type="success")
-    db.add(log)
-    db.commit()
-
     return _enrich(teacher)
 
 
@@ -173,12 +169,10 @@ def toggle_block(
     _assert_teacher_in_org(teacher, org.id)
 
     teacher.is_active = not teacher.is_active
-    db.commit()
-
     action = "Org: Unblock Teacher" if teacher.is_active else "Org: Block Teacher"
-    log = AuditLog(action=action, target=teacher.email, user_id=admin.id, log_type="warning")
-    db.add(log)
+    audit(db, action, teacher.email, admin.id, "warning")
     db.commit()
+    invalidate_request_context([teacher.id])
 
     return {"id": teacher.id, "is_active": teacher.is_active}
 
@@ -197,24 +191,23 @@ def delete_teacher(
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
 
     email = teacher.email
-    from apps.generator.models import TokenUsage, GenerationLog
+    from apps.generator.models import GenerationLog
     from apps.payments.models import UserSubscription, UserPayment
 
     try:
         db.query(TokenUsage).filter(TokenUsage.user_id == teacher_id).delete()
+        db.query(UsageDaily).filter(UsageDaily.user_id == teacher_id).delete()
         db.query(GenerationLog).filter(GenerationLog.user_id == teacher_id).delete()
         db.query(UserSubscription).filter(UserSubscription.user_id == teacher_id).delete()
         db.query(UserPayment).filter(UserPayment.user_id == teacher_id).delete()
         db.delete(teacher)
         org.used_seats = max(0, org.used_seats - 1)
+        audit(db, "Org: Delete Teacher", email, admin.id, "danger", critical=True)
         db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete teacher: {str(e)}")
-
-    log = AuditLog(action="Org: Delete Teacher", target=email, user_id=admin.id, log_type="danger")
-    db.add(log)
-    db.commit()
+    invalidate_request_context([teacher_id])
 
     return {"message": "Teacher deleted"}
 
@@ -235,9 +228,7 @@ def create_invite(
         max_uses=org.license_seats,
     )
     db.add(invite)
-
-    log = AuditLog(action="Org: Create Invite", target=org.name, user_id=admin.id, log_type="success")
-    db.add(log)
+    audit(db, "Org: Create Invite", org.name, admin.id, "success")
     db.commit()
     db.refresh(invite)
 
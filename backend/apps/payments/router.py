@@ -6,6 +6,7 @@ import os
 
 from database import get_db
 from apps.auth.dependencies import get_current_user
+from apps.auth.context import invalidate_request_context
 from apps.auth.models import User
 from apps.payments.models import UserPayment, UserSubscription
 from apps.payments.schemas import (
@@ -86,6 +87,7 @@ def _activate_subscription(db: Session, user_id: int, plan: str, payment_id: int
         user.tokens_reset_at = datetime.utcnow()
 
     db.commit()
+    invalidate_request_context([user_id])
 
 
 # ── Initiate payment ───────────────────────────────────────────
@@ -168,6 +170,7 @@ def get_my_subscription(
         if not is_active and current_user.tokens_limit and current_user.tokens_limit > PLAN_TOKEN_LIMITS["free"]:
             current_user.tokens_limit = PLAN_TOKEN_LIMITS["free"]
             db.commit()
+            invalidate_request_context([current_user.id])
 
     tokens_limit = current_user.tokens_limit or PLAN_TOKEN_LIMITS["free"]
     tokens_used = current_user.tokens_used_this_month or 0
@@ -386,8 +389,8 @@ def get_token_stats(
 
     import time
     from services.gemini_service import key_manager
-    from apps.generator.models import TokenUsage
-    from sqlalchemy import func
+    from apps.generator.models import UsageDaily
+    from sqlalchemy import func, text
 
     now = time.time()
     keys_status = []
@@ -399,25 +402,24 @@ def get_token_stats(
             "cooldown_seconds_left": max(0, int(until - now)),
         })
 
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    active_today = db.query(func.count(func.distinct(TokenUsage.user_id))).filter(
-        TokenUsage.created_at >= today
+    active_today = db.query(func.count(func.distinct(UsageDaily.user_id))).filter(
+        UsageDaily.day == datetime.utcnow().date()
     ).scalar() or 0
 
     top_users = db.query(
         User.email, User.tokens_used_this_month, User.tokens_limit
     ).order_by(User.tokens_used_this_month.desc()).limit(10).all()
 
-    plan_stats = db.execute(
+    plan_stats = db.execute(text(
         """
         SELECT COALESCE(us.plan, 'free') as plan,
                COUNT(DISTINCT u.id) as users,
                COALESCE(SUM(u.tokens_used_this_month), 0) as total_tokens
         FROM users u
-        LEFT JOIN user_subscriptions us ON us.user_id = u.id AND us.expires_at > NOW()
+        LEFT JOIN user_subscriptions us ON us.user_id = u.id AND us.expires_at > :now
         GROUP BY COALESCE(us.plan, 'free')
         """
-    ).fetchall()
+    ), {"now": datetime.utcnow()}).fetchall()
 
     return {
         "gemini_keys": keys_status,
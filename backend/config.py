@@ -38,3 +38,84 @@ DEFAULT_TOKEN_LIMIT = get_env_int("DEFAULT_TOKEN_LIMIT", 30000)
 PLAN_FREE_TOKEN_LIMIT   = get_env_int("PLAN_FREE_TOKEN_LIMIT",   30000)
 PLAN_PRO_TOKEN_LIMIT    = get_env_int("PLAN_PRO_TOKEN_LIMIT",    300000)
 PLAN_SCHOOL_TOKEN_LIMIT = get_env_int("PLAN_SCHOOL_TOKEN_LIMIT", 1500000)
+
+# GenerationLog payloads at or above this size (bytes of JSON) are stored zstd-compressed
+GENERATION_COMPRESS_THRESHOLD = get_env_int("GENERATION_COMPRESS_THRESHOLD", 4096)
+
+# Write generation usage/history through a batched background writer instead of inline
+GENERATION_WRITE_BUFFER = os.getenv("GENERATION_WRITE_BUFFER", "false").lower() == "true"
+
+# Write non-critical admin audit events through a batched background writer
+AUDIT_BUFFER = os.getenv("AUDIT_BUFFER", "true").lower() == "true"
+AUDIT_BUFFER_MAX_QUEUE = get_env_int("AUDIT_BUFFER_MAX_QUEUE", 10000)
+AUDIT_BUFFER_FLUSH_MS = get_env_int("AUDIT_BUFFER_FLUSH_MS", 1000)
+
+# How long the auth/plan context of the AI routes is cached per worker (seconds).
+# Invalidation after a change only reaches the worker that made it; other workers
+# serve the old role/plan/org key until this expires.
+AUTH_CONTEXT_TTL_SECONDS = get_env_int("AUTH_CONTEXT_TTL_SECONDS", 30)
+
+# Import OpenAI/Gemini SDKs in a background task at startup instead of on the first AI request
+AI_SDK_WARMUP = os.getenv("AI_SDK_WARMUP", "true").lower() == "true"
+
+# Per-worker cache for /admin/organizations/{id}/stats (seconds, 0 = off)
+ORG_STATS_CACHE_SECONDS = get_env_int("ORG_STATS_CACHE_SECONDS", 30)
+
+# Per-worker cache for leaderboard top-N lists (seconds, 0 = off) — smartboards poll them
+LEADERBOARD_CACHE_SECONDS = get_env_int("LEADERBOARD_CACHE_SECONDS", 10)
+
+# Monthly partitions of token_usage / generation_logs (PostgreSQL): months created ahead,
+# months kept before archiving to PARTITION_ARCHIVE_DIR (0 = keep forever)
+PARTITION_MONTHS_AHEAD = get_env_int("PARTITION_MONTHS_AHEAD", 3)
+PARTITION_RETENTION_MONTHS = get_env_int("PARTITION_RETENTION_MONTHS", 0)
+PARTITION_ARCHIVE_DIR = os.getenv("PARTITION_ARCHIVE_DIR", "archive")
+
+# Bulk admin actions: selections above BULK_SYNC_LIMIT users run as a background job,
+# BULK_CHUNK_SIZE users per statement/transaction
+BULK_SYNC_LIMIT = get_env_int("BULK_SYNC_LIMIT", 500)
+BULK_CHUNK_SIZE = get_env_int("BULK_CHUNK_SIZE", 500)
+
+# Processes used for bcrypt hashing off the request/event-loop threads
+PASSWORD_HASH_WORKERS = get_env_int("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+# Hash/verify calls allowed in flight (running + queued) before auth answers 503
+PASSWORD_HASH_MAX_PENDING = get_env_int("PASSWORD_HASH_MAX_PENDING", 64)
+# bcrypt cost; stored hashes with another cost are re-hashed on the next login
+PASSWORD_BCRYPT_ROUNDS = get_env_int("PASSWORD_BCRYPT_ROUNDS", 12)
+
+# CSV teacher import: rows per existence check / hashing round / INSERT batch
+IMPORT_BATCH_SIZE = get_env_int("IMPORT_BATCH_SIZE", 200)
+
+# Variants of one /generate/batch request generated at the same time (fewer while Gemini
+# keys are in cooldown, see apps.generator.batch_utils.batch_concurrency)
+BATCH_CONCURRENCY = get_env_int("BATCH_CONCURRENCY", 4)
+
+# Events accepted by one /activity/complete-batch request (end-of-game submissions)
+ACTIVITY_BATCH_MAX_EVENTS = get_env_int("ACTIVITY_BATCH_MAX_EVENTS", 500)
+
+# Per-worker cache of the shop / announcement / template catalogs (seconds); the writing
+# worker invalidates at once, the others within this window
+CATALOG_CACHE_SECONDS = get_env_int("CATALOG_CACHE_SECONDS", 300)
+
+# Material uploads: text extraction processes and the per-file parse timeout (seconds)
+MATERIAL_EXTRACT_WORKERS = get_env_int("MATERIAL_EXTRACT_WORKERS", 2)
+MATERIAL_EXTRACT_TIMEOUT_SECONDS = get_env_int("MATERIAL_EXTRACT_TIMEOUT_SECONDS", 20)
+
+# Material index: characters of a file that are extracted and indexed, chunk size (characters),
+# and the material context of one generation — at most this many tokens, from the best chunks
+MATERIAL_INDEX_MAX_CHARS = get_env_int("MATERIAL_INDEX_MAX_CHARS", 200000)
+MATERIAL_CHUNK_CHARS = get_env_int("MATERIAL_CHUNK_CHARS", 800)
+MATERIAL_CONTEXT_TOKENS = get_env_int("MATERIAL_CONTEXT_TOKENS", 1500)
+MATERIAL_CONTEXT_CHUNKS = get_env_int("MATERIAL_CONTEXT_CHUNKS", 6)
+
+# Material digests: characters of the text summarized (once per material), and the most
+# characters of a rendered digest sent to a generation
+MATERIAL_DIGEST_INPUT_CHARS = get_env_int("MATERIAL_DIGEST_INPUT_CHARS", 40000)
+MATERIAL_DIGEST_MAX_CHARS = get_env_int("MATERIAL_DIGEST_MAX_CHARS", 3000)
+# Hours before a material whose digest came back unusable is tried (and charged) again
+MATERIAL_DIGEST_RETRY_HOURS = get_env_int("MATERIAL_DIGEST_RETRY_HOURS", 24)
+
+# Live classroom sessions: players per session, messages queued per socket before a slow
+# device is dropped, and how long an untouched session is kept (seconds)
+LIVE_MAX_PLAYERS = get_env_int("LIVE_MAX_PLAYERS", 100)
+LIVE_SEND_QUEUE = get_env_int("LIVE_SEND_QUEUE", 64)
+LIVE_SESSION_IDLE_SECONDS = get_env_int("LIVE_SESSION_IDLE_SECONDS", 3 * 3600)
@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from config import DATABASE_URL
 
 # Adjust for Docker vs Localhost if needed, but usually DATABASE_URL handles it.
@@ -16,3 +17,59 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ── Async layer (AI routes) ─────────────────────────────────────
+# Sync engine stays for admin CRUD; async routes must not run blocking
+# queries on the event loop, so they use this one.
+
+_ASYNC_DRIVERS = (
+    ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+    ("postgresql://", "postgresql+asyncpg://"),
+    ("postgres://", "postgresql+asyncpg://"),
+    ("sqlite://", "sqlite+aiosqlite://"),
+)
+
+
+def to_async_url(url: str) -> str:
+    for prefix, async_prefix in _ASYNC_DRIVERS:
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = to_async_url(SQLALCHEMY_DATABASE_URL)
+
+# Created on first use so scripts and sync-only code never load the async driver
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True)
+        # expire_on_commit=False: attributes stay readable after commit without a lazy reload
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    return _async_engine
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    get_async_engine()
+    return _AsyncSessionLocal
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+# ── Upserts ─────────────────────────────────────────────────────
+
+def dialect_insert(bind, table):
+    """INSERT with .on_conflict_do_update() for the bound dialect (PostgreSQL in prod, SQLite in tests)."""
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
@@ -4,10 +4,10 @@ from fastapi.responses import JSONResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from rate_limiter import limiter
-import sentry_sdk
+import asyncio
+import logging
 import os
-from config import DATABASE_URL
-from database import engine, Base
+from contextlib import asynccontextmanager
 
 # Import all models to ensure they are registered with SQLAlchemy
 from apps.auth.models import User, AuditLog, PasswordResetToken
@@ -27,59 +27,65 @@ from apps.library.materials_router import router as materials_router
 from apps.admin.router import router as admin_router
 from apps.payments.router import router as payments_router
 from apps.org_admin.router import router as org_admin_router
-
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-# Schema repair (for existing databases)
-from sqlalchemy import text
-def repair_db():
-    with engine.connect() as conn:
-        # Table, Column, Type
-        new_cols = [
-            ("users", "avatar_url", "VARCHAR"),
-            ("users", "tokens_used_this_month", "INTEGER DEFAULT 0"),
-            ("users", "tokens_limit", "INTEGER DEFAULT 30000"),
-            ("users", "tokens_reset_at", "TIMESTAMP"),
-            ("users", "onboarding_completed", "BOOLEAN DEFAULT FALSE"),
-            ("users", "phone", "VARCHAR"),
-            ("users", "school", "VARCHAR"),
-            ("generation_logs", "is_favorite", "INTEGER DEFAULT 0"),
-        ]
-        for table, col, ctype in new_cols:
-            try:
-                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {ctype}"))
-                conn.commit()
-            except Exception:
-                pass # Already exists or other error
-
-        # Performance indexes
-        indexes = [
-            "CREATE INDEX IF NOT EXISTS idx_generation_logs_user_id ON generation_logs(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_generation_logs_created_at ON generation_logs(created_at)",
-            "CREATE INDEX IF NOT EXISTS idx_token_usage_user_id ON token_usage(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_token_usage_created_at ON token_usage(created_at)",
-            "CREATE INDEX IF NOT EXISTS idx_user_materials_user_id ON user_materials(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs(timestamp)",
-        ]
-        for idx_sql in indexes:
-            try:
-                conn.execute(text(idx_sql))
-                conn.commit()
-            except Exception:
-                pass
-
-repair_db()
+from apps.live.router import router as live_router
+from apps.generator.recorder import generation_buffer
+from services.audit import audit_writer
+from services.passwords import PasswordServiceBusy, shutdown_pool as shutdown_password_pool, warm_up as warm_up_password_pool
+from apps.library.extraction import shutdown_pool as shutdown_extraction_pool
+from services import openai_service, gemini_service
+from services.partitions import run_maintenance as run_partition_maintenance
+from database import engine
+from config import AI_SDK_WARMUP, DATABASE_URL
+
+logger = logging.getLogger(__name__)
 
 # Sentry Initialization
 sentry_dsn = os.getenv("SENTRY_DSN", "")
 if sentry_dsn:
+    import sentry_sdk  # only pay for the import when Sentry is configured
     sentry_sdk.init(
         dsn=sentry_dsn,
         traces_sample_rate=0.1,
     )
 
-app = FastAPI(title="ClassPlay API")
+def _warm_up_ai_sdks():
+    # Import the AI SDKs off the request path so the worker accepts traffic right away
+    for service in (openai_service, gemini_service):
+        try:
+            service.warm_up()
+        except Exception as e:
+            logger.warning(f"{service.__name__} warm-up failed, will retry on first use: {e}")
+
+
+async def _partition_maintenance_loop():
+    # Upcoming monthly partitions + retention; an advisory lock keeps it to one worker at a time
+    while True:
+        try:
+            await asyncio.to_thread(run_partition_maintenance, engine)
+        except Exception:
+            logger.exception("Partition maintenance failed")
+        await asyncio.sleep(24 * 3600)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await generation_buffer.start()  # no-op unless GENERATION_WRITE_BUFFER=true
+    await audit_writer.start()
+    password_pool = asyncio.create_task(warm_up_password_pool())
+    warm_up = asyncio.create_task(asyncio.to_thread(_warm_up_ai_sdks)) if AI_SDK_WARMUP else None
+    maintenance = asyncio.create_task(_partition_maintenance_loop())
+    yield
+    maintenance.cancel()
+    await password_pool
+    if warm_up:
+        await warm_up
+    await generation_buffer.stop()
+    await audit_writer.stop()
+    shutdown_password_pool()
+    shutdown_extraction_pool()
+
+
+app = FastAPI(title="ClassPlay API", lifespan=lifespan)
 
 app.state.limiter = limiter
 
@@ -94,6 +100,17 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
         }
     )
 
+@app.exception_handler(PasswordServiceBusy)
+async def password_service_busy_handler(request: Request, exc: PasswordServiceBusy):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "2"},
+        content={
+            "error": "auth_busy",
+            "message": "Too many sign-ins right now. Please try again in a few seconds.",
+        }
+    )
+
 origins = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
@@ -117,6 +134,7 @@ app.include_router(materials_router, prefix="/api/v1")
 app.include_router(admin_router, prefix="/api/v1")
 app.include_router(payments_router, prefix="/api/v1")
 app.include_router(org_admin_router, prefix="/api/v1")
+app.include_router(live_router, prefix="/api/v1")
 
 
 @app.get("/")
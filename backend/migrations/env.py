@@ -0,0 +1,73 @@
+"""
+Alembic environment. Schema changes go through versioned migrations here;
+the app itself never creates or alters tables.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from config import DATABASE_URL
+from database import Base
+# Every model module must be imported so autogenerate sees all tables
+import apps.auth.models
+import apps.admin.models
+import apps.classes.models
+import apps.gamification.models
+import apps.generator.models
+import apps.library.models
+import apps.payments.models
+
+from services.partitions import PARTITIONED_TABLES, parse_partition_month
+
+# Objects managed by raw SQL in the revisions, not declared on the models
+_RAW_SQL_INDEX_PREFIXES = ("ftx_", "trgm_")
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "index" and name and name.startswith(_RAW_SQL_INDEX_PREFIXES):
+        return False
+    if type_ == "table" and reflected and compare_to is None and name:
+        # Monthly partitions of token_usage / generation_logs (revision 0006)
+        if any(name == f"{t}_default" or parse_partition_month(t, name) for t in PARTITIONED_TABLES):
+            return False
+    return True
+
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        include_object=include_object,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connectable = create_engine(DATABASE_URL)
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            transaction_per_migration=True,
+            include_object=include_object,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,64 @@
+"""
+Shared helpers for migration scripts.
+
+Revisions replay on every new database long after they were written, so
+nothing here (or in a revision) imports application code — config,
+services, models — which keeps changing. Helpers are frozen once a
+revision uses them: change behaviour by adding a new helper, not by
+editing an existing one.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def create_index_concurrently(name: str, table: str, columns: str, unique: bool = False, using: str = None) -> None:
+    """CREATE INDEX [CONCURRENTLY] IF NOT EXISTS — PostgreSQL builds it without blocking writes."""
+    create = "CREATE UNIQUE INDEX" if unique else "CREATE INDEX"
+    method = f" USING {using}" if using else ""
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            # A failed concurrent build leaves an INVALID index that IF NOT EXISTS would skip
+            op.execute(sa.text(
+                f"DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                f"WHERE c.relname = '{name}' AND NOT i.indisvalid) THEN DROP INDEX {name}; END IF; END $$"
+            ))
+            op.execute(f"{create} CONCURRENTLY IF NOT EXISTS {name} ON {table}{method} ({columns})")
+    else:
+        op.execute(f"{create} IF NOT EXISTS {name} ON {table}{method} ({columns})")
+
+
+def is_partitioned(table: str) -> bool:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return False
+    return bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :t"
+    ), {"t": table}).first() is not None
+
+
+def list_partitions(table: str) -> list[str]:
+    return list(op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :t ORDER BY c.relname"
+    ), {"t": table}).scalars())
+
+
+def create_partitioned_index(name: str, table: str, columns: str, using: str = None) -> None:
+    """
+    Index on a partitioned PostgreSQL table without blocking writes: an invalid
+    index ON ONLY the parent, each partition's index built CONCURRENTLY and
+    attached. Partitions created later get the index automatically.
+    """
+    method = f" USING {using}" if using else ""
+    op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table}{method} ({columns})")
+    attached = {row[0] for row in op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :name"
+    ), {"name": name})}
+    for partition in list_partitions(table):
+        part_index = f"{partition}_{name}"[:63]
+        if part_index in attached:
+            continue
+        create_index_concurrently(part_index, partition, columns, using=using)
+        op.execute(f"ALTER INDEX {name} ATTACH PARTITION {part_index}")
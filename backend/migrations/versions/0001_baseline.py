@@ -0,0 +1,450 @@
+"""baseline: schema as of the last create_all() deployment
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 15:09:41.737838
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing deployments already have these tables (created by the old
+    # create_all at startup) — only create what is missing.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'global_settings' not in existing:
+        op.create_table('global_settings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(), nullable=True),
+        sa.Column('value', sa.String(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_global_settings_id'), 'global_settings', ['id'], unique=False)
+        op.create_index(op.f('ix_global_settings_key'), 'global_settings', ['key'], unique=True)
+
+    if 'organizations' not in existing:
+        op.create_table('organizations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('contact_person', sa.String(), nullable=True),
+        sa.Column('license_seats', sa.Integer(), nullable=True),
+        sa.Column('used_seats', sa.Integer(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('custom_gemini_key', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_organizations_id'), 'organizations', ['id'], unique=False)
+        op.create_index(op.f('ix_organizations_name'), 'organizations', ['name'], unique=False)
+
+    if 'shop_items' not in existing:
+        op.create_table('shop_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.Integer(), nullable=True),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('image_url', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_shop_items_id'), 'shop_items', ['id'], unique=False)
+
+    if 'invite_tokens' not in existing:
+        op.create_table('invite_tokens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(), nullable=True),
+        sa.Column('org_id', sa.Integer(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('max_uses', sa.Integer(), nullable=True),
+        sa.Column('uses_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('is_active', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['org_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_invite_tokens_id'), 'invite_tokens', ['id'], unique=False)
+        op.create_index(op.f('ix_invite_tokens_token'), 'invite_tokens', ['token'], unique=True)
+
+    if 'payments' not in existing:
+        op.create_table('payments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('organization_id', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.Integer(), nullable=True),
+        sa.Column('currency', sa.String(), nullable=True),
+        sa.Column('date', sa.DateTime(), nullable=True),
+        sa.Column('method', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('period', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_payments_id'), 'payments', ['id'], unique=False)
+
+    if 'users' not in existing:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('full_name', sa.String(), nullable=True),
+        sa.Column('avatar_url', sa.String(), nullable=True),
+        sa.Column('role', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('phone', sa.String(), nullable=True),
+        sa.Column('school', sa.String(), nullable=True),
+        sa.Column('onboarding_completed', sa.Boolean(), nullable=True),
+        sa.Column('tokens_used_this_month', sa.Integer(), nullable=True),
+        sa.Column('tokens_limit', sa.Integer(), nullable=True),
+        sa.Column('tokens_reset_at', sa.DateTime(), nullable=True),
+        sa.Column('organization_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+        op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+
+    if 'audit_logs' not in existing:
+        op.create_table('audit_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('action', sa.String(), nullable=True),
+        sa.Column('target', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('log_type', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_audit_logs_id'), 'audit_logs', ['id'], unique=False)
+
+    if 'class_groups' not in existing:
+        op.create_table('class_groups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('grade', sa.String(), nullable=True),
+        sa.Column('student_count', sa.Integer(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('teacher_id', sa.Integer(), nullable=True),
+        sa.Column('organization_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_class_groups_id'), 'class_groups', ['id'], unique=False)
+        op.create_index(op.f('ix_class_groups_name'), 'class_groups', ['name'], unique=False)
+        op.create_index(op.f('ix_class_groups_organization_id'), 'class_groups', ['organization_id'], unique=False)
+        op.create_index(op.f('ix_class_groups_teacher_id'), 'class_groups', ['teacher_id'], unique=False)
+
+    if 'coin_transactions' not in existing:
+        op.create_table('coin_transactions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.Integer(), nullable=True),
+        sa.Column('transaction_type', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_coin_transactions_id'), 'coin_transactions', ['id'], unique=False)
+
+    if 'daily_progress' not in existing:
+        op.create_table('daily_progress',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('date', sa.DateTime(), nullable=True),
+        sa.Column('total_xp_today', sa.Integer(), nullable=True),
+        sa.Column('total_coins_today', sa.Integer(), nullable=True),
+        sa.Column('activity_history', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_daily_progress_date'), 'daily_progress', ['date'], unique=False)
+        op.create_index(op.f('ix_daily_progress_id'), 'daily_progress', ['id'], unique=False)
+
+    if 'generated_books' not in existing:
+        op.create_table('generated_books',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('age_group', sa.String(), nullable=True),
+        sa.Column('genre', sa.String(), nullable=True),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.Column('cover_emoji', sa.String(), nullable=True),
+        sa.Column('pages', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_generated_books_id'), 'generated_books', ['id'], unique=False)
+
+    if 'generation_logs' not in existing:
+        op.create_table('generation_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('generator_type', sa.String(), nullable=True),
+        sa.Column('topic', sa.String(), nullable=True),
+        sa.Column('content', sa.String(), nullable=True),
+        sa.Column('content_json', sa.JSON(none_as_null=True).with_variant(postgresql.JSONB(none_as_null=True, astext_type=sa.Text()), 'postgresql'), nullable=True),
+        sa.Column('content_zstd', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('is_favorite', sa.Integer(), nullable=True),
+        sa.Column('item_count', sa.Integer(), nullable=True),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.Column('difficulty', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_generation_logs_id'), 'generation_logs', ['id'], unique=False)
+        op.create_index(op.f('ix_generation_logs_user_id'), 'generation_logs', ['user_id'], unique=False)
+
+    if 'password_reset_tokens' not in existing:
+        op.create_table('password_reset_tokens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('is_used', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_password_reset_tokens_id'), 'password_reset_tokens', ['id'], unique=False)
+        op.create_index(op.f('ix_password_reset_tokens_token'), 'password_reset_tokens', ['token'], unique=True)
+
+    if 'purchases' not in existing:
+        op.create_table('purchases',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('item_id', sa.Integer(), nullable=True),
+        sa.Column('price_paid', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['item_id'], ['shop_items.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_purchases_id'), 'purchases', ['id'], unique=False)
+
+    if 'saved_resources' not in existing:
+        op.create_table('saved_resources',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_saved_resources_id'), 'saved_resources', ['id'], unique=False)
+
+    if 'season_stats' not in existing:
+        op.create_table('season_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('season_name', sa.String(), nullable=True),
+        sa.Column('total_xp', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_season_stats_id'), 'season_stats', ['id'], unique=False)
+
+    if 'student_profiles' not in existing:
+        op.create_table('student_profiles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('xp', sa.Integer(), nullable=True),
+        sa.Column('coins', sa.Integer(), nullable=True),
+        sa.Column('level', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_student_profiles_id'), 'student_profiles', ['id'], unique=False)
+        op.create_index(op.f('ix_student_profiles_user_id'), 'student_profiles', ['user_id'], unique=True)
+
+    if 'templates' not in existing:
+        op.create_table('templates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('feature', sa.String(), nullable=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('is_system', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_templates_id'), 'templates', ['id'], unique=False)
+
+    if 'token_usage' not in existing:
+        op.create_table('token_usage',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('feature_name', sa.String(), nullable=True),
+        sa.Column('tokens_total', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_token_usage_id'), 'token_usage', ['id'], unique=False)
+
+    if 'user_materials' not in existing:
+        op.create_table('user_materials',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('file_type', sa.String(), nullable=False),
+        sa.Column('extracted_text', sa.Text(), nullable=False),
+        sa.Column('char_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_user_materials_id'), 'user_materials', ['id'], unique=False)
+        op.create_index(op.f('ix_user_materials_user_id'), 'user_materials', ['user_id'], unique=False)
+
+    if 'user_payments' not in existing:
+        op.create_table('user_payments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('plan', sa.String(), nullable=False),
+        sa.Column('provider', sa.String(), nullable=False),
+        sa.Column('amount_tiyin', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('provider_transaction_id', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_user_payments_id'), 'user_payments', ['id'], unique=False)
+        op.create_index(op.f('ix_user_payments_provider_transaction_id'), 'user_payments', ['provider_transaction_id'], unique=False)
+
+    if 'xp_transactions' not in existing:
+        op.create_table('xp_transactions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.Integer(), nullable=True),
+        sa.Column('activity_type', sa.String(), nullable=True),
+        sa.Column('activity_id', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_xp_transactions_id'), 'xp_transactions', ['id'], unique=False)
+
+    if 'user_subscriptions' not in existing:
+        op.create_table('user_subscriptions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('plan', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('activated_at', sa.DateTime(), nullable=True),
+        sa.Column('payment_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['payment_id'], ['user_payments.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id')
+        )
+        op.create_index(op.f('ix_user_subscriptions_id'), 'user_subscriptions', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_subscriptions_id'), table_name='user_subscriptions')
+    op.drop_table('user_subscriptions')
+
+    op.drop_index(op.f('ix_xp_transactions_id'), table_name='xp_transactions')
+    op.drop_table('xp_transactions')
+
+    op.drop_index(op.f('ix_user_payments_provider_transaction_id'), table_name='user_payments')
+    op.drop_index(op.f('ix_user_payments_id'), table_name='user_payments')
+    op.drop_table('user_payments')
+
+    op.drop_index(op.f('ix_user_materials_user_id'), table_name='user_materials')
+    op.drop_index(op.f('ix_user_materials_id'), table_name='user_materials')
+    op.drop_table('user_materials')
+
+    op.drop_index(op.f('ix_token_usage_id'), table_name='token_usage')
+    op.drop_table('token_usage')
+
+    op.drop_index(op.f('ix_templates_id'), table_name='templates')
+    op.drop_table('templates')
+
+    op.drop_index(op.f('ix_student_profiles_user_id'), table_name='student_profiles')
+    op.drop_index(op.f('ix_student_profiles_id'), table_name='student_profiles')
+    op.drop_table('student_profiles')
+
+    op.drop_index(op.f('ix_season_stats_id'), table_name='season_stats')
+    op.drop_table('season_stats')
+
+    op.drop_index(op.f('ix_saved_resources_id'), table_name='saved_resources')
+    op.drop_table('saved_resources')
+
+    op.drop_index(op.f('ix_purchases_id'), table_name='purchases')
+    op.drop_table('purchases')
+
+    op.drop_index(op.f('ix_password_reset_tokens_token'), table_name='password_reset_tokens')
+    op.drop_index(op.f('ix_password_reset_tokens_id'), table_name='password_reset_tokens')
+    op.drop_table('password_reset_tokens')
+
+    op.drop_index(op.f('ix_generation_logs_user_id'), table_name='generation_logs')
+    op.drop_index(op.f('ix_generation_logs_id'), table_name='generation_logs')
+    op.drop_table('generation_logs')
+
+    op.drop_index(op.f('ix_generated_books_id'), table_name='generated_books')
+    op.drop_table('generated_books')
+
+    op.drop_index(op.f('ix_daily_progress_id'), table_name='daily_progress')
+    op.drop_index(op.f('ix_daily_progress_date'), table_name='daily_progress')
+    op.drop_table('daily_progress')
+
+    op.drop_index(op.f('ix_coin_transactions_id'), table_name='coin_transactions')
+    op.drop_table('coin_transactions')
+
+    op.drop_index(op.f('ix_class_groups_teacher_id'), table_name='class_groups')
+    op.drop_index(op.f('ix_class_groups_organization_id'), table_name='class_groups')
+    op.drop_index(op.f('ix_class_groups_name'), table_name='class_groups')
+    op.drop_index(op.f('ix_class_groups_id'), table_name='class_groups')
+    op.drop_table('class_groups')
+
+    op.drop_index(op.f('ix_audit_logs_id'), table_name='audit_logs')
+    op.drop_table('audit_logs')
+
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+
+    op.drop_index(op.f('ix_payments_id'), table_name='payments')
+    op.drop_table('payments')
+
+    op.drop_index(op.f('ix_invite_tokens_token'), table_name='invite_tokens')
+    op.drop_index(op.f('ix_invite_tokens_id'), table_name='invite_tokens')
+    op.drop_table('invite_tokens')
+
+    op.drop_index(op.f('ix_shop_items_id'), table_name='shop_items')
+    op.drop_table('shop_items')
+
+    op.drop_index(op.f('ix_organizations_name'), table_name='organizations')
+    op.drop_index(op.f('ix_organizations_id'), table_name='organizations')
+    op.drop_table('organizations')
+
+    op.drop_index(op.f('ix_global_settings_key'), table_name='global_settings')
+    op.drop_index(op.f('ix_global_settings_id'), table_name='global_settings')
+    op.drop_table('global_settings')
@@ -0,0 +1,77 @@
+"""legacy schema repair: columns repair_db()/fix_db.py used to add, tokens_limit default
+
+Databases created by older releases may lack columns that were added later
+by ALTER TABLE at startup. Adds whatever is missing and sets the 30k
+tokens_limit default.
+
+Schema only: the plan limits of migrations/token_limits_fix.sql overwrite
+limits set through the admin and org-admin endpoints, so that script stays
+a one-off run by hand (psql -f), as it always was.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LEGACY_COLUMNS = {
+    'users': [
+        sa.Column('avatar_url', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), server_default=sa.true(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.current_timestamp(), nullable=True),
+        sa.Column('phone', sa.String(), nullable=True),
+        sa.Column('school', sa.String(), nullable=True),
+        sa.Column('onboarding_completed', sa.Boolean(), server_default=sa.false(), nullable=True),
+        sa.Column('tokens_used_this_month', sa.Integer(), server_default='0', nullable=True),
+        sa.Column('tokens_limit', sa.Integer(), server_default='30000', nullable=True),
+        sa.Column('tokens_reset_at', sa.DateTime(), nullable=True),
+        sa.Column('organization_id', sa.Integer(), sa.ForeignKey('organizations.id'), nullable=True),
+    ],
+    'class_groups': [
+        sa.Column('teacher_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('organization_id', sa.Integer(), sa.ForeignKey('organizations.id'), nullable=True),
+    ],
+    'organizations': [
+        sa.Column('custom_gemini_key', sa.String(), nullable=True),
+    ],
+    'generation_logs': [
+        sa.Column('is_favorite', sa.Integer(), server_default='0', nullable=True),
+        sa.Column('content_json', sa.JSON(none_as_null=True).with_variant(postgresql.JSONB(none_as_null=True, astext_type=sa.Text()), 'postgresql'), nullable=True),
+        sa.Column('content_zstd', sa.LargeBinary(), nullable=True),
+        sa.Column('item_count', sa.Integer(), nullable=True),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.Column('difficulty', sa.String(), nullable=True),
+    ],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table, columns in LEGACY_COLUMNS.items():
+        existing = {c['name'] for c in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+
+    if bind.dialect.name == 'postgresql':
+        op.execute("ALTER TABLE users ALTER COLUMN tokens_limit SET DEFAULT 30000")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Columns and the default belong to the baseline schema.
+    pass
@@ -0,0 +1,47 @@
+"""performance indexes (formerly created by repair_db at startup)
+
+Built with CREATE INDEX CONCURRENTLY on PostgreSQL so writes to the hot
+tables are not blocked while the index builds.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 15:25:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.helpers import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (name, table, column). generation_logs.user_id and user_materials.user_id
+# are covered by the model's ix_* indexes (or by idx_* on older databases).
+INDEXES = [
+    ('idx_generation_logs_created_at', 'generation_logs', 'created_at'),
+    ('idx_token_usage_user_id', 'token_usage', 'user_id'),
+    ('idx_token_usage_created_at', 'token_usage', 'created_at'),
+    ('idx_audit_logs_timestamp', 'audit_logs', 'timestamp'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, column in INDEXES:
+        create_index_concurrently(name, table, column)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Already zstd-compressed — keep TOAST from trying to compress it again
+        op.execute("ALTER TABLE generation_logs ALTER COLUMN content_zstd SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
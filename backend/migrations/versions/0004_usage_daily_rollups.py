@@ -0,0 +1,56 @@
+"""usage_daily rollups and users.last_active_at
+
+usage_daily is kept up to date by the generation write path; existing history
+is loaded with scripts/backfill_usage_daily.py after the upgrade.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 15:14:23.028116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # Databases first built by create_all() may already have these
+    if 'usage_daily' not in inspector.get_table_names():
+        op.create_table('usage_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('organization_id', sa.Integer(), nullable=True),
+        sa.Column('feature', sa.String(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('generations', sa.Integer(), nullable=False),
+        sa.Column('tokens', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'feature', 'day', name='uq_usage_daily_user_feature_day')
+        )
+        op.create_index('idx_usage_daily_day', 'usage_daily', ['day'], unique=False)
+        op.create_index('idx_usage_daily_org_day', 'usage_daily', ['organization_id', 'day'], unique=False)
+
+    # Nullable, no default — metadata-only on PostgreSQL
+    if 'last_active_at' not in {c['name'] for c in inspector.get_columns('users')}:
+        op.add_column('users', sa.Column('last_active_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('last_active_at')
+
+    op.drop_index('idx_usage_daily_org_day', table_name='usage_daily')
+    op.drop_index('idx_usage_daily_day', table_name='usage_daily')
+    op.drop_table('usage_daily')
@@ -0,0 +1,61 @@
+"""leaderboard scopes and indexes, season_stats upsert key
+
+student_profiles gets class/org scope columns (org backfilled from users)
+and (scope, xp) indexes; season_stats gets a unique (user_id, season_name)
+key for the incremental weekly/season upsert.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 16:02:11.514086
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('idx_student_profiles_xp', 'student_profiles', 'xp, user_id, level', False),
+    ('idx_student_profiles_class_xp', 'student_profiles', 'class_group_id, xp', False),
+    ('idx_student_profiles_org_xp', 'student_profiles', 'organization_id, xp', False),
+    ('uq_season_stats_user_season', 'season_stats', 'user_id, season_name', True),
+    ('idx_season_stats_season_xp', 'season_stats', 'season_name, total_xp', False),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('student_profiles')}
+    if 'class_group_id' not in existing:
+        # batch: SQLite can't ALTER in a foreign key (plain ALTER TABLE on PostgreSQL)
+        with op.batch_alter_table('student_profiles', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('class_group_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_student_profiles_class_group_id', 'class_groups', ['class_group_id'], ['id'])
+    if 'organization_id' not in existing:
+        op.add_column('student_profiles', sa.Column('organization_id', sa.Integer(), nullable=True))
+        op.execute(
+            "UPDATE student_profiles SET organization_id = "
+            "(SELECT organization_id FROM users WHERE users.id = student_profiles.user_id)"
+        )
+
+    for name, table, columns, unique in INDEXES:
+        create_index_concurrently(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _, _, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    with op.batch_alter_table('student_profiles', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_student_profiles_class_group_id', type_='foreignkey')
+        batch_op.drop_column('organization_id')
+        batch_op.drop_column('class_group_id')
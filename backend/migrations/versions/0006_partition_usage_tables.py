@@ -0,0 +1,85 @@
+"""created_at NOT NULL on token_usage and generation_logs, ahead of monthly partitions
+
+created_at is the partition key of both tables. Legacy rows without one get
+the migration time, in batches of their own transactions, and the column
+becomes NOT NULL. On PostgreSQL the NOT NULL is proven by a NOT VALID CHECK
+validated outside the migration transaction, so no step blocks writes for
+longer than a catalog update.
+
+The partitioning itself copies every row, so it is not part of `upgrade
+head`: it's an opt-in online step run on its own,
+
+    python scripts/partitions.py convert
+
+(services.partitions.convert_to_partitioned). Databases that ran the first
+version of this revision, which rebuilt the tables in place, are already
+partitioned and are left as they are; so is a partitioned table on
+downgrade, where created_at stays part of the primary key.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 16:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import is_partitioned
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('token_usage', 'generation_logs')
+BATCH = 5000
+
+
+def _backfill_created_at(bind, table: str) -> None:
+    now = "timezone('utc', now())" if bind.dialect.name == 'postgresql' else "CURRENT_TIMESTAMP"
+    while bind.execute(sa.text(
+        f"UPDATE {table} SET created_at = {now} "
+        f"WHERE id IN (SELECT id FROM {table} WHERE created_at IS NULL LIMIT :batch)"
+    ), {"batch": BATCH}).rowcount:
+        pass
+
+
+def _created_at_nullable(bind, table: str) -> bool:
+    return next(c['nullable'] for c in sa.inspect(bind).get_columns(table) if c['name'] == 'created_at')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    for table in TABLES:
+        if not _created_at_nullable(bind, table):
+            continue
+        if bind.dialect.name == 'postgresql':
+            constraint = f"{table}_created_at_not_null"
+            with op.get_context().autocommit_block():
+                _backfill_created_at(bind, table)
+                op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}")
+                op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} CHECK (created_at IS NOT NULL) NOT VALID")
+                op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+                # With the validated CHECK, SET NOT NULL skips its full-table scan
+                op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL")
+                op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+        else:
+            _backfill_created_at(bind, table)
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for table in TABLES:
+        if bind.dialect.name == 'postgresql':
+            if not is_partitioned(table):
+                op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at DROP NOT NULL")
+        else:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,66 @@
+"""full-text search: generation_logs.search_text, tsvector GIN and pg_trgm indexes
+
+The tsvector index expressions must match services/search.py exactly.
+ftx_* / trgm_* indexes are PostgreSQL-only and not declared on the models
+(env.py skips them in autogenerate). Existing history gets search_text from
+scripts/backfill_search_text.py.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 17:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_concurrently, create_partitioned_index, is_partitioned
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+HISTORY_DOCUMENT = (
+    "to_tsvector(CASE WHEN language = 'uz' THEN 'simple'::regconfig ELSE 'russian'::regconfig END, "
+    "coalesce(topic, '') || ' ' || coalesce(search_text, ''))"
+)
+MATERIAL_DOCUMENT = "to_tsvector('russian', coalesce(filename, '') || ' ' || left(extracted_text, 200000))"
+
+TRGM_INDEXES = [
+    ('trgm_users_full_name', 'users', 'full_name gin_trgm_ops'),
+    ('trgm_users_email', 'users', 'email gin_trgm_ops'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if 'search_text' not in {c['name'] for c in sa.inspect(bind).get_columns('generation_logs')}:
+        op.add_column('generation_logs', sa.Column('search_text', sa.Text(), nullable=True))
+
+    if bind.dialect.name != 'postgresql':
+        return
+
+    if is_partitioned('generation_logs'):
+        create_partitioned_index('ftx_generation_logs', 'generation_logs', HISTORY_DOCUMENT, using='gin')
+    else:
+        create_index_concurrently('ftx_generation_logs', 'generation_logs', HISTORY_DOCUMENT, using='gin')
+    create_index_concurrently('ftx_user_materials', 'user_materials', MATERIAL_DOCUMENT, using='gin')
+
+    # Admin name/email search (ILIKE '%x%') can use trigram indexes
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, columns in TRGM_INDEXES:
+        create_index_concurrently(name, table, columns, using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for name in ('ftx_generation_logs', 'ftx_user_materials', 'trgm_users_full_name', 'trgm_users_email'):
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+    with op.batch_alter_table('generation_logs', schema=None) as batch_op:
+        batch_op.drop_column('search_text')
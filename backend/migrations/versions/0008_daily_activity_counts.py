@@ -0,0 +1,99 @@
+"""unique daily_progress per (user, day) and daily_activity_counts
+
+Activity completion becomes upserts on a (user_id, date) key with per-activity
+counters in daily_activity_counts instead of the activity_history JSON.
+Duplicate daily_progress rows left by the old racy get-or-create are merged
+into the oldest row before the unique index is built. Counters only matter
+for the current day, so only the last two days of activity_history are
+folded into daily_activity_counts; the column itself is no longer written.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 19:05:00.000000
+
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _fold_recent_history(conn) -> None:
+    """activity_history JSON of the last two (Tashkent) days -> daily_activity_counts rows of the kept progress row."""
+    since = datetime.utcnow() + timedelta(hours=5) - timedelta(days=2)
+    rows = conn.execute(sa.text(
+        "SELECT d.activity_history, (SELECT min(k.id) FROM daily_progress k "
+        "WHERE k.user_id = d.user_id AND k.date = d.date) AS keep_id "
+        "FROM daily_progress d WHERE d.date >= :since AND d.activity_history IS NOT NULL"
+    ), {"since": since}).all()
+
+    counts: dict[tuple[int, str, str], int] = {}
+    for history, keep_id in rows:
+        try:
+            history = json.loads(history)
+        except ValueError:
+            continue
+        metadata = history.pop("__metadata__", {})
+        for kind, values in (("activity", history), ("type", metadata)):
+            for key, count in values.items():
+                counts[(keep_id, kind, key)] = counts.get((keep_id, kind, key), 0) + int(count)
+
+    existing = set(conn.execute(sa.text("SELECT progress_id, kind, key FROM daily_activity_counts")).all())
+    new_rows = [
+        {"progress_id": p, "kind": k, "key": key, "count": c}
+        for (p, k, key), c in counts.items() if (p, k, key) not in existing
+    ]
+    if new_rows:
+        conn.execute(sa.text(
+            "INSERT INTO daily_activity_counts (progress_id, kind, key, count) VALUES (:progress_id, :kind, :key, :count)"
+        ), new_rows)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    # Databases first built by create_all() may already have it
+    if 'daily_activity_counts' not in sa.inspect(conn).get_table_names():
+        op.create_table('daily_activity_counts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('progress_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['progress_id'], ['daily_progress.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('progress_id', 'kind', 'key', name='uq_daily_activity_counts_progress_kind_key')
+        )
+
+    _fold_recent_history(conn)
+
+    # Merge duplicates into the oldest row of each (user, day)
+    op.execute(
+        "UPDATE daily_progress SET "
+        "total_xp_today = (SELECT sum(coalesce(d.total_xp_today, 0)) FROM daily_progress d "
+        "WHERE d.user_id = daily_progress.user_id AND d.date = daily_progress.date), "
+        "total_coins_today = (SELECT sum(coalesce(d.total_coins_today, 0)) FROM daily_progress d "
+        "WHERE d.user_id = daily_progress.user_id AND d.date = daily_progress.date) "
+        "WHERE id IN (SELECT min(id) FROM daily_progress WHERE date IS NOT NULL GROUP BY user_id, date HAVING count(*) > 1)"
+    )
+    op.execute(
+        "DELETE FROM daily_progress WHERE date IS NOT NULL AND id NOT IN "
+        "(SELECT min(id) FROM daily_progress GROUP BY user_id, date)"
+    )
+    create_index_concurrently('uq_daily_progress_user_date', 'daily_progress', 'user_id, date', unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS uq_daily_progress_user_date")
+    op.drop_table('daily_activity_counts')
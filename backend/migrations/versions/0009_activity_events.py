@@ -0,0 +1,40 @@
+"""activity_events: idempotency keys of batched activity completions
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 19:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases first built by create_all() may already have it
+    if 'activity_events' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('activity_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.String(), nullable=False),
+        sa.Column('xp_earned', sa.Integer(), nullable=False),
+        sa.Column('coins_earned', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'event_id', name='uq_activity_events_user_event')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('activity_events')
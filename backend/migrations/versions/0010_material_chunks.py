@@ -0,0 +1,58 @@
+"""material_chunks, material_terms: chunked material text and its inverted index
+
+Generations used to send the first 10,000 characters of a material. Materials
+are now split into chunks at upload, with per-chunk term frequencies, and
+only the chunks most relevant to the topic are sent. Materials uploaded
+before this keep the old behaviour until scripts/index_materials.py runs.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 20:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases first built by create_all() may already have them
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'material_chunks' not in tables:
+        op.create_table('material_chunks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('material_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('length', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['material_id'], ['user_materials.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('material_id', 'position', name='uq_material_chunks_material_position')
+        )
+    if 'material_terms' not in tables:
+        op.create_table('material_terms',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('material_id', sa.Integer(), nullable=False),
+        sa.Column('term', sa.String(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('tf', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['material_id'], ['user_materials.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('idx_material_terms_material_term', 'material_terms', ['material_id', 'term'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_material_terms_material_term', table_name='material_terms')
+    op.drop_table('material_terms')
+    op.drop_table('material_chunks')
@@ -0,0 +1,32 @@
+"""user_materials.digest: AI summary sent to generations instead of the text
+
+Existing materials get their digest on first use (apps.library.digest), so
+there is nothing to backfill.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 21:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if 'digest' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('user_materials')}:
+        op.add_column('user_materials', sa.Column('digest', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user_materials', 'digest')
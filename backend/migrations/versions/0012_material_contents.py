@@ -0,0 +1,178 @@
+"""material_contents: uploaded text shared by file hash, with reference counts
+
+The extracted text and digest move from user_materials to material_contents,
+which identical uploads share (apps.library.contents); user_materials keeps
+ownership and the file name and points at its content. Existing materials
+each get a content of their own: their file bytes were never kept, so there
+is no hash to share them by (sha256 stays NULL).
+
+The chunk index (revision 0010) is re-keyed by content. It is derived data:
+the tables are recreated empty and scripts/index_materials.py rebuilds them;
+until then generations use the beginning of the text. The full-text index
+of materials moves with the text, to material_contents.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, Sequence[str], None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must stay identical to services.search.CONTENT_DOCUMENT
+CONTENT_DOCUMENT = "to_tsvector('russian', left(extracted_text, 200000))"
+# The revision 0007 index this replaces
+MATERIAL_DOCUMENT = "to_tsvector('russian', coalesce(filename, '') || ' ' || left(extracted_text, 200000))"
+
+BATCH = 500
+
+
+def _create_index_tables() -> None:
+    op.create_table('material_chunks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('length', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['content_id'], ['material_contents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('content_id', 'position', name='uq_material_chunks_content_position')
+    )
+    op.create_table('material_terms',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('tf', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['content_id'], ['material_contents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_material_terms_content_term', 'material_terms', ['content_id', 'term'], unique=False)
+
+
+def _move_texts(bind, has_digest: bool) -> None:
+    """One content per existing material, in batches."""
+    digest = "digest" if has_digest else "NULL"
+    while True:
+        rows = bind.execute(sa.text(
+            f"SELECT id, file_type, extracted_text, {digest} AS digest, created_at FROM user_materials "
+            "WHERE content_id IS NULL ORDER BY id LIMIT :batch"
+        ), {"batch": BATCH}).all()
+        if not rows:
+            return
+        for row in rows:
+            text = row.extracted_text or ""
+            content_id = bind.execute(sa.text(
+                "INSERT INTO material_contents (sha256, file_type, extracted_text, char_count, digest, ref_count, created_at) "
+                "VALUES (NULL, :file_type, :text, :char_count, :digest, 1, :created_at) RETURNING id"
+            ), {"file_type": row.file_type, "text": text, "char_count": len(text), "digest": row.digest, "created_at": row.created_at}).scalar()
+            bind.execute(sa.text("UPDATE user_materials SET content_id = :content_id WHERE id = :id"), {"content_id": content_id, "id": row.id})
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # Databases first built by create_all() already have the final layout
+    if 'material_contents' not in inspector.get_table_names():
+        op.create_table('material_contents',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(), nullable=True),
+        sa.Column('file_type', sa.String(), nullable=False),
+        sa.Column('extracted_text', sa.Text(), nullable=False),
+        sa.Column('char_count', sa.Integer(), nullable=False),
+        sa.Column('digest', sa.Text(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256', 'file_type', name='uq_material_contents_sha256_type')
+        )
+
+    columns = {c['name'] for c in inspector.get_columns('user_materials')}
+    if 'content_id' not in columns:
+        op.add_column('user_materials', sa.Column('content_id', sa.Integer(), nullable=True))
+    if 'extracted_text' in columns:
+        _move_texts(bind, 'digest' in columns)
+
+    if columns & {'extracted_text', 'digest'} or 'content_id' not in columns:
+        if bind.dialect.name == 'postgresql':
+            op.execute("DROP INDEX IF EXISTS ftx_user_materials")
+        # batch: SQLite can't drop columns or ALTER in a foreign key / NOT NULL
+        with op.batch_alter_table('user_materials', schema=None) as batch_op:
+            for column in ('extracted_text', 'digest'):
+                if column in columns:
+                    batch_op.drop_column(column)
+            # (0011 adds digest to create_all() databases, which already have content_id)
+            if 'content_id' not in columns:
+                batch_op.alter_column('content_id', existing_type=sa.Integer(), nullable=False)
+                batch_op.create_foreign_key('fk_user_materials_content_id', 'material_contents', ['content_id'], ['id'])
+                batch_op.create_index('ix_user_materials_content_id', ['content_id'], unique=False)
+
+    tables = sa.inspect(bind).get_table_names()
+    chunk_columns = {c['name'] for c in sa.inspect(bind).get_columns('material_chunks')} if 'material_chunks' in tables else set()
+    if 'content_id' not in chunk_columns:
+        if 'material_terms' in tables:
+            op.drop_table('material_terms')
+        if 'material_chunks' in tables:
+            op.drop_table('material_chunks')
+        _create_index_tables()
+
+    if bind.dialect.name == 'postgresql':
+        create_index_concurrently('ftx_material_contents', 'material_contents', CONTENT_DOCUMENT, using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    with op.batch_alter_table('user_materials', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('extracted_text', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('digest', sa.Text(), nullable=True))
+    op.execute(
+        "UPDATE user_materials SET "
+        "extracted_text = (SELECT extracted_text FROM material_contents c WHERE c.id = user_materials.content_id), "
+        "digest = (SELECT digest FROM material_contents c WHERE c.id = user_materials.content_id)"
+    )
+    with op.batch_alter_table('user_materials', schema=None) as batch_op:
+        batch_op.alter_column('extracted_text', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_index('ix_user_materials_content_id')
+        batch_op.drop_column('content_id')
+
+    # The 0010 index, keyed by material again (empty: rebuild with scripts/index_materials.py)
+    op.drop_table('material_terms')
+    op.drop_table('material_chunks')
+    op.create_table('material_chunks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('length', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['material_id'], ['user_materials.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('material_id', 'position', name='uq_material_chunks_material_position')
+    )
+    op.create_table('material_terms',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('tf', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['material_id'], ['user_materials.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_material_terms_material_term', 'material_terms', ['material_id', 'term'], unique=False)
+
+    op.execute("DROP INDEX IF EXISTS ftx_material_contents")
+    op.drop_table('material_contents')
+    if bind.dialect.name == 'postgresql':
+        create_index_concurrently('ftx_user_materials', 'user_materials', MATERIAL_DOCUMENT, using='gin')
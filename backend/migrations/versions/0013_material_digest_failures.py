@@ -0,0 +1,32 @@
+"""material_contents.digest_failed_at: back off digest builds that gave nothing usable
+
+Without it a content whose digest the model couldn't produce was rebuilt,
+and charged, on every generation that used it (apps.library.digest).
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0013'
+down_revision: Union[str, Sequence[str], None] = '0012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if 'digest_failed_at' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('material_contents')}:
+        op.add_column('material_contents', sa.Column('digest_failed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('material_contents', 'digest_failed_at')
@@ -0,0 +1,81 @@
+"""
+One-off backfill: move legacy GenerationLog.content (JSON string) into
+content_json / content_zstd and fill item_count.
+language and difficulty are intentionally left NULL for legacy rows: the
+request that produced them wasn't stored, so there is nothing to derive them from.
+
+Walks the table by primary key in small batches and commits after each one,
+so only the rows of the current batch are locked and the app keeps writing.
+Safe to re-run: already converted rows are skipped.
+
+    python scripts/backfill_generation_content.py --batch-size 500 --pause 0.2
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+
+from sqlalchemy import update
+
+from database import SessionLocal
+import apps.auth.models
+import apps.admin.models
+import apps.classes.models
+import apps.library.models
+import apps.payments.models
+from apps.generator.models import GenerationLog
+from apps.generator.storage import encode_content, count_items
+
+
+def backfill(batch_size: int, pause: float) -> None:
+    db = SessionLocal()
+    last_id = 0
+    converted = 0
+    try:
+        while True:
+            rows = db.query(GenerationLog.id, GenerationLog.content).filter(
+                GenerationLog.id > last_id,
+                GenerationLog.content.isnot(None),
+                GenerationLog.content_json.is_(None),
+                GenerationLog.content_zstd.is_(None),
+            ).order_by(GenerationLog.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                try:
+                    payload = json.loads(row.content)
+                except json.JSONDecodeError:
+                    # Not JSON — keep as a JSON string so nothing is lost
+                    payload = row.content
+                content_json, content_zstd = encode_content(payload)
+                updates.append({
+                    "id": row.id,
+                    "content_json": content_json,
+                    "content_zstd": content_zstd,
+                    "item_count": count_items(payload),
+                    "content": None,
+                })
+
+            db.execute(update(GenerationLog), updates)
+            db.commit()
+
+            last_id = rows[-1].id
+            converted += len(rows)
+            print(f"  converted {converted} rows (last id {last_id})")
+            if pause:
+                time.sleep(pause)
+    finally:
+        db.close()
+    print(f"Backfill complete: {converted} rows converted.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds to sleep between batches")
+    args = parser.parse_args()
+    backfill(args.batch_size, args.pause)
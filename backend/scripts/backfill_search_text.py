@@ -0,0 +1,69 @@
+"""
+One-off backfill: fill GenerationLog.search_text (the text indexed for
+history search, revision 0007) for rows written before it existed.
+
+Walks the table by primary key in small batches and commits after each one.
+Safe to re-run: rows that already have search_text are skipped.
+
+    python scripts/backfill_search_text.py --batch-size 500 --pause 0.2
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+from sqlalchemy import update
+
+from database import SessionLocal
+import apps.auth.models
+import apps.admin.models
+import apps.classes.models
+import apps.library.models
+import apps.payments.models
+from apps.generator.models import GenerationLog
+from apps.generator.storage import decode_content, extract_search_text
+
+
+def backfill(batch_size: int, pause: float) -> None:
+    db = SessionLocal()
+    last_id = 0
+    filled = 0
+    try:
+        while True:
+            rows = db.query(
+                GenerationLog.id, GenerationLog.content_json, GenerationLog.content_zstd, GenerationLog.content,
+            ).filter(
+                GenerationLog.id > last_id,
+                GenerationLog.search_text.is_(None),
+            ).order_by(GenerationLog.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            # "" marks rows without text so they aren't picked up again
+            updates = [
+                {
+                    "id": row.id,
+                    "search_text": extract_search_text(decode_content(row.content_json, row.content_zstd, row.content)) or "",
+                }
+                for row in rows
+            ]
+            db.execute(update(GenerationLog), updates)
+            db.commit()
+
+            last_id = rows[-1].id
+            filled += len(rows)
+            print(f"  filled {filled} rows (last id {last_id})")
+            if pause:
+                time.sleep(pause)
+    finally:
+        db.close()
+    print(f"Backfill complete: {filled} rows filled.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds to sleep between batches")
+    args = parser.parse_args()
+    backfill(args.batch_size, args.pause)
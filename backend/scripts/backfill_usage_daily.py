@@ -0,0 +1,135 @@
+"""
+Rebuild the usage_daily rollup (and users.last_active_at) from the raw
+token_usage / generation_logs history.
+
+Works through the history a few days at a time: each chunk is aggregated
+in SQL, its usage_daily rows are replaced and committed. Days from --until
+onwards are left alone. The default (tomorrow) includes today: the write
+path only maintains usage_daily from the moment the new code is live, so the
+deploy day needs rebuilding too. That day is a chunk of its own, rebuilt
+with usage_daily locked against writes on PostgreSQL; a generation recorded
+meanwhile either is in the aggregate or waits and adds on top of it. Run it
+once after `alembic upgrade head`. Safe to re-run: a chunk is always rebuilt
+from the raw tables.
+
+    python scripts/backfill_usage_daily.py --days 7 --pause 0.2
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, text, update
+
+from database import SessionLocal
+import apps.admin.models
+import apps.classes.models
+import apps.library.models
+import apps.payments.models
+from apps.auth.models import User
+from apps.generator.models import TokenUsage, GenerationLog, UsageDaily
+
+
+def _aggregate(db, model, feature_col, start: datetime, end: datetime, tokens_col=None):
+    day = func.date(model.created_at)  # DATE on PostgreSQL, 'YYYY-MM-DD' on SQLite
+    columns = [model.user_id, feature_col, day, func.count(model.id)]
+    if tokens_col is not None:
+        columns.append(func.sum(tokens_col))
+    return db.query(*columns).filter(
+        model.user_id.isnot(None),
+        model.created_at >= start,
+        model.created_at < end,
+    ).group_by(model.user_id, feature_col, day).all()
+
+
+def _rebuild_chunk(db, start: date, end: date, orgs: dict) -> int:
+    start_dt, end_dt = datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+    if end > datetime.utcnow().date() and db.bind.dialect.name == "postgresql":
+        # Days the write path is still adding to: hold its upserts until this
+        # chunk commits, so none is lost to the DELETE or counted twice
+        db.execute(text("LOCK TABLE usage_daily IN SHARE ROW EXCLUSIVE MODE"))
+    rows: dict[tuple, dict] = {}
+
+    def row_for(user_id, feature, day):
+        day = day if isinstance(day, date) else date.fromisoformat(str(day))
+        return rows.setdefault((user_id, feature, day), {
+            "user_id": user_id, "organization_id": orgs.get(user_id), "feature": feature, "day": day,
+            "generations": 0, "tokens": 0,
+        })
+
+    for user_id, feature, day, count, tokens in _aggregate(
+            db, TokenUsage, TokenUsage.feature_name, start_dt, end_dt, TokenUsage.tokens_total):
+        row = row_for(user_id, feature, day)
+        row["generations"] = count
+        row["tokens"] = int(tokens or 0)
+
+    # A generation writes a usage row (if it cost tokens) and/or a history row
+    for user_id, feature, day, count in _aggregate(db, GenerationLog, GenerationLog.generator_type, start_dt, end_dt):
+        row = row_for(user_id, feature, day)
+        row["generations"] = max(row["generations"], count)
+
+    db.query(UsageDaily).filter(UsageDaily.day >= start, UsageDaily.day < end).delete(synchronize_session=False)
+    if rows:
+        db.bulk_insert_mappings(UsageDaily, list(rows.values()))
+    db.commit()
+    return len(rows)
+
+
+def _fill_last_active(db) -> None:
+    last_seen = (
+        db.query(TokenUsage.user_id, func.max(TokenUsage.created_at).label("at"))
+        .group_by(TokenUsage.user_id)
+        .subquery()
+    )
+    db.execute(
+        update(User)
+        .where(User.id == last_seen.c.user_id, User.last_active_at.is_(None))
+        .values(last_active_at=last_seen.c.at)
+    )
+    db.commit()
+
+
+def backfill(days: int, until: date, pause: float) -> None:
+    db = SessionLocal()
+    try:
+        first = min(
+            (d for d in (
+                db.query(func.min(TokenUsage.created_at)).scalar(),
+                db.query(func.min(GenerationLog.created_at)).scalar(),
+            ) if d),
+            default=None,
+        )
+        if first is None:
+            print("No usage history — nothing to backfill.")
+            return
+
+        orgs = dict(db.query(User.id, User.organization_id).all())
+        start = first.date()
+        total = 0
+        while start < until:
+            end = min(start + timedelta(days=days), until)
+            today = datetime.utcnow().date()
+            if start < today < end:
+                end = today  # the live day gets a chunk (and the lock) of its own
+            total += _rebuild_chunk(db, start, end, orgs)
+            print(f"  {start} .. {end - timedelta(days=1)}: {total} rollup rows so far")
+            start = end
+            if pause:
+                time.sleep(pause)
+
+        _fill_last_active(db)
+    finally:
+        db.close()
+    print(f"Backfill complete: {total} usage_daily rows written.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=7, help="days per chunk")
+    parser.add_argument("--until", type=date.fromisoformat, default=datetime.utcnow().date() + timedelta(days=1),
+                        help="first day NOT rebuilt (default: tomorrow, so today is rebuilt too)")
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds to sleep between chunks")
+    args = parser.parse_args()
+    backfill(args.days, args.until, args.pause)
@@ -0,0 +1,66 @@
+"""
+One-off backfill: chunk and index material contents stored before the
+material index existed (revisions 0010 and 0012), from their extracted_text.
+
+Until a content is indexed, generations fall back to the beginning of its
+text. Walks material_contents by primary key and commits after each batch.
+Safe to re-run: contents that already have chunks are skipped.
+
+    python scripts/index_materials.py --batch-size 50 --pause 0.2
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+from sqlalchemy import insert
+
+from database import SessionLocal
+import apps.auth.models
+import apps.admin.models
+import apps.classes.models
+import apps.gamification.models
+import apps.generator.models
+import apps.payments.models
+from apps.library.models import MaterialChunk, MaterialContent, MaterialTerm
+from apps.library.material_index import build_index, index_rows
+
+
+def backfill(batch_size: int, pause: float) -> None:
+    db = SessionLocal()
+    last_id = 0
+    indexed = 0
+    try:
+        while True:
+            rows = db.query(MaterialContent.id, MaterialContent.extracted_text).filter(
+                MaterialContent.id > last_id,
+                ~db.query(MaterialChunk.id).filter(MaterialChunk.content_id == MaterialContent.id).exists(),
+            ).order_by(MaterialContent.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            for row in rows:
+                chunks, postings = index_rows(row.id, build_index(row.extracted_text or ""))
+                if chunks:
+                    db.execute(insert(MaterialChunk), chunks)
+                if postings:
+                    db.execute(insert(MaterialTerm), postings)
+            db.commit()
+
+            last_id = rows[-1].id
+            indexed += len(rows)
+            print(f"  indexed {indexed} contents (last id {last_id})")
+            if pause:
+                time.sleep(pause)
+    finally:
+        db.close()
+    print(f"Backfill complete: {indexed} contents indexed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds to sleep between batches")
+    args = parser.parse_args()
+    backfill(args.batch_size, args.pause)
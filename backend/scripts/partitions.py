@@ -0,0 +1,89 @@
+"""
+Manage the monthly partitions of token_usage / generation_logs (PostgreSQL).
+
+    python scripts/partitions.py convert [--batch-size 5000]
+    python scripts/partitions.py list
+    python scripts/partitions.py ensure --months-ahead 3
+    python scripts/partitions.py archive --older-than 12 [--dir /backups/archive]
+    python scripts/partitions.py restore generation_logs 2025-03 [--dir /backups/archive]
+
+convert turns the plain tables into partitioned ones online (see
+services.partitions.convert_to_partitioned): run it once, off-peak, after
+`alembic upgrade head`; it can be re-run if interrupted.
+archive writes each month to <dir>/<table>/<partition>.ndjson.zst and drops
+the partition; restore recreates the month from that file. The app runs
+`ensure` (and `archive` when PARTITION_RETENTION_MONTHS is set) once a day.
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from datetime import date
+
+from database import engine
+from config import PARTITION_ARCHIVE_DIR, PARTITION_MONTHS_AHEAD
+from services import partitions
+
+
+def cmd_convert(args) -> None:
+    for table in partitions.PARTITIONED_TABLES:
+        copied = partitions.convert_to_partitioned(engine, table, args.batch_size)
+        print(f"{table}: partitioned ({copied} rows copied).")
+
+
+def cmd_list(args) -> None:
+    with engine.connect() as conn:
+        for table in partitions.PARTITIONED_TABLES:
+            if not partitions.is_partitioned(conn, table):
+                print(f"{table}: not partitioned")
+                continue
+            print(f"{table}:")
+            for name, month in partitions.list_partitions(conn, table):
+                print(f"  {name}" + ("" if month else "  (default)"))
+
+
+def cmd_ensure(args) -> None:
+    created = partitions.ensure_future_partitions(engine, args.months_ahead)
+    print(f"Partitions present up to {args.months_ahead} months ahead ({len(created)} checked).")
+
+
+def cmd_archive(args) -> None:
+    archived = partitions.archive_partitions(engine, args.older_than, args.dir)
+    for path in archived:
+        print(f"  archived -> {path}")
+    print(f"Archive complete: {len(archived)} partitions.")
+
+
+def cmd_restore(args) -> None:
+    month = date.fromisoformat(args.month + "-01")
+    count = partitions.restore_partition(engine, args.table, month, args.dir)
+    print(f"Restored {count} rows into {partitions.partition_name(args.table, month)}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert")
+    p.add_argument("--batch-size", type=int, default=5000, help="rows per copy transaction")
+    p.set_defaults(func=cmd_convert)
+
+    sub.add_parser("list").set_defaults(func=cmd_list)
+
+    p = sub.add_parser("ensure")
+    p.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    p.set_defaults(func=cmd_ensure)
+
+    p = sub.add_parser("archive")
+    p.add_argument("--older-than", type=int, required=True, help="months to keep")
+    p.add_argument("--dir", default=PARTITION_ARCHIVE_DIR)
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("restore")
+    p.add_argument("table", choices=partitions.PARTITIONED_TABLES)
+    p.add_argument("month", help="YYYY-MM")
+    p.add_argument("--dir", default=PARTITION_ARCHIVE_DIR)
+    p.set_defaults(func=cmd_restore)
+
+    args = parser.parse_args()
+    args.func(args)
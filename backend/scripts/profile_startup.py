@@ -0,0 +1,73 @@
+"""
+Startup profile: how long `import main` takes and which packages it spends
+the time on (python -X importtime), plus the worker's peak RSS after import.
+
+    python scripts/profile_startup.py            # top 25 packages
+    python scripts/profile_startup.py --top 50 --module apps.generator.router
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import subprocess
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child process: import the module, report wall time and peak RSS (KB on Linux)
+_CHILD = """
+import resource, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(f"WALL {{elapsed:.3f}}", file=sys.stderr)
+print(f"RSS {{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}", file=sys.stderr)
+print("SDKS " + ",".join(m for m in ("openai", "google.genai", "sentry_sdk", "passlib", "bcrypt", "pypdf", "docx") if m in sys.modules), file=sys.stderr)
+"""
+
+
+def profile(module: str, top: int) -> None:
+    env = dict(os.environ)
+    # main imports config at module level; make sure it can start without a .env
+    env.setdefault("DATABASE_URL", "sqlite:///:memory:")
+    env.setdefault("SECRET_KEY", "profile")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD.format(module=module)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-3000:])
+        sys.exit(proc.returncode)
+
+    self_us = defaultdict(int)
+    wall = rss = None
+    sdks = ""
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            parts = line[len("import time:"):].split("|")
+            try:
+                us = int(parts[0])
+            except ValueError:
+                continue  # header row
+            name = parts[2].strip()
+            self_us[name.split(".")[0]] += us
+        elif line.startswith("WALL "):
+            wall = float(line.split()[1])
+        elif line.startswith("RSS "):
+            rss = int(line.split()[1])
+        elif line.startswith("SDKS"):
+            sdks = line[5:]
+
+    print(f"import {module}: {wall:.2f}s wall, peak RSS {rss / 1024:.0f} MB")
+    print(f"heavy modules loaded at import: {sdks or 'none'}\n")
+    print(f"{'package':<32}{'self ms':>10}")
+    for name, us in sorted(self_us.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"{name:<32}{us / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+    profile(args.module, args.top)
@@ -0,0 +1,152 @@
+"""
+Admin audit log.
+
+audit() stages an AuditLog event on the caller's session; the endpoint's own
+commit is the only commit. What happens next depends on the event:
+
+- critical events (deletes, password resets, impersonation, key changes) are
+  added to the session and written in the caller's transaction;
+- the rest are handed to `audit_writer` once that transaction commits (never
+  on rollback) and inserted in batches by a background task.
+
+When the writer isn't running (scripts, tests, AUDIT_BUFFER=false) every
+event is written inline. A full queue drops the event and counts it — the
+admin action itself has already been committed by then.
+"""
+import asyncio
+import logging
+import queue
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from apps.auth.models import AuditLog
+from config import AUDIT_BUFFER, AUDIT_BUFFER_FLUSH_MS, AUDIT_BUFFER_MAX_QUEUE
+from database import get_async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+_MAX_BATCH = 500
+_PENDING_KEY = "audit_pending"
+
+
+def audit(db: Session, action: str, target: str, user_id: Optional[int], log_type: str = "info",
+          critical: bool = False) -> None:
+    row = {"action": action, "target": target, "user_id": user_id, "log_type": log_type, "timestamp": datetime.utcnow()}
+    if critical or not audit_writer.running:
+        db.add(AuditLog(**row))
+    else:
+        if not db.in_transaction():
+            db.begin()  # so that a rollback before the commit discards the event
+        db.info.setdefault(_PENDING_KEY, []).append(row)
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_pending(session: Session) -> None:
+    for row in session.info.pop(_PENDING_KEY, ()):
+        audit_writer.submit(row)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    if previous_transaction.parent is None:  # a rolled back savepoint keeps the outer events
+        session.info.pop(_PENDING_KEY, None)
+
+
+class AuditWriter:
+    """Bounded queue of audit rows, batch-inserted by a background task."""
+
+    def __init__(self, enabled: bool, max_queue: int, flush_interval: float):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        # Thread-safe: the admin routes are sync and commit in the threadpool
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_flush_latency_ms = 0.0
+        self.max_flush_latency_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def submit(self, row: dict) -> None:
+        try:
+            self._queue.put_nowait((time.monotonic(), row))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Audit queue full, dropped %s %s", row["action"], row["target"])
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        task, self._task = self._task, None  # new events are written inline from now on
+        # Not cancel(): a batch taken off the queue mid-flush would be lost
+        self._stopping.set()
+        await task
+        await self.flush()
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        while True:
+            batch = []
+            while len(batch) < _MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            await self._write(batch)
+
+    async def _write(self, batch: list[tuple[float, dict]]) -> None:
+        try:
+            async with get_async_sessionmaker()() as db:
+                await db.execute(insert(AuditLog), [row for _, row in batch])
+                await db.commit()
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to write %d audit events", len(batch))
+            return
+        self.written += len(batch)
+        # Oldest event in the batch: time from the admin's commit to the audit row being durable
+        self.last_flush_latency_ms = (time.monotonic() - batch[0][0]) * 1000
+        self.max_flush_latency_ms = max(self.max_flush_latency_ms, self.last_flush_latency_ms)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "last_flush_latency_ms": round(self.last_flush_latency_ms, 1),
+            "max_flush_latency_ms": round(self.max_flush_latency_ms, 1),
+        }
+
+
+audit_writer = AuditWriter(
+    enabled=AUDIT_BUFFER,
+    max_queue=AUDIT_BUFFER_MAX_QUEUE,
+    flush_interval=AUDIT_BUFFER_FLUSH_MS / 1000,
+)
@@ -0,0 +1,63 @@
+"""
+In-process TTL cache.
+
+Per-worker only: every uvicorn worker has its own copy, so anything cached
+here may be stale for up to `ttl` seconds on the other workers after an
+invalidation. Use it for read-mostly data where that window is acceptable.
+"""
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: dict[Hashable, tuple[float, Any]] = {}
+        self._lock = threading.Lock()  # sync routes run in the threadpool
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                self._evict()
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_if(self, predicate: Callable[[Any], bool]) -> None:
+        """Drops every entry whose value matches — for invalidation by a non-key field."""
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (exp, _) in self._data.items() if exp <= now]:
+            del self._data[key]
+        # Still full — drop the oldest insertions
+        overflow = len(self._data) - self.maxsize + 1
+        for key in list(self._data)[:max(overflow, 0)]:
+            del self._data[key]
@@ -0,0 +1,79 @@
+"""
+Read-through cache for small, rarely-changing catalogs (shop items, the
+announcement, templates), kept as the exact JSON bytes sent plus a strong
+ETag over them.
+
+A hit costs no query and no serialization; a client that sends the ETag back
+in If-None-Match gets 304 with no body. Writers call invalidate() after their
+commit, which clears this worker's copy at once — other workers have their
+own (services.cache.TTLCache) and pick the change up within
+CATALOG_CACHE_SECONDS. The ETag depends only on the bytes, so every worker
+hands out the same one for the same data.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+from fastapi import Request, Response
+
+from config import CATALOG_CACHE_SECONDS
+from services.cache import TTLCache
+
+_catalogs = TTLCache(ttl=CATALOG_CACHE_SECONDS, maxsize=4096)
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, data: Any) -> "CachedBody":
+        # Same encoding as FastAPI's JSONResponse
+        body = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        return cls(body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+
+
+def cached(key: Hashable, load: Callable[[], Any]) -> CachedBody:
+    """The cached body for `key`, calling `load()` (JSON-able data) on a miss."""
+    entry = _catalogs.get(key)
+    if entry is None:
+        entry = CachedBody.of(load())
+        _catalogs.set(key, entry)
+    return entry
+
+
+async def cached_data(key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+    """Cached JSON-able data, for responses assembled from several cached parts."""
+    data = _catalogs.get(key)
+    if data is None:
+        data = await load()
+        _catalogs.set(key, data)
+    return data
+
+
+def invalidate(*keys: Hashable) -> None:
+    for key in keys:
+        _catalogs.pop(key)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def etag_response(request: Request, entry: CachedBody, private: bool = False) -> Response:
+    """200 with the body, or 304 when the client already has this version."""
+    headers = {
+        "ETag": entry.etag,
+        # Browsers keep the copy but revalidate every time, so invalidations show up immediately
+        "Cache-Control": "private, no-cache" if private else "no-cache",
+    }
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -6,9 +6,6 @@ Images: gemini-2.0-flash-exp    → native image generation (fallback friendly)
 SDK   : google-genai (pip install google-genai)
 """
 
-from google import genai
-from google.genai import types as genai_types
-
 import asyncio
 import base64
 import collections
@@ -24,6 +21,33 @@ logger = logging.getLogger(__name__)
 
 from config import GEMINI_API_KEYS_LIST, OPENAI_API_KEY, get_env_int
 
+def _import_sdk():
+    from google import genai
+    from google.genai import types
+    return genai, types
+
+
+_loaded_sdk = None
+
+
+async def _sdk():
+    """
+    google-genai is one of the heaviest imports of the app — loaded on first
+    use (or by warm_up() from the app lifespan) instead of at worker start.
+    The first use imports it in a thread, so a request arriving before the
+    warm-up finished (or with AI_SDK_WARMUP=false) doesn't stall the event loop.
+    """
+    global _loaded_sdk
+    if _loaded_sdk is None:
+        _loaded_sdk = await asyncio.to_thread(_import_sdk)
+    return _loaded_sdk
+
+
+def warm_up() -> None:
+    global _loaded_sdk
+    _loaded_sdk = _import_sdk()
+
+
 _COOLDOWN_SECONDS = get_env_int("GEMINI_KEY_COOLDOWN_SECONDS", 900)
 _GLOBAL_RPM_LIMIT = get_env_int("GLOBAL_RPM_LIMIT", 70)
 
@@ -83,6 +107,15 @@ class GeminiKeyManager:
             if available_count == 0:
                 logger.critical("ALL GEMINI KEYS IN COOLDOWN! System falling back to OpenAI or returning errors.")
 
+    def capacity(self) -> int:
+        """Calls that can start now: keys out of cooldown, within what is left of the global RPM window."""
+        now = time.time()
+        with self.lock:
+            while self._rpm_window and self._rpm_window[0] < now - 60:
+                self._rpm_window.popleft()
+            available = sum(1 for k in self.keys if now >= self.cooldowns.get(k, 0))
+            return max(0, min(available, self.GLOBAL_RPM_LIMIT - len(self._rpm_window)))
+
     def has_available_keys(self) -> bool:
         if not self.keys: return False
         now = time.time()
@@ -173,6 +206,7 @@ async def generate_storybook(
     Returns dict with pages list, each page has image_base64 (or None).
     If custom_api_key is provided (org's own key), it bypasses the shared key pool.
     """
+    genai, genai_types = await _sdk()
     if custom_api_key:
         # Use org's dedicated key — bypass shared pool
         max_retries = 1
@@ -266,6 +300,7 @@ async def generate_storybook(
 
 async def _generate_image(prompt: str, custom_api_key: Optional[str] = None) -> Optional[str]:
     """Try each image model in order, with key rotation on 429 limit errors. Returns base64 PNG string or None."""
+    genai, genai_types = await _sdk()
     if custom_api_key:
         max_retries = 1
         _get_key = lambda: custom_api_key
@@ -318,8 +353,8 @@ async def _generate_image(prompt: str, custom_api_key: Optional[str] = None) ->
 
     if OPENAI_API_KEY:
         logger.warning(f"All Gemini keys and models failed for one image. FALLING BACK TO DALL-E 3...")
-        from services.openai_service import _generate_dalle_image, client as oai_client
-        return await _generate_dalle_image(oai_client, prompt)
+        from services.openai_service import _generate_dalle_image, get_client_async
+        return await _generate_dalle_image(await get_client_async(), prompt)
 
     logger.error("All image generation keys and models failed and No OpenAI fallback — returning None")
     return None
@@ -359,6 +394,7 @@ async def generate_content(
     Generic content generation with rotation and OpenAI fallback.
     Returns (json_data, estimated_tokens).
     """
+    genai, genai_types = await _sdk()
     if not key_manager.keys:
         logger.error("No Gemini API keys configured")
         return None, 0
@@ -410,9 +446,9 @@ async def generate_content(
     if OPENAI_API_KEY:
         logger.warning("All Gemini keys exhausted. FALLING BACK TO OPENAI for generic content...")
         try:
-            from openai import OpenAI
+            from services.openai_service import get_client_async
             import json as _json
-            oai = OpenAI(api_key=OPENAI_API_KEY)
+            oai = await get_client_async()
             response = await asyncio.to_thread(
                 oai.chat.completions.create,
                 model="gpt-4o-mini",
@@ -0,0 +1,93 @@
+"""
+In-process background jobs with progress.
+
+For admin operations too large to run inside a request. Jobs run on a small
+thread pool of this worker and their state lives in memory: it is lost on
+restart and only visible on the worker that started the job (the API runs a
+single uvicorn worker). Finished jobs are kept for JOB_RETENTION_SECONDS,
+together with their result file if they produced one.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_RETENTION_SECONDS = 3600
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="job")
+_jobs: dict[str, "Job"] = {}
+_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self, kind: str, total: int, user_id: Optional[int]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.total = total
+        self.done = 0
+        self.status = "queued"  # queued | running | done | failed
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.file: Optional[str] = None  # downloadable result, removed with the job
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[float] = None
+
+    def advance(self, n: int) -> None:
+        self.done = min(self.total, self.done + n)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "progress": round(self.done / self.total, 3) if self.total else 1.0,
+            "result": self.result,
+            "error": self.error,
+            "has_file": self.file is not None,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+def submit(kind: str, total: int, fn: Callable[[Job], Any], user_id: Optional[int] = None) -> Job:
+    """Runs fn(job) in the background; fn reports progress with job.advance() and returns the result."""
+    job = Job(kind, total, user_id)
+    with _lock:
+        _prune()
+        _jobs[job.id] = job
+    _executor.submit(_run, job, fn)
+    return job
+
+
+def get(job_id: str) -> Optional[Job]:
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def _run(job: Job, fn: Callable[[Job], Any]) -> None:
+    job.status = "running"
+    try:
+        job.result = fn(job)
+        job.status = "done"
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job.id, job.kind)
+        job.error = str(e)
+        job.status = "failed"
+    finally:
+        job.finished_at = time.monotonic()
+
+
+def _prune() -> None:
+    cutoff = time.monotonic() - JOB_RETENTION_SECONDS
+    for job_id in [j.id for j in _jobs.values() if j.finished_at and j.finished_at < cutoff]:
+        job = _jobs.pop(job_id)
+        if job.file and os.path.exists(job.file):
+            os.remove(job.file)
@@ -3,13 +3,41 @@ import base64
 import json
 import re
 import traceback
-from openai import OpenAI
 from config import OPENAI_API_KEY, OPENAI_MODEL
 import logging
 logger = logging.getLogger(__name__)
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, TYPE_CHECKING
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+_client = None
+
+
+def _new_client(api_key: str) -> "OpenAI":
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
+
+def get_client() -> "OpenAI":
+    """Shared OpenAI client. The SDK is imported on first use (or by warm_up()), not at worker start."""
+    global _client
+    if _client is None:
+        _client = _new_client(OPENAI_API_KEY)
+    return _client
+
+
+async def get_client_async() -> "OpenAI":
+    """get_client() for coroutines: the first call imports the SDK in a thread, off the event loop."""
+    if _client is None:
+        return await asyncio.to_thread(get_client)
+    return _client
+
+
+def warm_up() -> None:
+    import openai  # noqa: F401
+    if OPENAI_API_KEY:
+        get_client()
 
 def get_system_prompt(language: str) -> str:
     """Returns a system prompt that enforces content in the target language."""
@@ -79,6 +107,7 @@ async def _get_completion(messages: List[Dict[str, str]], model=OPENAI_MODEL) ->
     # ── FALLBACK TO OPENAI ───────────────────────────────────────────────────
     try:
         logger.info(f"Using OpenAI ({model}) as primary or fallback provider...")
+        client = await get_client_async()
         response = client.chat.completions.create(
             model=model,
             messages=messages,
@@ -422,6 +451,39 @@ async def generate_word_pairs(topic: str, count: int, source_lang: str = "Russia
     ])
 
 
+async def generate_material_digest(material_text: str) -> tuple:
+    """A compact structured summary of a user's material, built once and sent instead of its text."""
+    user_prompt = f"""
+    Summarize the teaching material below for a teacher who will generate games and worksheets from it.
+    Write every value in the language of the material itself.
+
+    ```
+    {material_text}
+    ```
+
+    RULES:
+    - "summary": 2-3 sentences on what the material covers
+    - "key_terms": up to 20 of its most important terms
+    - "facts": up to 15 short facts, dates, numbers or rules stated in it
+    - "definitions": up to 10 terms with a one-sentence definition taken from the text
+    - "vocabulary": up to 15 word pairs if the material teaches vocabulary (word and translation/meaning), otherwise []
+    - Use only what the material says; do not add outside knowledge
+
+    Return ONLY a JSON object:
+    {{
+        "summary": "...",
+        "key_terms": ["..."],
+        "facts": ["..."],
+        "definitions": [{{"term": "...", "definition": "..."}}],
+        "vocabulary": [{{"word": "...", "meaning": "..."}}]
+    }}
+    """
+    return await _get_completion([
+        {"role": "system", "content": "You are an expert educational content analyst. Output ONLY valid JSON, no markdown fences, no extra text."},
+        {"role": "user", "content": user_prompt}
+    ])
+
+
 # ─── Storybook generation (OpenAI fallback) ──────────────────────────────────
 
 _STORY_SYSTEM_OAI = (
@@ -490,7 +552,7 @@ def _parse_json_oai(text: str) -> Optional[dict]:
     return None
 
 
-async def _generate_dalle_image(oai_client: OpenAI, prompt: str) -> Optional[str]:
+async def _generate_dalle_image(oai_client: "OpenAI", prompt: str) -> Optional[str]:
     """Генерирует одну иллюстрацию через DALL-E 3, возвращает base64 или None."""
     full_prompt = (
         f"{prompt} "
@@ -534,7 +596,7 @@ async def generate_storybook(
         logger.error("OPENAI_API_KEY is not set")
         return None
 
-    oai_client = OpenAI(api_key=openai_api_key)
+    oai_client = await asyncio.to_thread(_new_client, openai_api_key)
 
     # ── Шаг 1: Генерация текста ──────────────────────────────────────────────
     logger.info("OpenAI fallback: generating story text with gpt-4o-mini...")
@@ -0,0 +1,376 @@
+"""
+Monthly partitions for the append-only token_usage / generation_logs tables.
+
+PostgreSQL only; every function here is a no-op on other databases. The
+tables are converted once, online, by convert_to_partitioned() (run from
+scripts/partitions.py, not by a migration: it copies every row). Maintenance keeps PARTITION_MONTHS_AHEAD future
+months created and, with PARTITION_RETENTION_MONTHS > 0, moves older months
+to zstd-compressed NDJSON files in PARTITION_ARCHIVE_DIR and drops them.
+Dashboards read usage_daily, so archiving raw rows doesn't change the stats.
+restore_partition() loads an archived month back.
+"""
+import json
+import logging
+import os
+import re
+import time
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+
+import zstandard
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from config import PARTITION_ARCHIVE_DIR, PARTITION_MONTHS_AHEAD, PARTITION_RETENTION_MONTHS
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("token_usage", "generation_logs")
+
+# pg_try_advisory_lock key: only one worker runs maintenance at a time
+_MAINTENANCE_LOCK = 72_616_001
+
+
+# ── Month arithmetic / naming ───────────────────────────────────
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def parse_partition_month(table: str, name: str) -> Optional[date]:
+    """Month of a `<table>_yYYYYmMM` partition; None for the default partition."""
+    if not name.startswith(table + "_"):
+        return None
+    suffix = name[len(table) + 1:]
+    if len(suffix) != 8 or not suffix.startswith("y") or suffix[5] != "m":
+        return None
+    try:
+        return date(int(suffix[1:5]), int(suffix[6:8]), 1)
+    except ValueError:
+        return None
+
+
+# ── Partition DDL ───────────────────────────────────────────────
+
+def is_partitioned(conn, table: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :t"),
+        {"t": table},
+    ).first() is not None
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def create_month_partition(conn, table: str, month: date, parent: Optional[str] = None) -> str:
+    """
+    `table`'s partition for `month`, attached to `parent` (default: `table`
+    itself). Rows of that month already in the DEFAULT partition — written
+    while maintenance wasn't running — are moved into it; PostgreSQL
+    refuses a plain CREATE ... PARTITION OF while they are there.
+    """
+    parent = parent or table
+    name = partition_name(table, month)
+    if _table_exists(conn, name):
+        return name
+    bounds = {"start": month, "end": add_months(month, 1)}
+    values = f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    default = f"{table}_default"
+    if _table_exists(conn, default):
+        # Held until commit: no row of the month can reach DEFAULT while its partition is being made
+        conn.execute(text(f"LOCK TABLE {default} IN ACCESS EXCLUSIVE MODE"))
+        stranded = conn.execute(text(
+            f"SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end LIMIT 1"
+        ), bounds).first()
+        if stranded:
+            conn.execute(text(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING STORAGE)"))
+            conn.execute(text(
+                f"WITH moved AS (DELETE FROM {default} WHERE created_at >= :start AND created_at < :end RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), bounds)
+            # Attaching builds the partition's indexes and primary key from the parent's
+            conn.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES {values}"))
+            logger.warning("Moved %s rows out of %s into %s", table, default, name)
+            return name
+    conn.execute(text(f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES {values}"))
+    return name
+
+
+def list_partitions(conn, table: str) -> list[tuple[str, Optional[date]]]:
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :t ORDER BY c.relname"
+    ), {"t": table}).scalars().all()
+    return [(name, parse_partition_month(table, name)) for name in rows]
+
+
+def ensure_future_partitions(engine: Engine, months_ahead: int = PARTITION_MONTHS_AHEAD) -> list[str]:
+    """Creates partitions from the current month up to `months_ahead` months ahead."""
+    created = []
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                continue
+            current = month_start(datetime.utcnow().date())
+            for offset in range(months_ahead + 1):
+                created.append(create_month_partition(conn, table, add_months(current, offset)))
+    return created
+
+
+# ── Online conversion ───────────────────────────────────────────
+
+def _temp_name(name: str) -> str:
+    return f"{name[:61]}_p"
+
+
+def _prepare_conversion(conn, table: str, new: str, months_ahead: int) -> None:
+    """
+    The partitioned twin of `table` with its indexes and foreign keys under
+    temporary names, kept in sync with `table` by a trigger from here on.
+    """
+    conn.execute(text(f"CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS INCLUDING STORAGE) PARTITION BY RANGE (created_at)"))
+    # The partition key must be part of every unique constraint
+    conn.execute(text(f"ALTER TABLE {new} ADD CONSTRAINT {_temp_name(table + '_pkey')} PRIMARY KEY (id, created_at)"))
+
+    first = conn.execute(text(f"SELECT min(created_at) FROM {table}")).scalar()
+    current = month_start(datetime.utcnow().date())
+    month = month_start(first.date()) if first else current
+    while month <= add_months(current, months_ahead):
+        create_month_partition(conn, table, month, parent=new)
+        month = add_months(month, 1)
+    conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {new} DEFAULT"))
+
+    # Every index (including ftx_* ones added by later revisions), built while the table is empty
+    indexes = conn.execute(text(
+        "SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = CAST(:t AS regclass) AND NOT i.indisprimary"
+    ), {"t": table}).all()
+    for name, definition, unique in indexes:
+        if unique:
+            raise ValueError(f"{name}: a unique index without created_at can't be partitioned")
+        definition = re.sub(rf"^CREATE INDEX {re.escape(name)} ON (ONLY )?(\S+\.)?{table} ",
+                            f"CREATE INDEX {_temp_name(name)} ON {new} ", definition)
+        conn.execute(text(definition))
+    foreign_keys = conn.execute(text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = CAST(:t AS regclass) AND contype = 'f'"
+    ), {"t": table}).all()
+    for name, definition in foreign_keys:
+        conn.execute(text(f"ALTER TABLE {new} ADD CONSTRAINT {_temp_name(name)} {definition}"))
+
+    # Writes to the old table from now on are mirrored; the copy skips rows already there
+    columns = conn.execute(text(
+        "SELECT attname FROM pg_attribute WHERE attrelid = CAST(:t AS regclass) AND attnum > 0 AND NOT attisdropped"
+    ), {"t": table}).scalars().all()
+    assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+    conn.execute(text(f"""
+        CREATE FUNCTION {new}_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {new} WHERE id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {new} SELECT (NEW).* ON CONFLICT (id, created_at) DO UPDATE SET {assignments};
+            END IF;
+            RETURN NULL;
+        END $$
+    """))
+    conn.execute(text(f"CREATE TRIGGER {new}_sync AFTER INSERT OR UPDATE OR DELETE ON {table} FOR EACH ROW EXECUTE FUNCTION {new}_sync()"))
+
+
+def _swap(conn, table: str, new: str) -> None:
+    """Replaces `table` by its partitioned twin; blocks the table only for these statements."""
+    conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+    conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    renames = conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = CAST(:t AS regclass) AND NOT i.indisprimary"
+    ), {"t": table}).scalars().all()
+    constraints = conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) AND contype IN ('p', 'f')"
+    ), {"t": table}).scalars().all()
+    # The id sequence belongs to the old table's column — move it before the drop
+    sequence = conn.execute(text(f"SELECT pg_get_serial_sequence('{table}', 'id')")).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {new}.id"))
+    conn.execute(text(f"DROP TABLE {table} CASCADE"))
+    conn.execute(text(f"DROP FUNCTION {new}_sync()"))
+    conn.execute(text(f"ALTER TABLE {new} RENAME TO {table}"))
+    for name in renames:
+        conn.execute(text(f"ALTER INDEX {_temp_name(name)} RENAME TO {name}"))
+    for name in constraints:
+        conn.execute(text(f"ALTER TABLE {table} RENAME CONSTRAINT {_temp_name(name)} TO {name}"))
+
+
+def convert_to_partitioned(
+    engine: Engine, table: str, batch_size: int = 5000, months_ahead: int = PARTITION_MONTHS_AHEAD,
+) -> int:
+    """
+    Turns `table` into a monthly-partitioned table without taking it offline.
+    A partitioned copy is filled in id-range batches, each its own short
+    transaction, while a trigger mirrors concurrent writes into it; the final
+    swap locks the table for a few catalog statements only. Safe to re-run
+    after an interruption. Returns the number of rows copied.
+    """
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"{table} is not a partitioned table")
+    if engine.dialect.name != "postgresql":
+        return 0
+    new = f"{table}_partitioned"
+    with engine.begin() as conn:
+        if is_partitioned(conn, table):
+            return 0
+        if conn.execute(text(f"SELECT 1 FROM {table} WHERE created_at IS NULL LIMIT 1")).first():
+            raise ValueError(f"{table} has rows without created_at; run `alembic upgrade head` first")
+        if not _table_exists(conn, new):
+            _prepare_conversion(conn, table, new, months_ahead)
+
+    # The trigger's creation waited for every earlier write: rows past this id are mirrored already
+    with engine.connect() as conn:
+        last_id = conn.execute(text(f"SELECT coalesce(max(id), 0) FROM {table}")).scalar()
+    copied, low = 0, 0
+    while low < last_id:
+        with engine.begin() as conn:
+            # FOR SHARE: a concurrent UPDATE/DELETE of these rows waits for this batch, then its trigger sees it
+            copied += conn.execute(text(
+                f"INSERT INTO {new} SELECT * FROM {table} WHERE id > :low AND id <= :high FOR SHARE "
+                f"ON CONFLICT DO NOTHING"
+            ), {"low": low, "high": low + batch_size}).rowcount
+        low += batch_size
+        logger.info("%s: copied up to id %d of %d", table, min(low, last_id), last_id)
+
+    for attempt in range(10):
+        try:
+            with engine.begin() as conn:
+                _swap(conn, table, new)
+            break
+        except OperationalError as exc:
+            # lock_timeout (55P03): long-running queries on the table; try again rather than queue everyone behind us
+            if getattr(exc.orig, "pgcode", None) != "55P03" or attempt == 9:
+                raise
+            logger.warning("%s: table busy, retrying the swap", table)
+            time.sleep(5)
+    logger.info("%s: partitioned (%d rows copied)", table, copied)
+    return copied
+
+
+# ── Archive files ───────────────────────────────────────────────
+
+def archive_path(archive_dir: str, table: str, month: date) -> str:
+    return os.path.join(archive_dir, table, f"{partition_name(table, month)}.ndjson.zst")
+
+
+def write_archive(path: str, lines: Iterable[str]) -> int:
+    """Writes JSON lines zstd-compressed; the file only appears once complete."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".part"
+    count = 0
+    with open(tmp_path, "wb") as raw:
+        with zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False) as out:
+            for line in lines:
+                out.write(line.encode("utf-8") + b"\n")
+                count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_archive(path: str, batch_size: int = 1000) -> Iterator[list[dict]]:
+    with open(path, "rb") as raw:
+        reader = zstandard.ZstdDecompressor().stream_reader(raw)
+        buffer, batch = b"", []
+        while chunk := reader.read(1 << 20):
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line:
+                    batch.append(json.loads(line))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+        if buffer.strip():
+            batch.append(json.loads(buffer))
+        if batch:
+            yield batch
+
+
+# ── Retention ───────────────────────────────────────────────────
+
+def archive_partitions(engine: Engine, older_than_months: int, archive_dir: str = PARTITION_ARCHIVE_DIR) -> list[str]:
+    """Dumps monthly partitions older than N months to NDJSON files, then drops them."""
+    if engine.dialect.name != "postgresql" or older_than_months <= 0:
+        return []
+    cutoff = add_months(month_start(datetime.utcnow().date()), -older_than_months)
+    archived = []
+    for table in PARTITIONED_TABLES:
+        with engine.connect() as conn:
+            if not is_partitioned(conn, table):
+                continue
+            old = [(name, month) for name, month in list_partitions(conn, table) if month and month < cutoff]
+
+        for name, month in old:
+            path = archive_path(archive_dir, table, month)
+            with engine.connect() as conn:
+                rows = conn.execution_options(stream_results=True, yield_per=2000).execute(
+                    text(f"SELECT row_to_json(t)::text FROM {name} t ORDER BY id")
+                ).scalars()
+                count = write_archive(path, rows)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+            logger.info("Archived %s (%d rows) to %s", name, count, path)
+            archived.append(path)
+    return archived
+
+
+def restore_partition(engine: Engine, table: str, month: date, archive_dir: str = PARTITION_ARCHIVE_DIR) -> int:
+    """Recreates an archived month from its NDJSON file. The file is kept."""
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"{table} is not a partitioned table")
+    month = month_start(month)
+    path = archive_path(archive_dir, table, month)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    restored = 0
+    with engine.begin() as conn:
+        create_month_partition(conn, table, month)
+        for batch in read_archive(path):
+            # json_populate_recordset maps JSON back onto the table's column types (bytea, jsonb, timestamps)
+            conn.execute(
+                text(f"INSERT INTO {table} SELECT * FROM json_populate_recordset(NULL::{table}, :rows)"),
+                {"rows": json.dumps(batch, ensure_ascii=False)},
+            )
+            restored += len(batch)
+    logger.info("Restored %d rows into %s", restored, partition_name(table, month))
+    return restored
+
+
+def run_maintenance(engine: Engine) -> None:
+    """Creates upcoming partitions and applies retention; safe to call from every worker."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _MAINTENANCE_LOCK}).scalar():
+            return
+        try:
+            ensure_future_partitions(engine)
+            if PARTITION_RETENTION_MONTHS > 0:
+                archive_partitions(engine, PARTITION_RETENTION_MONTHS)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _MAINTENANCE_LOCK})
@@ -0,0 +1,155 @@
+"""
+Password hashing service.
+
+bcrypt costs ~250 ms of CPU per call. Hashing and verification run on a
+process pool of PASSWORD_HASH_WORKERS processes, so a burst of logins
+neither blocks the event loop nor starves the request threadpool. At most
+PASSWORD_HASH_MAX_PENDING calls may be in flight; beyond that callers get
+PasswordServiceBusy (503 + Retry-After, see main.py) instead of queueing
+without bound.
+
+Hashes whose bcrypt cost differs from PASSWORD_BCRYPT_ROUNDS are flagged by
+verify_password() so the login path can store the re-hashed password.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Optional
+
+from passlib.context import CryptContext
+
+from config import PASSWORD_BCRYPT_ROUNDS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_WORKERS
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=PASSWORD_BCRYPT_ROUNDS,
+    # needs_update() is True for any other cost, lower or higher
+    bcrypt__min_rounds=PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=PASSWORD_BCRYPT_ROUNDS,
+)
+
+
+class PasswordServiceBusy(Exception):
+    pass
+
+
+# ── Worker-side functions (run in the pool processes) ───────────
+
+def _hash(password: str) -> tuple[str, float]:
+    return pwd_context.hash(password), time.time()
+
+
+def _verify(password: str, hashed: str) -> tuple[tuple[bool, Optional[str]], float]:
+    try:
+        result = pwd_context.verify_and_update(password, hashed)
+    except ValueError:  # not a hash we know (empty / legacy value)
+        result = (False, None)
+    return result, time.time()
+
+
+def _ping() -> None:
+    return None
+
+
+# ── Pool and accounting ─────────────────────────────────────────
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_stats = {"pending": 0, "max_pending": 0, "completed": 0, "rejected": 0, "wait_ms": 0.0, "max_wait_ms": 0.0}
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        return _pool
+
+
+async def warm_up() -> None:
+    """Starts the worker processes at startup, so the first logins don't pay for process creation."""
+    pool = get_pool()
+    await asyncio.gather(*(asyncio.wrap_future(pool.submit(_ping)) for _ in range(PASSWORD_HASH_WORKERS)))
+
+
+def _submit(fn, *args, limited: bool = True) -> Future:
+    pool = get_pool()
+    with _lock:
+        if limited and _stats["pending"] >= PASSWORD_HASH_MAX_PENDING:
+            _stats["rejected"] += 1
+            raise PasswordServiceBusy()
+        _stats["pending"] += 1
+        _stats["max_pending"] = max(_stats["max_pending"], _stats["pending"])
+    submitted_at = time.time()
+    future = pool.submit(fn, *args)
+    future.add_done_callback(lambda f: _finished(f, submitted_at))
+    return future
+
+
+def _finished(future: Future, submitted_at: float) -> None:
+    with _lock:
+        _stats["pending"] -= 1
+        _stats["completed"] += 1
+        if not future.cancelled() and future.exception() is None:
+            # Time spent queued behind other hashes before a worker picked it up
+            wait_ms = max(0.0, (future.result()[1] - submitted_at) * 1000)
+            _stats["wait_ms"] += wait_ms
+            _stats["max_wait_ms"] = max(_stats["max_wait_ms"], wait_ms)
+
+
+def stats() -> dict:
+    with _lock:
+        completed = _stats["completed"]
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "max_pending_allowed": PASSWORD_HASH_MAX_PENDING,
+            "pending": _stats["pending"],
+            "max_pending": _stats["max_pending"],
+            "completed": completed,
+            "rejected": _stats["rejected"],
+            "avg_wait_ms": round(_stats["wait_ms"] / completed, 1) if completed else 0.0,
+            "max_wait_ms": round(_stats["max_wait_ms"], 1),
+        }
+
+
+# ── API ─────────────────────────────────────────────────────────
+
+async def hash_password(password: str) -> str:
+    return (await asyncio.wrap_future(_submit(_hash, password)))[0]
+
+
+async def verify_password(password: str, hashed: Optional[str]) -> tuple[bool, Optional[str]]:
+    """(matches, new hash to store or None) — the new hash is set when the stored cost is outdated."""
+    if not hashed:
+        return False, None
+    return (await asyncio.wrap_future(_submit(_verify, password, hashed)))[0]
+
+
+def hash_password_sync(password: str) -> str:
+    """For sync routes: the threadpool thread waits, the CPU work happens in the pool."""
+    return _submit(_hash, password).result()[0]
+
+
+def hash_many(passwords: Iterable[str]) -> list[str]:
+    """Bulk hashing for background jobs, results in input order.
+
+    Submitted in waves of one hash per worker, so interactive logins queue
+    behind at most one wave instead of the whole batch. Not counted against
+    PASSWORD_HASH_MAX_PENDING.
+    """
+    passwords = list(passwords)
+    hashes = []
+    for start in range(0, len(passwords), PASSWORD_HASH_WORKERS):
+        wave = [_submit(_hash, p, limited=False) for p in passwords[start:start + PASSWORD_HASH_WORKERS]]
+        hashes += [f.result()[0] for f in wave]
+    return hashes
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
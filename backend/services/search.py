@@ -0,0 +1,116 @@
+"""
+Full-text search over generation history and uploaded materials.
+
+PostgreSQL: ranked tsvector search backed by the expression GIN indexes of
+revisions 0007 and 0012. The document expressions below must stay byte-for-byte the
+same as the indexed ones, otherwise the planner won't use the index — change
+both together (in a new revision). Uzbek rows use the `simple` config; the
+`russian` config stems Cyrillic words as Russian and ASCII words as English.
+The query is parsed with both configs so either kind of row matches.
+
+Other databases (SQLite in tests/dev) fall back to ILIKE.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.orm import Session
+
+from apps.generator.models import GenerationLog
+from apps.library.models import MaterialContent, UserMaterial
+
+HISTORY_DOCUMENT = (
+    "to_tsvector(CASE WHEN language = 'uz' THEN 'simple'::regconfig ELSE 'russian'::regconfig END, "
+    "coalesce(topic, '') || ' ' || coalesce(search_text, ''))"
+)
+# tsvector is capped at 1 MB — index the first 200k characters of a material's (shared) content
+CONTENT_DOCUMENT = "to_tsvector('russian', left(extracted_text, 200000))"
+# File names are per user and short: not indexed
+FILENAME_DOCUMENT = "to_tsvector('russian', coalesce(filename, ''))"
+
+_SNIPPET_OPTIONS = "MaxFragments=2, MaxWords=20, MinWords=5, StartSel=«, StopSel=»"
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _tsquery(q: str):
+    return func.websearch_to_tsquery(literal_column("'russian'::regconfig"), q).op("||")(
+        func.websearch_to_tsquery(literal_column("'simple'::regconfig"), q)
+    )
+
+
+def _like(q: str) -> str:
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def search_history(
+    db: Session,
+    user_id: int,
+    q: str,
+    generator_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> list[GenerationLog]:
+    query = db.query(GenerationLog).filter(GenerationLog.user_id == user_id)
+    if generator_type:
+        query = query.filter(GenerationLog.generator_type == generator_type)
+    # created_at bounds also prune the monthly partitions
+    if date_from:
+        query = query.filter(GenerationLog.created_at >= date_from)
+    if date_to:
+        query = query.filter(GenerationLog.created_at < date_to)
+
+    if _is_postgres(db):
+        document, tsquery = literal_column(HISTORY_DOCUMENT), _tsquery(q)
+        query = query.filter(document.op("@@")(tsquery)).order_by(
+            func.ts_rank_cd(document, tsquery).desc(), GenerationLog.created_at.desc()
+        )
+    else:
+        pattern = _like(q)
+        query = query.filter(or_(
+            GenerationLog.topic.ilike(pattern, escape="\\"),
+            GenerationLog.search_text.ilike(pattern, escape="\\"),
+        )).order_by(GenerationLog.created_at.desc())
+    return query.offset(offset).limit(limit).all()
+
+
+def search_materials(db: Session, user_id: int, q: str, limit: int = 20, offset: int = 0) -> list[dict]:
+    columns = (UserMaterial.id, UserMaterial.filename, UserMaterial.file_type, UserMaterial.char_count, UserMaterial.created_at)
+    if _is_postgres(db):
+        document, filename, tsquery = literal_column(CONTENT_DOCUMENT), literal_column(FILENAME_DOCUMENT), _tsquery(q)
+        # The text match runs on the contents' GIN index, not per row of the user's materials
+        matching = db.query(MaterialContent.id).filter(document.op("@@")(tsquery))
+        # ts_headline is expensive; PostgreSQL evaluates it only for the rows past LIMIT
+        snippet = func.ts_headline(
+            "russian", func.left(MaterialContent.extracted_text, 200000), tsquery, _SNIPPET_OPTIONS
+        ).label("snippet")
+        rows = db.query(*columns, snippet).join(MaterialContent, MaterialContent.id == UserMaterial.content_id).filter(
+            UserMaterial.user_id == user_id,
+            or_(UserMaterial.content_id.in_(matching.scalar_subquery()), filename.op("@@")(tsquery)),
+        ).order_by(
+            (func.ts_rank_cd(document, tsquery) + func.ts_rank_cd(filename, tsquery)).desc(),
+            UserMaterial.created_at.desc(),
+        )
+    else:
+        pattern = _like(q)
+        rows = db.query(*columns, func.substr(MaterialContent.extracted_text, 1, 200).label("snippet")).join(
+            MaterialContent, MaterialContent.id == UserMaterial.content_id
+        ).filter(
+            UserMaterial.user_id == user_id,
+            or_(UserMaterial.filename.ilike(pattern, escape="\\"), MaterialContent.extracted_text.ilike(pattern, escape="\\")),
+        ).order_by(UserMaterial.created_at.desc())
+    return [
+        {
+            "id": r.id,
+            "filename": r.filename,
+            "file_type": r.file_type,
+            "char_count": r.char_count,
+            "created_at": r.created_at.isoformat(),
+            "snippet": r.snippet,
+        }
+        for r in rows.offset(offset).limit(limit).all()
+    ]
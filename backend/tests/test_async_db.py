@@ -0,0 +1,68 @@
+"""
+Async database layer: driver URL mapping, the lazily created engine and
+session factory, and the get_async_db dependency.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession
+import database
+from database import to_async_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("postgresql://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+    ("postgresql+psycopg2://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+    ("postgres://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+    ("sqlite:///./app.db", "sqlite+aiosqlite:///./app.db"),
+    ("postgresql+asyncpg://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+])
+def test_async_url(url, expected):
+    assert to_async_url(url) == expected
+
+
+@pytest.fixture
+def async_layer(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)"))
+    engine.dispose()
+    monkeypatch.setattr(database, "ASYNC_DATABASE_URL", to_async_url(url))
+    monkeypatch.setattr(database, "_async_engine", None)
+    monkeypatch.setattr(database, "_AsyncSessionLocal", None)
+    yield
+    if database._async_engine is not None:
+        asyncio.run(database._async_engine.dispose())
+
+
+def test_engine_and_sessionmaker_created_once(async_layer):
+    assert database._async_engine is None  # nothing at import time
+    engine = database.get_async_engine()
+    assert engine.dialect.driver == "aiosqlite"
+    assert database.get_async_engine() is engine
+    factory = database.get_async_sessionmaker()
+    assert factory is database.get_async_sessionmaker()
+    assert factory.kw["expire_on_commit"] is False
+
+
+def test_get_async_db_yields_a_session_and_closes_it(async_layer):
+    async def run():
+        dependency = database.get_async_db()
+        db = await dependency.__anext__()
+        assert isinstance(db, AsyncSession)
+        await db.execute(text("INSERT INTO t (name) VALUES ('x')"))
+        await db.commit()
+        await db.execute(text("SELECT 1"))
+        assert db.in_transaction()
+        await dependency.aclose()
+        assert not db.in_transaction()
+        async with database.get_async_sessionmaker()() as other:
+            return (await other.execute(text("SELECT name FROM t"))).scalars().all()
+
+    assert asyncio.run(run()) == ["x"]
@@ -0,0 +1,121 @@
+"""
+Audit log: admin endpoints commit once with the audit row in the same
+transaction, buffered events are queued only after the caller commits and
+are batch-inserted by the writer.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import Base
+from apps.auth.models import User, AuditLog
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog, UsageDaily
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.admin import router as admin_router
+from services import audit as audit_module
+from services.audit import AuditWriter, audit
+
+
+@pytest.fixture
+def dbs(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'audit.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    monkeypatch.setattr(audit_module, "get_async_sessionmaker", lambda: async_sessionmaker(async_engine))
+
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    db.add(User(email="admin@example.com", hashed_password="x", role="super_admin"))
+    db.add(User(email="t@example.com", hashed_password="x", role="teacher", is_active=True))
+    db.commit()
+    db.close()
+    yield SessionLocal
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def test_admin_action_commits_once_with_inline_audit(dbs):
+    db = dbs()
+    admin = db.query(User).filter(User.role == "super_admin").one()
+    teacher = db.query(User).filter(User.role == "teacher").one()
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(session))
+
+    result = admin_router.toggle_teacher_status(teacher.id, db=db, admin=admin)
+
+    assert result["is_active"] is False
+    assert len(commits) == 1
+    log = db.query(AuditLog).one()
+    assert (log.action, log.target, log.user_id) == ("Block Teacher", "t@example.com", admin.id)
+    db.close()
+
+
+def test_buffered_events_queue_after_commit_and_flush(dbs, monkeypatch):
+    writer = AuditWriter(enabled=True, max_queue=100, flush_interval=60)
+    monkeypatch.setattr(audit_module, "audit_writer", writer)
+
+    async def run():
+        await writer.start()
+        db = dbs()
+        audit(db, "Rolled Back", "x", None)
+        db.rollback()
+        audit(db, "Bulk Block", "3 users", None, "warning")
+        assert writer.stats()["queued"] == 0  # not before the caller's commit
+        audit(db, "Delete Teacher", "t@example.com", None, "danger", critical=True)
+        db.commit()
+        assert writer.stats()["queued"] == 1
+        assert [log.action for log in db.query(AuditLog)] == ["Delete Teacher"]
+        db.close()
+        await writer.stop()
+
+    asyncio.run(run())
+
+    db = dbs()
+    assert sorted(log.action for log in db.query(AuditLog)) == ["Bulk Block", "Delete Teacher"]
+    db.close()
+    stats = writer.stats()
+    assert (stats["written"], stats["dropped"], stats["failed"], stats["queued"]) == (1, 0, 0, 0)
+    assert stats["max_flush_latency_ms"] > 0
+
+
+def test_full_queue_drops_and_counts():
+    writer = AuditWriter(enabled=True, max_queue=1, flush_interval=1)
+    writer.submit({"action": "a", "target": "x"})
+    writer.submit({"action": "b", "target": "y"})
+    assert writer.stats()["queued"] == 1
+    assert writer.dropped == 1
+
+
+def test_stop_waits_for_the_batch_in_flight(dbs, monkeypatch):
+    writer = AuditWriter(enabled=True, max_queue=100, flush_interval=0.01)
+    write = writer._write
+
+    async def run():
+        writing = asyncio.Event()
+
+        async def slow_write(batch):
+            writing.set()
+            await asyncio.sleep(0.1)
+            await write(batch)
+
+        monkeypatch.setattr(writer, "_write", slow_write)
+        await writer.start()
+        for i in range(3):
+            writer.submit({"action": f"Event {i}", "target": "x", "user_id": None, "log_type": "info"})
+        await writing.wait()
+        await writer.stop()
+
+    asyncio.run(run())
+    db = dbs()
+    assert db.query(AuditLog).count() == 3
+    db.close()
+    assert writer.written == 3
@@ -0,0 +1,75 @@
+"""
+Batch generation: variants run concurrently within a limit and the ZIP is
+streamed as they finish.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+import io
+import zipfile
+
+from apps.generator.batch_utils import run_concurrently, stream_batch_zip
+
+
+def _slow_call(state, result):
+    async def call():
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        state["done"] += 1
+        if result is None:
+            raise RuntimeError("provider failed")
+        return result, 10
+    return call
+
+
+def test_run_concurrently_respects_limit_and_survives_failures():
+    state = {"running": 0, "peak": 0, "done": 0}
+    calls = [_slow_call(state, {"n": i} if i != 3 else None) for i in range(8)]
+
+    async def run():
+        return [item async for item in run_concurrently(calls, 3)]
+
+    results = asyncio.run(run())
+    assert state["peak"] == 3
+    assert len(results) == 8
+    assert results.count((None, 0)) == 1
+    assert sorted(r["n"] for r, _ in results if r) == [0, 1, 2, 4, 5, 6, 7]
+
+
+def test_abandoned_iteration_cancels_pending_calls():
+    state = {"running": 0, "peak": 0, "done": 0}
+    calls = [_slow_call(state, {"n": i}) for i in range(6)]
+
+    async def run():
+        results = run_concurrently(calls, 2)
+        first = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0.05)
+        return first
+
+    assert asyncio.run(run())[1] == 10
+    # The calls still waiting for a slot never ran, the running ones were cancelled
+    assert state["done"] < 3
+
+
+def test_streamed_zip_is_a_valid_archive():
+    async def variants():
+        for i in range(3):
+            yield {"questions": [{"question": f"Q{i}", "options": ["a", "b"], "answer": "a"}]}
+
+    async def run():
+        chunks = [chunk async for chunk in stream_batch_zip(variants(), "quiz")]
+        return chunks
+
+    chunks = asyncio.run(run())
+    # A file per variant goes out before the archive is complete
+    assert len(chunks) == 4 and all(chunks[:3])
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["variant_1.txt", "variant_2.txt", "variant_3.txt"]
+        assert archive.read("variant_1.txt").decode().startswith("--- Variant ---")
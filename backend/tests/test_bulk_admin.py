@@ -0,0 +1,121 @@
+"""
+Bulk admin actions: one statement per action regardless of the selection
+size, subscriptions upserted, large selections run as a chunked job.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from apps.auth.models import User, AuditLog
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog, UsageDaily
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.admin import bulk
+from apps.admin import router as admin_router
+from apps.admin.schemas import BulkActionRequest
+from services import jobs
+
+
+@pytest.fixture
+def SessionLocal(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def add_teachers(db, n):
+    users = [User(email=f"t{i}@school.uz", hashed_password="x", role="teacher", is_active=True) for i in range(n)]
+    db.add_all(users)
+    db.add(User(email="admin@school.uz", hashed_password="x", role="super_admin", is_active=True))
+    db.commit()
+    return [u.id for u in users]
+
+
+def count_statements(db, fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    return result, len(statements)
+
+
+def test_subscription_actions_are_single_upserts(SessionLocal):
+    db = SessionLocal()
+    ids = add_teachers(db, 4)
+    admin_id = db.query(User.id).filter(User.role == "super_admin").scalar()
+    expires = datetime(2027, 1, 1)
+    db.add(UserSubscription(user_id=ids[0], plan="free", expires_at=expires))
+    db.add(UserSubscription(user_id=ids[1], plan="free", expires_at=None))
+    db.commit()
+
+    changed, n = count_statements(db, lambda: bulk.extend_subscription(db, ids[:3] + [admin_id], 10))
+    db.commit()
+    assert n == 1 and sorted(changed) == ids[:3]
+    subs = {s.user_id: s for s in db.query(UserSubscription)}
+    assert subs[ids[0]].expires_at == expires + timedelta(days=10)
+    assert subs[ids[1]].expires_at > datetime.utcnow() + timedelta(days=9)
+    assert subs[ids[2]].plan == "pro"
+    assert admin_id not in subs
+
+    changed, n = count_statements(db, lambda: bulk.change_plan(db, ids, "school"))
+    db.commit()
+    db.expire_all()
+    assert n == 1 and sorted(changed) == ids
+    assert {s.plan for s in db.query(UserSubscription)} == {"school"}
+    assert db.query(UserSubscription).count() == 4
+    db.close()
+
+
+def test_bulk_block_endpoint_is_one_update(SessionLocal):
+    db = SessionLocal()
+    ids = add_teachers(db, 5)
+    admin = db.query(User).filter(User.role == "super_admin").one()
+
+    result, n = count_statements(db, lambda: admin_router.bulk_block_teachers(
+        BulkActionRequest(user_ids=ids + [admin.id]), db=db, admin=admin))
+
+    assert result == {"message": "Blocked 5 teachers", "updated": 5}
+    assert n == 2  # UPDATE ... RETURNING + audit row
+    assert db.query(User).filter(User.is_active.is_(False)).count() == 5
+    assert db.query(AuditLog).one().target == "5 users"
+    db.close()
+
+
+def test_large_selection_runs_as_chunked_job(SessionLocal, monkeypatch):
+    monkeypatch.setattr(admin_router, "BULK_SYNC_LIMIT", 3)
+    monkeypatch.setattr(admin_router, "SessionLocal", SessionLocal)
+    monkeypatch.setattr(bulk, "BULK_CHUNK_SIZE", 2)
+    monkeypatch.setattr(bulk, "SessionLocal", SessionLocal)
+    db = SessionLocal()
+    ids = add_teachers(db, 7)
+    admin = db.query(User).filter(User.role == "super_admin").one()
+
+    response = admin_router.bulk_change_plan(BulkActionRequest(user_ids=ids), plan="Pro", db=db, admin=admin)
+    assert response.status_code == 202
+    job_id = json.loads(response.body)["job"]["id"]
+    for _ in range(200):
+        job = jobs.get(job_id)
+        if job.status in ("done", "failed"):
+            break
+        time.sleep(0.01)
+
+    assert job.to_dict()["status"] == "done"
+    assert (job.done, job.total, job.result) == (7, 7, {"updated": 7})
+    assert db.query(UserSubscription).filter(UserSubscription.plan == "pro").count() == 7
+    assert db.query(AuditLog).one().target == "7 users → pro"
+    assert admin_router.get_job(job_id, admin=admin)["progress"] == 1.0
+    db.close()
@@ -0,0 +1,80 @@
+"""
+Catalog cache: repeat loads run no queries, If-None-Match gets 304, and the
+writing endpoints invalidate.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import json
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+from database import Base
+import apps.auth.models, apps.admin.models, apps.classes.models, apps.gamification.models
+import apps.generator.models, apps.library.models, apps.payments.models
+from apps.admin.router import set_setting
+from apps.auth.models import User
+from apps.auth.router import get_announcement
+from apps.gamification.router import create_item, get_shop_items
+from apps.gamification.schemas import ShopItemResponse
+from services import catalog
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    Base.metadata.create_all(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    session = sessionmaker(bind=engine)()
+    session.statements = statements
+    catalog._catalogs.clear()
+    yield session
+    catalog._catalogs.clear()
+    session.close()
+    engine.dispose()
+
+
+def request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+
+def test_shop_items_cached_and_revalidated(db):
+    admin = User(email="admin@shop.uz", hashed_password="x", role="super_admin")
+    db.add(admin)
+    db.commit()
+    create_item(ShopItemResponse(name="Hat", price=10, category="avatar"), db=db, user=admin)
+
+    first = get_shop_items(request(), db=db)
+    assert first.status_code == 200 and [i["name"] for i in json.loads(first.body)] == ["Hat"]
+    queries = len(db.statements)
+
+    again = get_shop_items(request(), db=db)
+    not_modified = get_shop_items(request(f'W/"x", {first.headers["etag"]}'), db=db)
+    assert len(db.statements) == queries
+    assert again.body == first.body and again.headers["etag"] == first.headers["etag"]
+    assert not_modified.status_code == 304 and not_modified.body == b""
+
+    create_item(ShopItemResponse(name="Cape", price=20, category="avatar"), db=db, user=admin)
+    changed = get_shop_items(request(first.headers["etag"]), db=db)
+    assert changed.status_code == 200 and len(json.loads(changed.body)) == 2
+    assert changed.headers["etag"] != first.headers["etag"]
+
+
+def test_announcement_invalidated_by_setting(db):
+    admin = User(email="admin@alert.uz", hashed_password="x", role="super_admin")
+    db.add(admin)
+    db.commit()
+
+    assert json.loads(get_announcement(request(), db=db).body) == {"text": "", "enabled": False}
+    set_setting({"key": "system_alert", "value": "Maintenance at 22:00"}, db=db, admin=admin)
+    set_setting({"key": "alert_enabled", "value": "true"}, db=db, admin=admin)
+
+    response = get_announcement(request(), db=db)
+    assert json.loads(response.body) == {"text": "Maintenance at 22:00", "enabled": True}
+    assert response.headers["cache-control"] == "no-cache"
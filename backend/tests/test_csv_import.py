@@ -0,0 +1,89 @@
+"""
+CSV teacher import job: one existence check and one INSERT per batch,
+duplicates/existing emails skipped, temp passwords only in the result file.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import csv
+
+import pytest
+from passlib.hash import bcrypt
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from apps.auth.models import User, AuditLog
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog, UsageDaily
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.admin import csv_import
+from services.jobs import Job
+from services.passwords import pwd_context
+
+
+@pytest.fixture
+def SessionLocal(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(csv_import, "SessionLocal", factory)
+    monkeypatch.setattr(csv_import, "IMPORT_BATCH_SIZE", 3)
+    # One round of bcrypt per hash keeps the test fast; the pool is still used
+    monkeypatch.setattr(csv_import, "hash_many", lambda pws: [bcrypt.using(rounds=4).hash(p) for p in pws])
+    yield factory
+    engine.dispose()
+
+
+def test_import_batches_and_result_file(SessionLocal, tmp_path):
+    db = SessionLocal()
+    org = Organization(name="School 1", license_seats=10, used_seats=1)
+    db.add(org)
+    db.add(User(email="old@school.uz", hashed_password="x", role="teacher"))
+    db.commit()
+    org_id = org.id
+
+    upload = tmp_path / "teachers.csv"
+    upload.write_text(
+        "\ufeffname,email\nA,a@school.uz\nB,b@school.uz\nOld,old@school.uz\nNo email,\nA again,a@school.uz\nC,c@school.uz\n",
+        encoding="utf-8",
+    )
+    assert csv_import.count_rows(str(upload)) == 6
+    job = Job("import-csv", 6, user_id=None)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = csv_import.run_import(job, str(upload), org_id, admin_id=None)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert result == {"created": 3, "skipped": ["old@school.uz", "a@school.uz"], "errors": ["Row 5: missing email"]}
+    assert job.done == 6
+    assert not upload.exists()
+    assert sum(s.lstrip().upper().startswith("SELECT USERS.EMAIL") for s in statements) == 2  # one per batch
+    assert sum(s.lstrip().upper().startswith("INSERT INTO USERS") for s in statements) == 2
+
+    with open(job.file, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+    created = {r["email"]: r["temp_password"] for r in rows if r["status"] == "created"}
+    assert set(created) == {"a@school.uz", "b@school.uz", "c@school.uz"}
+    user = db.query(User).filter(User.email == "b@school.uz").one()
+    assert (user.role, user.organization_id, user.full_name) == ("teacher", org_id, "B")
+    assert pwd_context.verify(created["b@school.uz"], user.hashed_password)
+    db.expire_all()
+    assert db.get(Organization, org_id).used_seats == 4
+    assert db.query(AuditLog).one().target == "3 created"
+    os.remove(job.file)
+    db.close()
+
+
+def test_hash_many_uses_the_process_pool():
+    from services import passwords
+    hashes = passwords.hash_many(["one", "two", "three"])
+    assert [pwd_context.verify(p, h) for p, h in zip(["one", "two", "three"], hashes)] == [True] * 3
+    passwords.shutdown_pool()
@@ -77,3 +77,77 @@ def test_daily_cap(db):
     result = process_activity_completion(db, user.id, "math", "math1")
     assert result["xp_earned"] == DAILY_XP_LIMIT - 290
     assert result["coins_earned"] == DAILY_COINS_LIMIT - 58
+
+def test_repeats_follow_counters(db):
+    from apps.gamification.models import DailyActivityCount
+    from apps.gamification.services import DIMINISHING_RETURNS
+    user = User(email="rep@student.edu", hashed_password="pw", role="student")
+    db.add(user)
+    db.commit()
+
+    earned = [process_activity_completion(db, user.id, "quiz", "q1")["coins_earned"] for _ in range(6)]
+    assert earned == [int(COINS_PER_ACTIVITY * m) for m in DIMINISHING_RETURNS + [0.0]]
+    assert db.query(DailyProgress).filter(DailyProgress.user_id == user.id).count() == 1
+    counts = {(c.kind, c.key): c.count for c in db.query(DailyActivityCount).all()}
+    assert counts == {("activity", "q1"): 6, ("type", "quiz"): 6}
+
+def test_concurrent_completions_lose_nothing(tmp_path):
+    import threading
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'g.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=file_engine)
+    Session = sessionmaker(bind=file_engine)
+    with Session() as s:
+        user = User(email="race@student.edu", hashed_password="pw", role="student")
+        s.add(user)
+        s.commit()
+        user_id = user.id
+
+    def complete(i):
+        with Session() as s:
+            process_activity_completion(s, user_id, f"type{i % 3}", f"a{i}")
+
+    threads = [threading.Thread(target=complete, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with Session() as s:
+        profile = s.query(StudentProfile).filter(StudentProfile.user_id == user_id).one()
+        progress = s.query(DailyProgress).filter(DailyProgress.user_id == user_id).one()
+        logged = sum(tx.amount for tx in s.query(XPTransaction).filter(XPTransaction.user_id == user_id))
+        assert profile.xp == progress.total_xp_today == logged == DAILY_XP_LIMIT
+        assert profile.level == calculate_level(DAILY_XP_LIMIT)
+    file_engine.dispose()
+
+def test_batch_is_idempotent_and_scoped_to_class(db):
+    from apps.classes.models import ClassGroup
+    from apps.gamification.router import complete_activity_batch
+    from apps.gamification.schemas import ActivityBatchRequest
+    teacher = User(email="t@school.edu", hashed_password="pw", role="teacher")
+    pupils = [User(email=f"s{i}@school.edu", hashed_password="pw", role="student") for i in range(3)]
+    db.add_all([teacher, *pupils])
+    db.commit()
+    group = ClassGroup(name="5A", teacher_id=teacher.id)
+    db.add(group)
+    db.commit()
+    db.add_all([StudentProfile(user_id=p.id, xp=0, coins=0, level=1, class_group_id=group.id) for p in pupils[:2]])
+    db.commit()
+
+    req = ActivityBatchRequest(events=[
+        {"event_id": "e1", "user_id": pupils[0].id, "activity_type": "jeopardy", "activity_id": "round1"},
+        {"event_id": "e2", "user_id": pupils[1].id, "activity_type": "jeopardy", "activity_id": "round1"},
+        {"event_id": "e3", "user_id": pupils[0].id, "activity_type": "jeopardy", "activity_id": "round1"},
+        {"event_id": "e4", "user_id": pupils[2].id, "activity_type": "jeopardy", "activity_id": "round1"},
+    ])
+    first = complete_activity_batch(req, db=db, user=teacher)
+    assert [e["status"] for e in first["events"]] == ["applied", "applied", "applied", "forbidden"]
+    assert first["events"][2]["xp_earned"] == int(XP_PER_ACTIVITY * 0.7 * 1.05)
+    by_student = {s["user_id"]: s for s in first["students"]}
+    assert by_student[pupils[0].id]["xp"] == XP_PER_ACTIVITY + int(XP_PER_ACTIVITY * 0.7 * 1.05)
+
+    retry = complete_activity_batch(req, db=db, user=teacher)
+    assert [e["status"] for e in retry["events"]] == ["duplicate", "duplicate", "duplicate", "forbidden"]
+    assert [e["xp_earned"] for e in retry["events"]] == [e["xp_earned"] for e in first["events"]]
+    assert retry["students"] == []
+    assert db.query(XPTransaction).count() == 3
@@ -0,0 +1,80 @@
+"""
+GenerationLog content storage: JSON for small payloads, zstd for large ones,
+legacy JSON strings still readable.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import json
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog, Template
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.generator.storage import count_items
+from config import GENERATION_COMPRESS_THRESHOLD
+
+engine = create_engine("sqlite:///:memory:")
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def save(db, content):
+    log = GenerationLog(user_id=None, generator_type="quiz", topic="Fractions", payload=content)
+    db.add(log)
+    db.commit()
+    db.expire_all()
+    return db.query(GenerationLog).filter(GenerationLog.id == log.id).first()
+
+
+def test_small_payload_stored_as_json(db):
+    content = {"questions": [{"q": "1 + 1 = ?", "options": ["1", "2", "3", "4"], "a": "2"}]}
+    log = save(db, content)
+    assert log.content_json == content
+    assert log.content_zstd is None
+    assert log.content is None
+    assert log.item_count == 1
+    assert json.loads(log.content_text) == content
+
+
+def test_large_payload_is_compressed(db):
+    words = [{"word": f"WORD{i}", "clue": "Длинная подсказка для слова " * 3} for i in range(200)]
+    content = {"words": words}
+    assert len(json.dumps(content, ensure_ascii=False).encode()) > GENERATION_COMPRESS_THRESHOLD
+
+    log = save(db, content)
+    assert log.content_json is None
+    assert log.content_zstd is not None
+    assert len(log.content_zstd) < len(json.dumps(content, ensure_ascii=False).encode())
+    assert log.payload == content
+    assert log.item_count == 200
+
+
+def test_legacy_string_content_still_readable(db):
+    legacy = json.dumps({"problems": [{"q": "2 × 2 = ?", "a": "4"}]}, ensure_ascii=False)
+    log = GenerationLog(user_id=None, generator_type="math", topic="x", content=legacy)
+    db.add(log)
+    db.commit()
+    assert log.content_text == legacy
+    assert log.payload["problems"][0]["a"] == "4"
+
+
+def test_count_items_for_jeopardy_board():
+    board = {"categories": [{"name": "A", "questions": [{}] * 5}, {"name": "B", "questions": [{}] * 5}]}
+    assert count_items(board) == 10
+    assert count_items({"variants_count": 3}) == 3
+    assert count_items({"title": "x"}) is None
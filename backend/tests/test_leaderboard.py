@@ -0,0 +1,154 @@
+"""
+Leaderboards: scoped top-N without per-row lookups, weekly/season XP kept
+by the activity write path, "my rank" as a count of students ahead.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.classes.models import ClassGroup
+from apps.gamification.models import StudentProfile, SeasonStats
+from apps.generator.models import TokenUsage
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.gamification import leaderboard
+from apps.gamification.services import process_activity_completion, period_key, XP_PER_ACTIVITY
+from apps.gamification.router import _awardable_students, _leaderboard_scope
+from apps.classes.router import set_class_students
+from apps.classes.schemas import ClassStudentsRequest
+
+engine = create_engine("sqlite:///:memory:")
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    leaderboard._top_cache.clear()
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def add_students(db, xps, class_group_id=None):
+    ids = []
+    for i, xp in enumerate(xps):
+        user = User(email=f"s{class_group_id}-{i}@school.uz", full_name=f"Student {i}", hashed_password="x", role="student")
+        db.add(user)
+        db.flush()
+        db.add(StudentProfile(user_id=user.id, xp=xp, coins=0, level=1, class_group_id=class_group_id))
+        ids.append(user.id)
+    db.commit()
+    return ids
+
+
+def test_top_is_one_query_with_tied_ranks(db):
+    add_students(db, [50, 300, 120, 120, 10])
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        board = leaderboard.top(db, limit=4)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    assert [(r["rank"], r["xp"]) for r in board] == [(1, 300), (2, 120), (2, 120), (4, 50)]
+    assert board[0]["name"] == "Student 1"
+
+
+def test_class_scope_and_my_rank(db):
+    cls = ClassGroup(name="5A", grade="5", student_count=3)
+    db.add(cls)
+    db.commit()
+    in_class = add_students(db, [40, 90, 70], class_group_id=cls.id)
+    add_students(db, [1000, 500])
+
+    board = leaderboard.top(db, "class", cls.id)
+    assert [r["xp"] for r in board] == [90, 70, 40]
+    assert leaderboard.my_rank(db, in_class[0], "class", cls.id) == {"rank": 3, "xp": 40}
+    assert leaderboard.my_rank(db, in_class[0]) == {"rank": 5, "xp": 40}
+
+
+def test_weekly_board_follows_awarded_xp(db):
+    first, second = add_students(db, [900, 0])
+    process_activity_completion(db, second, "quiz", "q1")
+
+    assert db.query(SeasonStats).filter(SeasonStats.season_name == period_key("week")).one().total_xp == XP_PER_ACTIVITY
+    process_activity_completion(db, second, "math", "m1")
+    season = db.query(SeasonStats).filter(SeasonStats.user_id == second, SeasonStats.season_name == period_key("season")).one()
+    assert season.total_xp > XP_PER_ACTIVITY
+
+    board = leaderboard.top(db, period="week")
+    assert [r["user_id"] for r in board] == [second]  # all-time XP doesn't count this week
+    assert leaderboard.my_rank(db, first, period="week") == {"rank": 2, "xp": 0}
+
+
+def _teachers_and_classes(db):
+    a = User(email="a@school.uz", hashed_password="x", role="teacher")
+    b = User(email="b@school.uz", hashed_password="x", role="teacher")
+    db.add_all([a, b])
+    db.flush()
+    classes = [ClassGroup(name=name, grade="5", student_count=0, teacher_id=t.id) for name, t in (("A1", a), ("A2", a), ("B1", b))]
+    db.add_all(classes)
+    db.commit()
+    return a, b, classes
+
+
+def test_teachers_only_take_unassigned_students_or_their_own(db):
+    a, b, (a1, a2, b1) = _teachers_and_classes(db)
+    unassigned = add_students(db, [0, 0])
+    in_a2 = add_students(db, [0], class_group_id=a2.id)
+    in_b1 = add_students(db, [0], class_group_id=b1.id)
+    no_profile = User(email="new@school.uz", hashed_password="x", role="student")
+    db.add(no_profile)
+    db.commit()
+
+    result = set_class_students(a1.id, ClassStudentsRequest(user_ids=unassigned + in_a2 + in_b1 + [no_profile.id]), db, a)
+    assert result["students"] == 4
+    classes = dict(db.query(StudentProfile.user_id, StudentProfile.class_group_id))
+    assert classes[in_b1[0]] == b1.id
+    assert {classes[uid] for uid in unassigned + in_a2 + [no_profile.id]} == {a1.id}
+    # ...so B's students stay out of reach of A's XP awards
+    assert _awardable_students(db, a, set(in_b1)) == set()
+
+
+def test_class_leaderboard_is_for_its_teacher_and_members(db):
+    a, b, (a1, _, _) = _teachers_and_classes(db)
+    member, = add_students(db, [0], class_group_id=a1.id)
+    outsider, = add_students(db, [0])
+    users = {u.id: u for u in db.query(User)}
+
+    assert _leaderboard_scope("class", "all", a1.id, db, a) == a1.id
+    assert _leaderboard_scope("class", "all", None, db, users[member]) == a1.id
+    for user in (b, users[outsider]):
+        with pytest.raises(HTTPException) as exc:
+            _leaderboard_scope("class", "all", a1.id, db, user)
+        assert exc.value.status_code == 403
+
+
+def test_deleting_an_org_takes_its_students_off_the_org_leaderboard(db):
+    from types import SimpleNamespace
+    from apps.admin.router import delete_org
+    org = Organization(name="School 7")
+    db.add(org)
+    db.commit()
+    user = User(email="mover@school.uz", hashed_password="x", role="student", organization_id=org.id)
+    db.add(user)
+    db.commit()
+    process_activity_completion(db, user.id, "quiz", "q1")
+    assert [r["user_id"] for r in leaderboard.top(db, "org", org.id)] == [user.id]
+
+    delete_org(org.id, db, SimpleNamespace(id=None))
+    leaderboard._top_cache.clear()
+    assert db.query(StudentProfile.organization_id).filter(StudentProfile.user_id == user.id).scalar() is None
+    assert leaderboard.top(db, "org", org.id) == []
@@ -0,0 +1,155 @@
+"""
+Live sessions: rounds from generator payloads, a full game over WebSockets
+with rewards flushed through the batch completion path, and dropping a
+device that stops reading.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from database import Base, get_async_db
+import apps.auth.models, apps.admin.models, apps.classes.models, apps.gamification.models
+import apps.generator.models, apps.library.models, apps.payments.models
+from apps.auth.context import invalidate_request_context
+from apps.auth.models import User
+from apps.auth.router import create_access_token
+from apps.gamification.models import XPTransaction
+from apps.generator.models import GenerationLog
+from apps.live import hub as live_hub
+from apps.live import router as live_router
+from apps.live.rounds import build_rounds, is_correct, public_round
+
+QUIZ = {"questions": [
+    {"q": "2 + 2", "options": ["3", "4"], "a": "4"},
+    {"q": "Capital of Uzbekistan", "options": ["Tashkent", "Samarkand"], "a": "Tashkent"},
+]}
+
+
+def test_rounds_from_payloads():
+    jeopardy = build_rounds("jeopardy", {"categories": [{"name": "Math", "questions": [{"points": 200, "q": "5 x 5", "a": "25"}]}]})
+    assert jeopardy == [{"prompt": "5 x 5", "options": None, "hint": "Math", "points": 200, "answer": "25"}]
+    hangman = build_rounds("hangman", {"words": [{"word": "GRAVITY", "hint": "Force"}, {"hint": "no word"}]})
+    assert len(hangman) == 1 and "answer" not in public_round(hangman[0])
+    assert is_correct(hangman[0], "  gravity ") and not is_correct(hangman[0], None)
+    puzzle = build_rounds("math_puzzle", {"puzzles": [{"puzzle": [[2, "?", 6]], "answers": [4, 8]}]})
+    assert is_correct(puzzle[0], ["4", "8"])
+    assert build_rounds("crossword", {"words": []}) == []
+
+
+@pytest.fixture
+def live_app(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'live.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    monkeypatch.setattr(live_router, "SessionLocal", Session)
+    monkeypatch.setattr(live_router, "get_async_sessionmaker", lambda: AsyncSessionLocal)
+    app = FastAPI()
+    app.include_router(live_router.router, prefix="/api/v1")
+    app.dependency_overrides[get_async_db] = async_db
+    invalidate_request_context()
+    yield app, Session
+    invalidate_request_context()
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def _receive_until(ws, kind):
+    while True:
+        message = ws.receive_json()
+        if message["type"] == kind:
+            return message
+
+
+def test_game_over_websockets(live_app):
+    app, Session = live_app
+    with Session() as db:
+        teacher = User(email="teacher@live.uz", hashed_password="x", role="teacher")
+        student = User(email="pupil@live.uz", hashed_password="x", role="student")
+        db.add_all([teacher, student])
+        db.commit()
+        log = GenerationLog(user_id=teacher.id, generator_type="quiz", topic="Mix")
+        log.payload = QUIZ
+        db.add(log)
+        db.commit()
+        log_id, student_id = log.id, student.id
+
+    teacher_token = create_access_token({"sub": "teacher@live.uz"})
+    student_token = create_access_token({"sub": "pupil@live.uz"})
+    with TestClient(app) as client:
+        created = client.post("/api/v1/live/sessions", json={"generation_log_id": log_id},
+                              headers={"Authorization": f"Bearer {teacher_token}"})
+        assert created.status_code == 200, created.text
+        code = created.json()["code"]
+        assert client.get(f"/api/v1/live/sessions/{code}").json()["state"] == "lobby"
+
+        with client.websocket_connect(f"/api/v1/live/ws/{code}?token={teacher_token}") as host, \
+             client.websocket_connect(f"/api/v1/live/ws/{code}?token={student_token}") as pupil, \
+             client.websocket_connect(f"/api/v1/live/ws/{code}?guest_id=dev1&name=Guest") as guest:
+            assert host.receive_json()["type"] == "state"
+            assert pupil.receive_json()["you"]["key"] == f"u{student_id}"
+            assert guest.receive_json()["you"]["name"] == "Guest"
+
+            for index, (pupil_answer, guest_answer) in enumerate([("4", "4"), ("tashkent", "Samarkand")]):
+                host.send_json({"type": "next"})
+                question = _receive_until(pupil, "question")
+                assert question["index"] == index and "answer" not in question["round"]
+                _receive_until(guest, "question")
+                pupil.send_json({"type": "answer", "index": index, "answer": pupil_answer})
+                guest.send_json({"type": "answer", "index": index, "answer": guest_answer})
+                assert _receive_until(host, "answered")["count"] >= 1
+                _receive_until(host, "answered")
+                host.send_json({"type": "reveal"})
+                reveal = _receive_until(pupil, "reveal")
+                assert reveal["results"][f"u{student_id}"] is True
+
+            host.send_json({"type": "end"})
+            standings = _receive_until(pupil, "finished")["standings"]
+            assert [p["score"] for p in standings] == [200, 100]
+            rewards = _receive_until(pupil, "rewards")
+            assert rewards["xp_earned"] > 0
+
+    with Session() as db:
+        assert db.query(XPTransaction).filter(XPTransaction.user_id == student_id).count() == 2
+        assert db.query(XPTransaction).count() == 2  # guests earn nothing
+
+
+class _StalledSocket:
+    async def send_text(self, text):
+        await asyncio.Event().wait()
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_device_is_dropped():
+    async def run():
+        session = live_hub.LiveSession("123456", 1, 1, "quiz", "t", build_rounds("quiz", QUIZ))
+        stalled = _StalledSocket()
+        connection = live_hub.Connection(stalled, max_queue=2)
+        connection.start()
+        session.join(live_hub.Player(key="gslow", name="Slow"), connection)
+        for _ in range(3):
+            session.broadcast({"type": "ping"})
+        await asyncio.sleep(0)
+        return session, stalled
+
+    session, stalled = asyncio.run(run())
+    assert session.players["gslow"].connection is None
+    assert stalled.closed_with == live_hub.CLOSE_SLOW_CONSUMER
@@ -0,0 +1,152 @@
+"""
+Material digests: built once in the background and sent to generations in
+place of the material's text; raw requests and undigested materials get the
+relevant chunks.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import Base
+import apps.auth.models, apps.admin.models, apps.classes.models, apps.gamification.models
+import apps.generator.models, apps.library.models, apps.payments.models
+from apps.auth.models import User
+from apps.generator.services import get_material_context_async
+from apps.library import digest, material_index
+from apps.library.models import MaterialContent, UserMaterial
+
+
+def test_clean_and_render_digest():
+    assert digest.clean_digest("not json") is None
+    assert digest.clean_digest({"summary": "", "facts": []}) is None
+
+    cleaned = digest.clean_digest({
+        "summary": "  Про   фотосинтез. ",
+        "key_terms": ["хлорофилл", "", None, *[f"t{i}" for i in range(30)]],
+        "definitions": [{"term": "Фотосинтез", "definition": "Синтез на свету"}, {"term": "x"}],
+        "vocabulary": "oops",
+    })
+    assert cleaned["summary"] == "Про фотосинтез."
+    assert len(cleaned["key_terms"]) == 20 and cleaned["key_terms"][0] == "хлорофилл"
+    assert cleaned["definitions"] == [{"term": "Фотосинтез", "definition": "Синтез на свету"}]
+    assert cleaned["vocabulary"] == [] and cleaned["facts"] == []
+
+    text = digest.render_digest(cleaned)
+    assert text.startswith("Summary: Про фотосинтез.\nKey terms: хлорофилл; t0")
+    assert "- Фотосинтез: Синтез на свету" in text
+    assert len(digest.render_digest(cleaned, max_chars=50)) == 50
+
+
+def test_digest_is_built_once_and_replaces_text(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'digest.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(id=1, email="d@t.uz", hashed_password="x", role="teacher", tokens_used_this_month=0))
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    calls = []
+
+    async def fake_digest(text):
+        calls.append(text)
+        return {"summary": "Фотосинтез в листьях.", "key_terms": ["хлоропласт"]}, 700
+
+    monkeypatch.setattr(digest, "generate_material_digest", fake_digest)
+    monkeypatch.setattr(digest, "digest_available", lambda: True)
+    monkeypatch.setattr(digest, "get_async_sessionmaker", lambda: AsyncSessionLocal)
+
+    text = "Фотосинтез идёт в хлоропластах.\n\n" + "Другая глава. " * 200
+    user = SimpleNamespace(id=1)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            content = MaterialContent(file_type="txt", extracted_text=text, char_count=len(text))
+            material = UserMaterial(user_id=1, content=content, filename="bio.txt", file_type="txt", char_count=len(text))
+            db.add(material)
+            await db.flush()
+            await material_index.store_index(db, content.id, material_index.build_index(text))
+            await db.commit()
+
+            # No digest yet: the relevant chunks, and a build is started (only once)
+            first = await get_material_context_async(material.id, user, db, "фотосинтез")
+            assert first.startswith("Фотосинтез идёт")
+            await get_material_context_async(material.id, user, db, "фотосинтез")
+            await asyncio.gather(*digest._building.values())
+
+            assert len(calls) == 1
+            summary = await get_material_context_async(material.id, user, db, "фотосинтез")
+            assert summary == "Summary: Фотосинтез в листьях.\nKey terms: хлоропласт"
+            raw = await get_material_context_async(material.id, user, db, "фотосинтез", raw=True)
+            assert raw == first
+            # Someone else's material gives nothing
+            assert await get_material_context_async(material.id, SimpleNamespace(id=2), db, "фотосинтез") == ""
+
+            # Rebuilding a digested material is a no-op; its tokens were charged once
+            await digest.build_digest(content.id, 1)
+            assert len(calls) == 1
+            stored = await db.get(MaterialContent, content.id)
+            await db.refresh(stored)
+            assert json.loads(stored.digest)["key_terms"] == ["хлоропласт"]
+            owner = await db.get(User, 1)
+            await db.refresh(owner)
+            assert owner.tokens_used_this_month == 700
+        await async_engine.dispose()
+
+    asyncio.run(scenario())
+    engine.dispose()
+
+
+def test_unusable_digest_is_not_rebuilt_on_every_generation(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'digest.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    text = "Фотосинтез идёт в хлоропластах. " * 20
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(id=1, email="d@t.uz", hashed_password="x", role="teacher", tokens_used_this_month=0))
+        conn.execute(MaterialContent.__table__.insert().values(id=1, file_type="txt", extracted_text=text, char_count=len(text), ref_count=1))
+        conn.execute(UserMaterial.__table__.insert().values(id=1, user_id=1, content_id=1, filename="bio.txt", file_type="txt", char_count=len(text)))
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    held_during_call = []
+
+    async def fake_digest(text):
+        held_during_call.append(async_engine.pool.checkedout())
+        return "not a digest", 300
+
+    monkeypatch.setattr(digest, "generate_material_digest", fake_digest)
+    monkeypatch.setattr(digest, "digest_available", lambda: True)
+    monkeypatch.setattr(digest, "get_async_sessionmaker", lambda: AsyncSessionLocal)
+
+    async def scenario():
+        await digest.build_digest(1, 1)
+        assert held_during_call == [0]
+        async with AsyncSessionLocal() as db:
+            stored = await db.get(MaterialContent, 1)
+            assert stored.digest is None and stored.digest_failed_at is not None
+            owner = await db.get(User, 1)
+            assert owner.tokens_used_this_month == 300
+
+            # Generations fall back to the text without starting another paid build
+            for _ in range(3):
+                assert await get_material_context_async(1, SimpleNamespace(id=1), db, "фотосинтез")
+            assert not digest._building
+            await digest.build_digest(1, 1)
+            assert len(held_during_call) == 1
+
+        # After the backoff it is tried again
+        monkeypatch.setattr(digest, "MATERIAL_DIGEST_RETRY_HOURS", 0)
+        await digest.build_digest(1, 1)
+        assert len(held_during_call) == 2
+        await async_engine.dispose()
+
+    asyncio.run(scenario())
+    engine.dispose()
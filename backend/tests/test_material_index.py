@@ -0,0 +1,76 @@
+"""
+Material index: text is chunked on paragraph boundaries at upload, and a
+generation gets the chunks most relevant to its topic within the budget.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import Base
+import apps.auth.models, apps.admin.models, apps.classes.models, apps.gamification.models
+import apps.generator.models, apps.library.models, apps.payments.models
+from apps.library import material_index
+from apps.library.models import MaterialChunk, MaterialContent, MaterialTerm
+
+
+def test_chunks_and_terms():
+    paragraphs = [f"Параграф {i}. " + "слово " * 30 for i in range(40)]
+    text = "\n\n".join(paragraphs)
+    chunks = material_index.chunk_text(text, size=500)
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    # Paragraphs are never split when they fit, and nothing is lost
+    assert sum(chunk.count("Параграф") for chunk in chunks) == 40
+    assert " ".join(chunks).split() == text.split()
+
+    long_sentence = "а" * 1200
+    assert [len(c) for c in material_index.chunk_text(long_sentence, size=500)] == [500, 500, 200]
+
+    # Inflections share a stem; stopwords and numbers aren't indexed
+    assert material_index.terms("Фотосинтеза и фотосинтезом в 2024") == ["фотоси", "фотоси"]
+
+
+def test_select_context_picks_relevant_chunks(tmp_path):
+    url = f"sqlite:///{tmp_path / 'index.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    filler = [f"Глава {i}. Вводные замечания об истории науки и учебном плане. " * 8 for i in range(30)]
+    photosynthesis = "Фотосинтез идёт в хлоропластах: свет, вода и углекислый газ дают глюкозу и кислород."
+    text = "\n\n".join(filler[:20] + [photosynthesis] + filler[20:])
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            indexed = MaterialContent(file_type="txt", extracted_text=text, char_count=len(text))
+            legacy = MaterialContent(file_type="txt", extracted_text=text, char_count=len(text))
+            db.add_all([indexed, legacy])
+            await db.flush()
+            await material_index.store_index(db, indexed.id, material_index.build_index(text))
+            await db.commit()
+
+            relevant = await material_index.select_context(db, indexed.id, "Фотосинтез у растений", max_tokens=300)
+            assert photosynthesis in relevant
+            assert len(relevant) <= 300 * material_index.CHARS_PER_TOKEN
+            assert not relevant.startswith("Глава 0.")
+
+            # No topic, no matching term, or a content indexed before the index existed: the beginning
+            for content_id, query in ((indexed.id, ""), (indexed.id, "квантовая механика"), (legacy.id, "фотосинтез")):
+                head = await material_index.select_context(db, content_id, query, max_tokens=100)
+                assert head == text[:400]
+
+            # Re-indexing replaces the old rows
+            await material_index.store_index(db, indexed.id, material_index.build_index(photosynthesis))
+            await db.commit()
+            assert (await db.execute(select(func.count(MaterialChunk.id)))).scalar() == 1
+            terms = (await db.execute(select(func.count(MaterialTerm.id)))).scalar()
+            assert terms == len(set(material_index.terms(photosynthesis)))
+        await async_engine.dispose()
+
+    asyncio.run(scenario())
+    engine.dispose()
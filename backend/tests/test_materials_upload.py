@@ -0,0 +1,175 @@
+"""
+Material upload: the size cap is enforced while the body streams in,
+extraction runs on the process pool and stops at the character budget, and
+identical files share one content.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+import io
+from types import SimpleNamespace
+
+import docx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.requests import Request
+from database import Base, get_async_db, get_db
+import apps.auth.models, apps.admin.models, apps.classes.models, apps.gamification.models
+import apps.generator.models, apps.library.models, apps.payments.models
+from apps.auth.context import get_request_context
+from apps.auth.dependencies import get_current_user
+from apps.auth.models import User
+from apps.library import extraction
+from apps.library import materials_router
+from apps.library.models import MaterialChunk, MaterialContent, UserMaterial
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    yield
+    extraction.shutdown_pool()
+
+
+def test_extraction_stops_at_budget():
+    consumed = []
+
+    def parts():
+        for i in range(1000):
+            consumed.append(i)
+            yield "x" * 99
+
+    assert len(extraction._take(parts(), 1000)) == 1000
+    assert len(consumed) == 11
+
+    assert extraction.extract_text("txt", "й".encode() * 50_000, 100) == "й" * 100
+
+    document = docx.Document()
+    for i in range(500):
+        document.add_paragraph(f"Параграф {i} " + "слово " * 20)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    text, index = asyncio.run(extraction.extract("docx", buffer.getvalue(), 2000))
+    assert len(text) == 2000 and text.startswith("Параграф 0 ")
+    assert index[0][0].startswith("Параграф 0 ") and "Параграф 15" in index[-1][0]
+
+    with pytest.raises(extraction.ExtractionError):
+        extraction.extract_text("pdf", b"not a pdf", 100)
+
+
+@pytest.fixture
+def client(tmp_path):
+    url = f"sqlite:///{tmp_path / 'materials.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": 1, "email": "m@t.uz", "hashed_password": "x", "role": "teacher"},
+            {"id": 2, "email": "n@t.uz", "hashed_password": "x", "role": "teacher"},
+        ])
+    Session = sessionmaker(bind=engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(materials_router.router, prefix="/api/v1")
+    app.dependency_overrides[get_async_db] = async_db
+    app.dependency_overrides[get_request_context] = lambda: SimpleNamespace(id=1, plan="free")
+
+    def sync_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = sync_db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1)
+    with TestClient(app) as c:
+        c.session = Session
+        yield c
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def test_upload_extracts_and_caps_size(client):
+    ok = client.post("/api/v1/materials/upload", files={"file": ("notes.txt", "Фотосинтез " * 2000, "text/plain")})
+    assert ok.status_code == 200, ok.text
+    # The whole text is kept (and indexed), not just a prompt-sized prefix
+    assert ok.json()["char_count"] == len("Фотосинтез " * 2000)
+
+    too_big = client.post("/api/v1/materials/upload", files={"file": ("big.txt", b"a" * (materials_router.MAX_FILE_SIZE + 1), "text/plain")})
+    assert too_big.status_code == 413
+
+    bad_type = client.post("/api/v1/materials/upload", files={"file": ("run.exe", b"MZ", "application/octet-stream")})
+    assert bad_type.status_code == 422
+
+
+def test_stream_is_cut_off_without_content_length():
+    chunks_sent = []
+
+    head = b'--xyz\r\nContent-Disposition: form-data; name="file"; filename="big.txt"\r\nContent-Type: text/plain\r\n\r\n'
+
+    async def receive():
+        chunks_sent.append(1)
+        body = head if len(chunks_sent) == 1 else b"a" * 1024 * 1024
+        return {"type": "http.request", "body": body, "more_body": True}
+
+    request = Request({
+        "type": "http", "method": "POST", "path": "/", "query_string": b"",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=xyz")],
+    }, receive)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(materials_router._read_upload(request))
+    assert error.value.status_code == 413
+    assert len(chunks_sent) <= materials_router.MAX_FILE_SIZE // (1024 * 1024) + 2
+
+
+def test_identical_files_share_one_content(client, monkeypatch):
+    extracted = []
+    extract = extraction.extract
+
+    async def counting_extract(*args):
+        extracted.append(args[0])
+        return await extract(*args)
+
+    monkeypatch.setattr(extraction, "extract", counting_extract)
+    body = ("Учебник. " * 300).encode()
+
+    first = client.post("/api/v1/materials/upload", files={"file": ("book.txt", body, "text/plain")})
+    client.app.dependency_overrides[get_request_context] = lambda: SimpleNamespace(id=2, plan="free")
+    second = client.post("/api/v1/materials/upload", files={"file": ("мой учебник.txt", body, "text/plain")})
+    other = client.post("/api/v1/materials/upload", files={"file": ("other.txt", b"other text", "text/plain")})
+    assert first.status_code == second.status_code == other.status_code == 200
+    assert second.json()["char_count"] == first.json()["char_count"] == len(body.decode())
+    assert second.json()["filename"] == "мой учебник.txt"
+    # The second upload of the same bytes was neither parsed nor indexed again
+    assert len(extracted) == 2
+
+    with client.session() as db:
+        shared = db.query(UserMaterial).filter(UserMaterial.id == first.json()["id"]).one().content
+        assert shared.ref_count == 2
+        assert db.query(func.count(MaterialContent.id)).scalar() == 2
+        chunks = db.query(func.count(MaterialChunk.id)).filter(MaterialChunk.content_id == shared.id).scalar()
+        assert chunks > 0
+
+    # Each owner deletes their own copy; the content goes with the last reference
+    assert client.delete(f"/api/v1/materials/{first.json()['id']}").status_code == 200
+    with client.session() as db:
+        assert db.get(MaterialContent, shared.id).ref_count == 1
+    client.app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=2)
+    assert client.delete(f"/api/v1/materials/{second.json()['id']}").status_code == 200
+    with client.session() as db:
+        assert db.get(MaterialContent, shared.id) is None
+        assert db.query(func.count(MaterialChunk.id)).filter(MaterialChunk.content_id == shared.id).scalar() == 0
+        assert db.query(func.count(MaterialContent.id)).scalar() == 1
@@ -0,0 +1,51 @@
+"""
+Alembic migrations: upgrade head on an empty database yields exactly the
+schema the models describe, and re-runs on a create_all() database.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from pathlib import Path
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+from database import Base
+import apps.auth.models, apps.admin.models, apps.classes.models, apps.gamification.models
+import apps.generator.models, apps.library.models, apps.payments.models
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def upgrade(url, monkeypatch):
+    monkeypatch.setattr("config.DATABASE_URL", url)
+    cfg = Config(str(BACKEND_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    command.upgrade(cfg, "head")
+
+
+def schema_diff(url):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+    engine.dispose()
+    return diff
+
+
+def test_upgrade_head_matches_models(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    upgrade(url, monkeypatch)
+    assert schema_diff(url) == []
+
+
+def test_upgrade_on_existing_create_all_database(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    upgrade(url, monkeypatch)
+    assert schema_diff(url) == []
@@ -0,0 +1,104 @@
+"""
+Org statistics: one round-trip regardless of school size, and the org-wide
+token limit is a single set-based UPDATE.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog, Template, UsageDaily
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.admin import router as admin_router
+
+engine = create_engine("sqlite:///:memory:")
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    admin_router._org_stats_cache.clear()
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def make_school(db, teachers):
+    org = Organization(name="School 1", contact_person="Director", license_seats=500,
+                       expires_at=datetime.utcnow() + timedelta(days=365))
+    db.add(org)
+    db.commit()
+    today = datetime.utcnow().date()
+    for i in range(teachers):
+        user = User(email=f"t{i}@school.uz", hashed_password="x", role="teacher", organization_id=org.id,
+                    last_active_at=datetime.utcnow() - timedelta(days=i))
+        db.add(user)
+        db.flush()
+        db.add(UsageDaily(user_id=user.id, organization_id=org.id, feature="quiz", day=today, generations=i, tokens=100))
+        db.add(UsageDaily(user_id=user.id, organization_id=org.id, feature="quiz", day=today - timedelta(days=40),
+                          generations=50, tokens=100))
+    db.add(User(email="other@school.uz", hashed_password="x", role="teacher"))
+    db.commit()
+    return org.id
+
+
+def count_queries(db, fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return result, len(statements)
+
+
+def test_org_stats_single_round_trip(db):
+    org_id = make_school(db, teachers=12)
+    stats, queries = count_queries(db, lambda: admin_router.get_org_stats(org_id, db=db, admin=None))
+
+    assert queries == 1
+    assert stats.total_teachers == 12
+    assert stats.total_generations == sum(range(12))  # 40-day-old rows are outside the window
+    assert stats.active_last_7_days == 7
+    assert [t.generations_30d for t in stats.teachers] == list(range(12))
+
+    # Served from the cache on the next call
+    _, queries = count_queries(db, lambda: admin_router.get_org_stats(org_id, db=db, admin=None))
+    assert queries == 0
+
+
+def test_org_stats_empty_and_missing_org(db):
+    org = Organization(name="Empty", contact_person="x", expires_at=datetime.utcnow() + timedelta(days=30))
+    db.add(org)
+    db.commit()
+    stats = admin_router.get_org_stats(org.id, db=db, admin=None)
+    assert (stats.total_teachers, stats.total_generations, stats.teachers) == (0, 0, [])
+
+    with pytest.raises(HTTPException) as exc:
+        admin_router.get_org_stats(999, db=db, admin=None)
+    assert exc.value.status_code == 404
+
+
+def test_set_org_token_limit_updates_only_org_members(db):
+    org_id = make_school(db, teachers=3)
+    admin = User(email="admin@x.uz", hashed_password="x", role="super_admin")
+    db.add(admin)
+    db.commit()
+
+    result = admin_router.set_org_token_limit(org_id, {"tokens_limit": 5000}, db=db, admin=admin)
+    assert result == {"updated": 3, "tokens_limit": 5000}
+    limits = dict(db.query(User.email, User.tokens_limit).all())
+    assert {limits[f"t{i}@school.uz"] for i in range(3)} == {5000}
+    assert limits["other@school.uz"] != 5000
@@ -0,0 +1,148 @@
+"""
+Partition helpers: month naming/arithmetic, the NDJSON archive format, and
+no-op behaviour on SQLite. The PostgreSQL DDL tests run against the
+throwaway database in TEST_POSTGRES_URL (its public schema is wiped).
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import json
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, text
+from database import Base
+import apps.auth.models, apps.admin.models, apps.classes.models, apps.gamification.models
+import apps.generator.models, apps.library.models, apps.payments.models
+from services import partitions
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+postgres = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+
+def test_month_arithmetic_and_names():
+    assert partitions.add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert partitions.add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    name = partitions.partition_name("generation_logs", date(2026, 3, 1))
+    assert name == "generation_logs_y2026m03"
+    assert partitions.parse_partition_month("generation_logs", name) == date(2026, 3, 1)
+    assert partitions.parse_partition_month("generation_logs", "generation_logs_default") is None
+    assert partitions.parse_partition_month("token_usage", name) is None
+
+
+def test_archive_round_trip(tmp_path):
+    rows = [{"id": i, "topic": f"Дроби {i}", "content_zstd": "\\x28b52ffd", "content_json": {"q": [i]}} for i in range(2500)]
+    path = partitions.archive_path(str(tmp_path), "generation_logs", date(2025, 3, 1))
+    assert partitions.write_archive(path, (json.dumps(r, ensure_ascii=False) for r in rows)) == 2500
+    assert path.endswith("generation_logs/generation_logs_y2025m03.ndjson.zst")
+    assert not os.path.exists(path + ".part")
+
+    batches = list(partitions.read_archive(path, batch_size=1000))
+    assert [len(b) for b in batches] == [1000, 1000, 500]
+    assert [r for b in batches for r in b] == rows
+
+
+def test_maintenance_is_noop_on_sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'p.db'}")
+    partitions.run_maintenance(engine)
+    assert partitions.ensure_future_partitions(engine) == []
+    assert partitions.archive_partitions(engine, 6, str(tmp_path)) == []
+
+
+@pytest.fixture
+def pg_engine():
+    engine = create_engine(POSTGRES_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, email, hashed_password, role) VALUES (1, 't@example.com', 'x', 'teacher')"))
+    yield engine
+    engine.dispose()
+
+
+def _add_logs(conn, ages_in_days):
+    for age in ages_in_days:
+        conn.execute(text(
+            "INSERT INTO generation_logs (user_id, generator_type, topic, created_at, is_favorite) "
+            "VALUES (1, 'quiz', :topic, :created_at, 0)"
+        ), {"topic": f"age {age}", "created_at": datetime.utcnow() - timedelta(days=age)})
+
+
+def _logs(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT id, topic, is_favorite FROM generation_logs ORDER BY id")).all()
+
+
+@postgres
+def test_convert_to_partitioned_keeps_rows_names_and_concurrent_writes(pg_engine, monkeypatch):
+    with pg_engine.begin() as conn:
+        _add_logs(conn, range(0, 400, 7))
+    swap = partitions._swap
+
+    def swap_after_writes(conn, table, new):
+        # Writes landing between the copy and the swap reach the new table through the trigger
+        with pg_engine.begin() as writer:
+            _add_logs(writer, [0])
+            writer.execute(text("UPDATE generation_logs SET is_favorite = 1 WHERE id = 1"))
+            writer.execute(text("DELETE FROM generation_logs WHERE id = 2"))
+        expected.extend(_logs(pg_engine))
+        swap(conn, table, new)
+
+    expected = []
+    monkeypatch.setattr(partitions, "_swap", swap_after_writes)
+    assert partitions.convert_to_partitioned(pg_engine, "generation_logs", batch_size=10) == 58
+
+    assert _logs(pg_engine) == expected
+    with pg_engine.connect() as conn:
+        assert partitions.is_partitioned(conn, "generation_logs")
+        assert len(partitions.list_partitions(conn, "generation_logs")) > 12
+        indexes = set(conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'generation_logs'")).scalars())
+        assert indexes == {"generation_logs_pkey", "ix_generation_logs_id", "ix_generation_logs_user_id", "idx_generation_logs_created_at"}
+        assert conn.execute(text("SELECT pg_get_serial_sequence('generation_logs', 'id')")).scalar()
+    # Converting again is a no-op
+    assert partitions.convert_to_partitioned(pg_engine, "generation_logs") == 0
+
+
+@postgres
+def test_rows_in_default_partition_move_to_their_month(pg_engine):
+    partitions.convert_to_partitioned(pg_engine, "generation_logs", months_ahead=1)
+    # Maintenance lapsed: a row for a month without a partition lands in DEFAULT
+    with pg_engine.begin() as conn:
+        _add_logs(conn, [-100])
+    month = partitions.month_start((datetime.utcnow() + timedelta(days=100)).date())
+    name = partitions.partition_name("generation_logs", month)
+
+    created = partitions.ensure_future_partitions(pg_engine, months_ahead=5)
+    assert name in created
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM generation_logs_default")).scalar() == 0
+        assert conn.execute(text(f"SELECT topic FROM {name}")).scalars().all() == ["age -100"]
+        # The moved partition got the parent's indexes on attach, like the others
+        index_count = "SELECT count(*) FROM pg_indexes WHERE tablename = :t"
+        current = partitions.partition_name("generation_logs", partitions.month_start(datetime.utcnow().date()))
+        assert conn.execute(text(index_count), {"t": name}).scalar() == conn.execute(text(index_count), {"t": current}).scalar()
+    # The next run finds everything in place
+    assert partitions.ensure_future_partitions(pg_engine, months_ahead=5) == created
+
+
+@postgres
+def test_archive_and_restore_month(pg_engine, tmp_path):
+    with pg_engine.begin() as conn:
+        _add_logs(conn, range(0, 400, 7))
+    partitions.convert_to_partitioned(pg_engine, "generation_logs")
+    before = _logs(pg_engine)
+
+    archived = partitions.archive_partitions(pg_engine, 6, str(tmp_path))
+    assert archived and all(os.path.exists(path) for path in archived)
+    cutoff = partitions.add_months(partitions.month_start(datetime.utcnow().date()), -6)
+    with pg_engine.connect() as conn:
+        months = [month for _, month in partitions.list_partitions(conn, "generation_logs") if month]
+    assert min(months) == cutoff
+
+    for path in archived:
+        month = partitions.parse_partition_month("generation_logs", os.path.basename(path).split(".")[0])
+        partitions.restore_partition(pg_engine, "generation_logs", month, str(tmp_path))
+    assert _logs(pg_engine) == before
@@ -0,0 +1,84 @@
+"""
+Password service: hashing/verification on the process pool, bounded
+admission, and rehash-on-login when the bcrypt cost changes.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+
+import pytest
+from passlib.hash import bcrypt
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.requests import Request
+from database import Base
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.auth import router as auth_router
+from apps.auth.schemas import UserLogin
+from rate_limiter import limiter
+from services import passwords
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    yield
+    passwords.shutdown_pool()
+
+
+def test_verify_flags_outdated_cost():
+    old_hash = bcrypt.using(rounds=4).hash("secret")
+
+    async def run():
+        return (
+            await passwords.verify_password("secret", old_hash),
+            await passwords.verify_password("wrong", old_hash),
+            await passwords.verify_password("secret", ""),
+        )
+
+    (ok, new_hash), (bad, none_hash), (empty, _) = asyncio.run(run())
+    assert ok and not bad and not empty and none_hash is None
+    assert new_hash.startswith(f"$2b${passwords.PASSWORD_BCRYPT_ROUNDS}$")
+    assert passwords.pwd_context.verify("secret", new_hash)
+    assert passwords.stats()["completed"] >= 2
+
+
+def test_admission_is_bounded(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_MAX_PENDING", 0)
+    rejected = passwords.stats()["rejected"]
+    with pytest.raises(passwords.PasswordServiceBusy):
+        passwords.hash_password_sync("secret")
+    assert passwords.stats()["rejected"] == rejected + 1
+    assert passwords.stats()["pending"] == 0
+
+
+def test_login_rehashes_outdated_password(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'auth.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+    monkeypatch.setattr(limiter, "enabled", False)
+    request = Request({"type": "http", "method": "POST", "path": "/api/v1/auth/login", "headers": []})
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            db.add(User(email="t@school.uz", hashed_password=bcrypt.using(rounds=4).hash("secret"), role="teacher"))
+            await db.commit()
+        async with AsyncSessionLocal() as db:
+            token = await auth_router.login(request, UserLogin(email="t@school.uz", password="secret"), db=db)
+        async with AsyncSessionLocal() as db:
+            stored = (await db.get(User, token["user"].id)).hashed_password
+        await async_engine.dispose()
+        return token, stored
+
+    token, stored = asyncio.run(run())
+    engine.dispose()
+    assert token["token_type"] == "bearer"
+    assert stored.startswith(f"$2b${passwords.PASSWORD_BCRYPT_ROUNDS}$")
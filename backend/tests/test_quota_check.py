@@ -96,3 +96,13 @@ def test_increment_updates_usage(db):
     increment_token_usage(user, 500, db)
     db.refresh(user)
     assert user.tokens_used_this_month == 600
+
+
+def test_expired_subscription_downgrades_and_stale_quota_resets(db):
+    from datetime import datetime, timedelta
+    user = make_teacher(db, email="expired@test.com", tokens_used=90000, tokens_limit=100000)
+    user.tokens_reset_at = datetime.utcnow() - timedelta(days=40)
+    db.add(UserSubscription(user_id=user.id, plan="pro", expires_at=datetime.utcnow() - timedelta(days=1)))
+    db.commit()
+    check_token_quota(user, db)
+    assert (user.tokens_limit, user.tokens_used_this_month) == (30000, 0)
@@ -0,0 +1,143 @@
+"""
+Post-generation write path: usage, history and quota land in one transaction,
+and the buffered writer flushes queued records in batches.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import Base
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog, Template, UsageDaily
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.generator import recorder
+from apps.generator.recorder import record_generation, GenerationWriteBuffer
+
+
+@pytest.fixture
+def dbs(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'rec.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+    monkeypatch.setattr(recorder, "get_async_sessionmaker", lambda: AsyncSessionLocal)
+
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    db.add(User(email="t@example.com", hashed_password="x", role="teacher", tokens_limit=1000, tokens_used_this_month=100))
+    db.commit()
+    yield SessionLocal, AsyncSessionLocal
+    db.close()
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def load_user(SessionLocal):
+    db = SessionLocal()
+    user = db.query(User).first()
+    db.expunge(user)
+    db.close()
+    return user
+
+
+def test_record_generation_writes_everything_in_one_commit(dbs):
+    SessionLocal, AsyncSessionLocal = dbs
+    user = load_user(SessionLocal)
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await record_generation(db, user, "quiz", 250, topic="Fractions", content={"questions": [{}, {}]}, language="ru")
+
+    asyncio.run(run())
+    db = SessionLocal()
+    assert db.query(User).first().tokens_used_this_month == 350
+    usage = db.query(TokenUsage).one()
+    assert (usage.feature_name, usage.tokens_total) == ("quiz", 250)
+    log = db.query(GenerationLog).one()
+    assert log.generator_type == "quiz" and log.item_count == 2
+    db.close()
+
+
+def test_buffer_flushes_batch_and_aggregates_quota(dbs):
+    SessionLocal, AsyncSessionLocal = dbs
+    user = load_user(SessionLocal)
+    buffer = GenerationWriteBuffer(enabled=True, max_batch=50, max_queue=100, flush_interval=0.05)
+
+    async def run():
+        await buffer.start()
+        for i in range(5):
+            assert buffer.submit(recorder._build_record(user, "math", 10, 0, None, f"t{i}", {"problems": []}, None, None))
+        await buffer.stop()
+
+    asyncio.run(run())
+    db = SessionLocal()
+    assert buffer.flushed == 5 and buffer.failed == 0
+    assert db.query(TokenUsage).count() == 5
+    assert db.query(GenerationLog).count() == 5
+    assert db.query(User).first().tokens_used_this_month == 150
+    rollup = db.query(UsageDaily).one()
+    assert (rollup.feature, rollup.generations, rollup.tokens) == ("math", 5, 50)
+    db.close()
+
+
+def test_daily_rollup_accumulates_across_writes(dbs):
+    SessionLocal, AsyncSessionLocal = dbs
+    user = load_user(SessionLocal)
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await record_generation(db, user, "quiz", 100, content={"questions": []}, buffered=False)
+            await record_generation(db, user, "quiz", 40, content={"questions": []}, buffered=False)
+            await record_generation(db, user, "crossword", 0, content={"words": []}, buffered=False)
+
+    asyncio.run(run())
+    db = SessionLocal()
+    rows = {r.feature: (r.generations, r.tokens) for r in db.query(UsageDaily).all()}
+    assert rows == {"quiz": (2, 140), "crossword": (1, 0)}
+    assert db.query(User).first().last_active_at is not None
+    db.close()
+
+
+def test_disabled_buffer_rejects_records():
+    buffer = GenerationWriteBuffer(enabled=False, max_batch=10, max_queue=10, flush_interval=0.1)
+    asyncio.run(buffer.start())
+    assert buffer.submit({}) is False
+
+
+def test_stop_flushes_the_batch_in_flight(dbs, monkeypatch):
+    SessionLocal, AsyncSessionLocal = dbs
+    user = load_user(SessionLocal)
+    buffer = GenerationWriteBuffer(enabled=True, max_batch=3, max_queue=100, flush_interval=0.01)
+    write = recorder._write
+
+    async def run():
+        writing = asyncio.Event()
+
+        async def slow_write(db, records):
+            writing.set()
+            await asyncio.sleep(0.1)
+            await write(db, records)
+
+        monkeypatch.setattr(recorder, "_write", slow_write)
+        await buffer.start()
+        for i in range(7):
+            assert buffer.submit(recorder._build_record(user, "math", 10, 0, None, f"t{i}", {"problems": []}, None, None))
+        # Shut down while the first batch is being written and the rest is still queued
+        await writing.wait()
+        await buffer.stop()
+
+    asyncio.run(run())
+    db = SessionLocal()
+    assert buffer.flushed == 7 and buffer.failed == 0
+    assert db.query(TokenUsage).count() == 7
+    assert db.query(User).first().tokens_used_this_month == 170
+    db.close()
@@ -0,0 +1,108 @@
+"""
+Request context for AI routes: one joined query, TTL cache, invalidation.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import Base
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog, Template
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.auth.context import get_request_context, invalidate_request_context
+from apps.auth.router import create_access_token
+from services.cache import TTLCache
+
+
+@pytest.fixture
+def async_db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'ctx.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    org = Organization(name="School 1", custom_gemini_key="org-key")
+    db.add(org)
+    db.flush()
+    user = User(email="ctx@example.com", hashed_password="x", role="teacher", organization_id=org.id)
+    db.add(user)
+    db.flush()
+    db.add(UserSubscription(user_id=user.id, plan="pro", expires_at=datetime.utcnow() + timedelta(days=10)))
+    db.commit()
+    db.close()
+
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    invalidate_request_context()
+    yield async_sessionmaker(async_engine, expire_on_commit=False), statements
+    invalidate_request_context()
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def resolve(AsyncSessionLocal, token):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await get_request_context(SimpleNamespace(state=SimpleNamespace()), token, db)
+    return asyncio.run(run())
+
+
+def test_context_loaded_in_one_query_then_cached(async_db):
+    AsyncSessionLocal, statements = async_db
+    token = create_access_token({"sub": "ctx@example.com"})
+
+    ctx = resolve(AsyncSessionLocal, token)
+    assert (ctx.plan, ctx.custom_gemini_key) == ("pro", "org-key")
+    assert len(statements) == 1
+
+    resolve(AsyncSessionLocal, token)
+    assert len(statements) == 1  # cache hit
+
+    invalidate_request_context([ctx.id])
+    resolve(AsyncSessionLocal, token)
+    assert len(statements) == 2
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(ttl=0.05, maxsize=2)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert len(cache) == 2 and cache.get("a") is None
+
+
+def test_role_and_org_changes_drop_the_cached_context(async_db, tmp_path):
+    from apps.admin.router import delete_org, promote_to_org_admin
+
+    AsyncSessionLocal, _ = async_db
+    token = create_access_token({"sub": "ctx@example.com"})
+    assert resolve(AsyncSessionLocal, token).role == "teacher"
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'ctx.db'}")
+    db = sessionmaker(bind=engine)()
+    admin = SimpleNamespace(id=None)
+    user = db.query(User).filter(User.email == "ctx@example.com").one()
+    promote_to_org_admin(user.id, db, admin)
+    assert resolve(AsyncSessionLocal, token).role == "org_admin"
+
+    delete_org(user.organization_id, db, admin)
+    ctx = resolve(AsyncSessionLocal, token)
+    assert (ctx.organization_id, ctx.custom_gemini_key) == (None, None)
+    db.close()
+    engine.dispose()
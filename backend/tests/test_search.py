@@ -0,0 +1,86 @@
+"""
+History / materials search: the text extracted from generation payloads,
+and the ILIKE fallback used on SQLite (PostgreSQL runs the tsvector path).
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.classes.models import ClassGroup
+from apps.gamification.models import StudentProfile
+from apps.generator.models import GenerationLog
+from apps.generator.storage import extract_search_text
+from apps.library.models import MaterialContent, UserMaterial, SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from services.search import search_history, search_materials
+
+engine = create_engine("sqlite:///:memory:")
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def add_user(db, email="t@school.uz"):
+    user = User(email=email, full_name="Teacher", hashed_password="x", role="teacher")
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def add_log(db, user_id, topic, payload, generator_type="quiz", created_at=None):
+    log = GenerationLog(user_id=user_id, generator_type=generator_type, topic=topic, created_at=created_at or datetime.utcnow())
+    log.payload = payload
+    db.add(log)
+    db.commit()
+    return log.id
+
+
+def test_extract_search_text_walks_payload_in_order():
+    payload = {"title": "Дроби", "questions": [{"q": "1/2 + 1/4?", "options": ["3/4", "2/6"], "answer": 0}]}
+    assert extract_search_text(payload) == "Дроби 1/2 + 1/4? 3/4 2/6"
+    assert extract_search_text({"problems": [{"answer": 4}]}) is None
+    assert len(extract_search_text(["слово " * 100] * 100, limit=500)) == 500
+
+
+def test_search_history_matches_payload_text_and_filters(db):
+    user_id = add_user(db)
+    other_id = add_user(db, "other@school.uz")
+    fractions = add_log(db, user_id, "Математика", {"questions": [{"q": "Сложите дроби 1/2 и 1/3"}]})
+    add_log(db, user_id, "Дроби", {"words": ["дроби", "числитель"]}, generator_type="crossword", created_at=datetime(2025, 1, 10))
+    add_log(db, user_id, "История", {"questions": [{"q": "Когда основан Самарканд?"}]})
+    add_log(db, other_id, "Дроби", {"questions": [{"q": "дроби"}]})
+
+    found = search_history(db, user_id, "дроби")
+    assert {log.topic for log in found} == {"Математика", "Дроби"}
+    assert [log.id for log in search_history(db, user_id, "дроби", generator_type="quiz")] == [fractions]
+    assert [log.id for log in search_history(db, user_id, "дроби", date_from=datetime(2025, 6, 1))] == [fractions]
+    assert search_history(db, user_id, "100%") == []
+
+
+def test_search_materials_returns_snippets(db):
+    user_id = add_user(db)
+    for filename, text in (("fractions.txt", "Дроби: числитель и знаменатель."), ("history.txt", "Самарканд")):
+        content = MaterialContent(file_type="txt", extracted_text=text, char_count=len(text))
+        db.add(UserMaterial(user_id=user_id, content=content, filename=filename, file_type="txt", char_count=len(text)))
+    db.commit()
+
+    results = search_materials(db, user_id, "знаменатель")
+    assert [r["filename"] for r in results] == ["fractions.txt"]
+    assert results[0]["snippet"].startswith("Дроби")
+    assert [r["filename"] for r in search_materials(db, user_id, "history")] == ["history.txt"]
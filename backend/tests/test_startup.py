@@ -0,0 +1,62 @@
+"""
+Worker start: importing the app must not pull in the AI SDKs or touch the schema.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_import_main_does_not_load_ai_sdks(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}", SECRET_KEY="x")
+    env.pop("OPENAI_API_KEY", None)  # used to be required just to import main
+    code = (
+        "import sys, main; "
+        "print(','.join(m for m in ('openai', 'google.genai', 'sentry_sdk') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+    assert not (tmp_path / "startup.db").exists() or (tmp_path / "startup.db").stat().st_size == 0
+
+
+def test_health_check(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}", SECRET_KEY="x")
+    code = (
+        "from fastapi.testclient import TestClient; import main; "
+        "print(TestClient(main.app).get('/health').json())"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip().endswith("{'status': 'ok', 'database_url_configured': True}")
+
+
+def test_first_sdk_use_imports_off_the_event_loop(tmp_path):
+    # AI_SDK_WARMUP=false: the first request pays for the import, in a thread
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}", SECRET_KEY="x",
+               OPENAI_API_KEY="sk-test")
+    code = (
+        "import asyncio, sys, threading\n"
+        "from services import gemini_service, openai_service\n"
+        "loop_thread = threading.get_ident()\n"
+        "imported_in = []\n"
+        "def watch(name, real):\n"
+        "    def load(*args):\n"
+        "        imported_in.append((name, threading.get_ident() != loop_thread))\n"
+        "        return real(*args)\n"
+        "    return load\n"
+        "gemini_service._import_sdk = watch('google.genai', gemini_service._import_sdk)\n"
+        "openai_service._new_client = watch('openai', openai_service._new_client)\n"
+        "async def main():\n"
+        "    await gemini_service._sdk()\n"
+        "    await gemini_service._sdk()\n"
+        "    await openai_service.get_client_async()\n"
+        "    await openai_service.get_client_async()\n"
+        "asyncio.run(main())\n"
+        "print(imported_in, 'google.genai' in sys.modules, 'openai' in sys.modules)\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[('google.genai', True), ('openai', True)] True True"
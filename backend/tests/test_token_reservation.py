@@ -0,0 +1,139 @@
+"""
+Token reservations: the quota is booked by an atomic UPDATE before the AI call
+and settled (or refunded) afterwards.
+"""
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import Base
+from apps.auth.models import User
+from apps.admin.models import Organization
+from apps.generator.models import TokenUsage, GenerationLog, Template
+from apps.library.models import SavedResource, GeneratedBook
+from apps.payments.models import UserPayment, UserSubscription
+from apps.generator.services import TokenReservation, reserve_tokens
+from apps.generator.recorder import record_generation
+from apps.auth.context import load_request_context
+
+
+@pytest.fixture
+def dbs(tmp_path):
+    url = f"sqlite:///{tmp_path / 'quota.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+    SessionLocal = sessionmaker(bind=engine)
+
+    db = SessionLocal()
+    db.add(User(email="t@example.com", hashed_password="x", role="teacher",
+                tokens_limit=10_000, tokens_used_this_month=7_000, tokens_reset_at=datetime.utcnow()))
+    db.commit()
+    db.close()
+    yield SessionLocal, AsyncSessionLocal
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def used_tokens(SessionLocal):
+    db = SessionLocal()
+    try:
+        return db.query(User).first().tokens_used_this_month
+    finally:
+        db.close()
+
+
+async def _reserve(AsyncSessionLocal, estimate):
+    async with AsyncSessionLocal() as db:
+        user = await load_request_context("t@example.com", db)
+        try:
+            return await reserve_tokens(user, estimate, db)
+        except HTTPException as exc:
+            return exc.status_code
+
+
+def test_parallel_reservations_never_exceed_limit(dbs):
+    SessionLocal, AsyncSessionLocal = dbs
+
+    async def run():
+        return await asyncio.gather(*[_reserve(AsyncSessionLocal, 1000) for _ in range(10)])
+
+    results = asyncio.run(run())
+    assert results.count(1000) == 3
+    assert results.count(402) == 7
+    assert used_tokens(SessionLocal) == 10_000
+
+
+def test_failed_generation_refunds_reservation(dbs):
+    SessionLocal, AsyncSessionLocal = dbs
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            user = await load_request_context("t@example.com", db)
+            with pytest.raises(HTTPException):
+                async with TokenReservation(user, db, 2000):
+                    await db.execute(select(TokenUsage))  # opens a transaction the refund has to roll back
+                    raise HTTPException(status_code=500, detail="AI Generation failed")
+
+    asyncio.run(run())
+    assert used_tokens(SessionLocal) == 7_000
+
+
+def test_settlement_charges_actual_usage(dbs):
+    SessionLocal, AsyncSessionLocal = dbs
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            user = await load_request_context("t@example.com", db)
+            async with TokenReservation(user, db, 2000) as reservation:
+                await record_generation(db, user, "quiz", 1200, reservation=reservation,
+                                        topic="x", content={"questions": []}, buffered=False)
+
+    asyncio.run(run())
+    assert used_tokens(SessionLocal) == 8_200
+
+
+def test_failed_record_write_refunds_reservation(dbs, monkeypatch):
+    SessionLocal, AsyncSessionLocal = dbs
+
+    async def failing_write(db, records):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr("apps.generator.recorder._write", failing_write)
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            user = await load_request_context("t@example.com", db)
+            with pytest.raises(RuntimeError):
+                async with TokenReservation(user, db, 2000) as reservation:
+                    await record_generation(db, user, "quiz", 1200, reservation=reservation,
+                                            topic="x", content={"questions": []}, buffered=False)
+
+    asyncio.run(run())
+    assert used_tokens(SessionLocal) == 7_000
+
+
+def test_reservation_applies_downgrade_and_monthly_reset(dbs):
+    SessionLocal, AsyncSessionLocal = dbs
+    db = SessionLocal()
+    user = db.query(User).first()
+    user.tokens_limit, user.tokens_used_this_month = 100_000, 90_000
+    user.tokens_reset_at = datetime.utcnow() - timedelta(days=40)
+    db.add(UserSubscription(user_id=user.id, plan="pro", expires_at=datetime.utcnow() - timedelta(days=1)))
+    db.commit()
+    db.close()
+
+    assert asyncio.run(_reserve(AsyncSessionLocal, 1000)) == 1000
+    db = SessionLocal()
+    user = db.query(User).first()
+    assert (user.tokens_limit, user.tokens_used_this_month) == (30_000, 1000)
+    db.close()
@@ -53,9 +53,11 @@ until docker exec online_games_db_prod pg_isready -U postgres >/dev/null 2>&1; d
 done
 echo "✅ База данных готова (${WAITED}с)"
 
-# 7. Миграция схемы (добавление новых колонок)
-echo '⚙️ Синхронизация схемы базы данных...'
-docker exec -t online_games_backend_prod python scripts/fix_db.py
+# 7. Миграции схемы (Alembic, один раз за деплой — воркеры схему не трогают).
+# Тяжёлые переносы данных сюда не входят и запускаются вручную, например
+# партиционирование token_usage/generation_logs: python scripts/partitions.py convert
+echo '⚙️ Применение миграций базы данных...'
+docker exec -t online_games_backend_prod alembic upgrade head
 
 # 8. Запуск сидов
 echo '🌱 Наполнение базы данных (Seeding)...'
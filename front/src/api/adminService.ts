@@ -115,11 +115,24 @@ export const adminService = {
         return response.data;
     },
 
-    importCsv: async (orgId: number, formData: FormData) => {
+    // Import runs as a background job: start it, poll until it finishes, return its result
+    importCsv: async (orgId: number, formData: FormData, onProgress?: (done: number, total: number) => void) => {
         const response = await api.post(`/admin/organizations/${orgId}/import-csv`, formData, {
             headers: { "Content-Type": "multipart/form-data" },
         });
-        return response.data;
+        let job = response.data;
+        while (job.status === "queued" || job.status === "running") {
+            await new Promise((resolve) => setTimeout(resolve, 1000));
+            job = (await api.get(`/admin/jobs/${job.id}`)).data;
+            onProgress?.(job.done, job.total);
+        }
+        if (job.status === "failed") throw { response: { data: { detail: job.error } } };
+        return { ...job.result, job_id: job.id };
+    },
+
+    downloadJobResult: async (jobId: string) => {
+        const response = await api.get(`/admin/jobs/${jobId}/result`, { responseType: "blob" });
+        return response.data as Blob;
     },
 
     getOrgInvites: async (orgId: number) => {
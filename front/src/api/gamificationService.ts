@@ -24,6 +24,12 @@ export const gamificationService = {
         return response.data;
     },
 
+    // End-of-game submission; event_id makes a retried request a no-op for that event
+    completeActivityBatch: async (events: { event_id: string; user_id: number; activity_type: string; activity_id: string }[]) => {
+        const response = await api.post("/activity/complete-batch", { events });
+        return response.data;
+    },
+
     getShopItems: async () => {
         const response = await api.get("/shop/items");
         return response.data;
@@ -0,0 +1,24 @@
+import api from "@/lib/api";
+
+export const liveService = {
+    // Teacher: open a live session from one of their generations
+    createSession: async (generationLogId: number) => {
+        const response = await api.post("/live/sessions", { generation_log_id: generationLogId });
+        return response.data;
+    },
+
+    getSession: async (code: string) => {
+        const response = await api.get(`/live/sessions/${code}`);
+        return response.data;
+    },
+
+    // Signed-in users connect with their token; guests with a device id and a nickname
+    connect: (code: string, guest?: { id: string; name: string }) => {
+        const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
+        const token = localStorage.getItem("token");
+        const params = new URLSearchParams(
+            token ? { token } : { guest_id: guest?.id ?? "", name: guest?.name ?? "" }
+        );
+        return new WebSocket(`${protocol}//${window.location.host}/api/v1/live/ws/${code}?${params}`);
+    }
+};
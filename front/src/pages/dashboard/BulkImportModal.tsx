@@ -26,6 +26,7 @@ const BulkImportModal = ({ orgId, orgName, onClose, onSuccess }: BulkImportModal
   const [isDragging, setIsDragging] = useState(false);
   const [isUploading, setIsUploading] = useState(false);
   const [result, setResult] = useState<any>(null);
+  const [progress, setProgress] = useState<{ done: number; total: number } | null>(null);
   const [error, setError] = useState("");
   const fileInputRef = useRef<HTMLInputElement>(null);
 
@@ -88,7 +89,7 @@ const BulkImportModal = ({ orgId, orgName, onClose, onSuccess }: BulkImportModal
     try {
       const formData = new FormData();
       formData.append("file", file);
-      const res = await adminService.importCsv(orgId, formData);
+      const res = await adminService.importCsv(orgId, formData, (done, total) => setProgress({ done, total }));
       setResult(res);
       onSuccess();
     } catch (err: any) {
@@ -98,12 +99,9 @@ const BulkImportModal = ({ orgId, orgName, onClose, onSuccess }: BulkImportModal
     }
   };
 
-  const downloadResults = () => {
-    if (!result?.created) return;
-    const bom = "\uFEFF";
-    const csvContent = bom + ["Email", "Временный пароль"].join(",") + "\n" +
-      result.created.map((u: any) => `"${u.email}","${u.temp_password}"`).join("\n");
-    const blob = new Blob([csvContent], { type: "text/csv;charset=utf-8;" });
+  const downloadResults = async () => {
+    if (!result?.job_id) return;
+    const blob = await adminService.downloadJobResult(result.job_id);
     saveAs(blob, `passwords_${orgName}_${new Date().toISOString().slice(0, 10)}.csv`);
   };
 
@@ -202,7 +200,7 @@ const BulkImportModal = ({ orgId, orgName, onClose, onSuccess }: BulkImportModal
                 <h4 className="text-2xl font-bold text-foreground font-sans">Импорт успешно завершён</h4>
                 <div className="grid grid-cols-3 gap-8 mt-8 w-full">
                   <div className="text-center">
-                    <p className="text-3xl font-bold text-success">{result.created?.length || 0}</p>
+                    <p className="text-3xl font-bold text-success">{result.created || 0}</p>
                     <p className="text-[10px] uppercase tracking-wider text-muted-foreground font-bold mt-1">Создано</p>
                   </div>
                   <div className="text-center">
@@ -216,7 +214,7 @@ const BulkImportModal = ({ orgId, orgName, onClose, onSuccess }: BulkImportModal
                 </div>
               </div>
 
-              {result.created?.length > 0 && (
+              {result.created > 0 && (
                 <div className="p-6 rounded-3xl bg-yellow-500/5 border border-yellow-500/20 relative overflow-hidden group">
                   <Key className="w-20 h-20 text-yellow-600 rotate-12" />
                   <h5 className="font-bold text-yellow-700 font-sans flex items-center gap-2 mb-3">
@@ -224,7 +222,7 @@ const BulkImportModal = ({ orgId, orgName, onClose, onSuccess }: BulkImportModal
                   </h5>
                   <p className="text-sm text-yellow-700/80 font-sans mb-5 leading-relaxed relative z-10">
                     Временные пароли сгенерированы автоматически. Пожалуйста, скачайте их сейчас,
-                    так как они не сохраняются в системе после закрытия этого окна.
+                    так как файл с ними хранится на сервере не дольше часа.
                   </p>
                   <Button onClick={downloadResults} className="w-full font-bold rounded-2xl gap-3 h-12 shadow-lg shadow-yellow-500/20 relative z-10">
                     <Download className="w-5 h-5" /> Скачать CSV с паролями
@@ -246,7 +244,12 @@ const BulkImportModal = ({ orgId, orgName, onClose, onSuccess }: BulkImportModal
                 disabled={!file || isUploading}
                 onClick={handleUpload}
               >
-                {isUploading ? <Loader2 className="w-5 h-5 animate-spin" /> : "Начать импорт"}
+                {isUploading ? (
+                  <>
+                    <Loader2 className="w-5 h-5 animate-spin" />
+                    {progress && progress.total > 0 && `${progress.done}/${progress.total}`}
+                  </>
+                ) : "Начать импорт"}
               </Button>
             </>
           ) : (